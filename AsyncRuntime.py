@@ -0,0 +1,200 @@
+import ChargerStation as cs
+import asyncio
+import concurrent.futures
+import threading
+import time as tm
+
+
+class AsyncRuntime:
+    # Runs charger stations as tasks on one asyncio event loop. Per station:
+    #  - receive: the loop watches the driver's receive fd (Linux/Mac); with
+    #    a Windows event handle, or without a receive event, the wait runs on
+    #    a helper thread. Frames are always decoded on the loop.
+    #  - tx: sleeps until the next periodic deadline
+    #  - psu: PSUStep looping on a single-thread executor of its own, since
+    #    PyVISA calls block; cancelling the task closes the setpoint mailbox
+    #    to end it. A slow supply only delays its own station.
+    # plus one info and one console task.
+    # Shutdown cancels the tasks; there are no stop flags to poll.
+
+    kRxWaitTimeout = 0.1  # Helper-thread receive wait, in seconds
+
+    def __init__(self, stations, info_rate=10):
+        self.stations = stations
+        self.info_rate = info_rate  # Info message rate in seconds, None for no info
+        self.info_rate_changed = asyncio.Event()
+
+    async def ReceiveTask(self, station):
+        loop = asyncio.get_running_loop()
+
+        # Send a message to inform that the CAN code is running
+        print("PCAN Signal Received. CAN Loop Running...")
+
+        try:
+            while(1):
+                # Reopening the channel after bus-off replaces the receive
+                # event; the wait below then starts over on the new one
+                receive_event = station.receive_event
+                reopened = loop.create_future()
+
+                def OnReopen(reopened=reopened):
+                    if not reopened.done():
+                        reopened.set_result(None)
+                station.on_reopen = OnReopen
+
+                if receive_event.fd is not None:
+                    # The queue is drained straight from the reader callback;
+                    # the task only waits for a failure, a reopen or its
+                    # cancellation
+                    fd = receive_event.fd
+
+                    def OnReadable(reopened=reopened, fd=fd):
+                        try:
+                            station.DrainReceive()
+                        except Exception as error:
+                            loop.remove_reader(fd)
+                            if not reopened.done():
+                                reopened.set_exception(error)
+
+                    loop.add_reader(fd, OnReadable)
+                    try:
+                        await reopened
+                    finally:
+                        loop.remove_reader(fd)
+                else:
+                    with concurrent.futures.ThreadPoolExecutor(
+                            1, thread_name_prefix='can-rx') as executor:
+                        while not reopened.done():
+                            await loop.run_in_executor(
+                                executor, receive_event.Wait, self.kRxWaitTimeout)
+                            station.DrainReceive()
+        finally:
+            station.on_reopen = None
+            station.CloseReceive()
+
+    async def TxTask(self, station):
+        station.StartTx(tm.monotonic_ns())
+
+        while(1):
+            await asyncio.sleep(max(station.TimeToTx(), 0))
+            station.RunTx()
+
+    async def PSUTask(self, station):
+        loop = asyncio.get_running_loop()
+
+        # Send a message to inform that the PSU code is running
+        print("Chroma Signal Received. Serial Loop Running...")
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix='psu')
+        try:
+            await loop.run_in_executor(executor, self._PSULoop, station)
+        finally:
+            station.setpoints.Close()
+            await loop.run_in_executor(None, executor.shutdown)
+
+    def _PSULoop(self, station):
+        # One executor call for the whole loop, not one per step, so setpoint
+        # bursts do not bounce between the PSU thread and the event loop
+        while(not station.setpoints.closed):
+            station.PSUStep()
+
+    async def InfoTask(self):
+        app_start_time = tm.time()
+
+        # Send a message to inform that the main code is running
+        print("Info Loop Running...")
+        print("")
+
+        prev_app_time = tm.time()
+        while(1):
+            # A new rate applies from the last print, not after the old period
+            time_to_print = prev_app_time + self.info_rate - tm.time()
+            try:
+                await asyncio.wait_for(self.info_rate_changed.wait(),
+                                       max(time_to_print, 0))
+                self.info_rate_changed.clear()
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            prev_app_time = tm.time()
+            print(cs.StationsInfo(self.stations,
+                                  prev_app_time - app_start_time))
+
+    async def Serve(self):
+        # Runs the stations until cancelled or until one of the tasks fails
+        tasks = []
+        if self.info_rate is not None:
+            tasks.append(asyncio.create_task(self.InfoTask()))
+        for station in self.stations:
+            tasks.append(asyncio.create_task(self.ReceiveTask(station)))
+            tasks.append(asyncio.create_task(self.TxTask(station)))
+            tasks.append(asyncio.create_task(self.PSUTask(station)))
+        try:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _ReadConsole(self, loop, lines):
+        # input() cannot be cancelled, so it runs on a daemon thread that
+        # forwards lines to the loop
+        while(True):
+            try:
+                user_input = str(input())
+                loop.call_soon_threadsafe(lines.put_nowait, user_input)
+            except (EOFError, RuntimeError):
+                # stdin closed, or the loop is gone
+                return
+
+    async def ConsoleTask(self):
+        lines = asyncio.Queue()
+        threading.Thread(target=self._ReadConsole,
+                         args=(asyncio.get_running_loop(), lines),
+                         daemon=True).start()
+
+        while(True):
+            user_input = await lines.get()
+
+            if user_input == "x":
+                return
+            elif user_input == "l":
+                print(cs.StationsLatency(self.stations))
+            elif user_input == "r":
+                print("Enter new info rate in seconds:")
+                new_rate = float(await lines.get())
+                self.info_rate = new_rate
+                self.info_rate_changed.set()
+            elif user_input == "?":
+                print("'x' - Terminate program\n" +
+                      "'r' - Change info print rate\n" +
+                      "'l' - Show setpoint latency histogram")
+            else:
+                print("Invalid command! Enter '?' for command list\n")
+
+    async def Run(self):
+        # Serves the stations and the console until 'x', then aborts the PSUs
+        loop = asyncio.get_running_loop()
+        serve = asyncio.create_task(self.Serve())
+        console = asyncio.create_task(self.ConsoleTask())
+
+        print("\nShore Charger Translation Layer Running!\n")
+
+        try:
+            done, _ = await asyncio.wait(
+                (serve, console), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            console.cancel()
+            serve.cancel()
+            await asyncio.gather(serve, console, return_exceptions=True)
+
+        await asyncio.gather(*(loop.run_in_executor(None, station.Abort)
+                               for station in self.stations))
+
+        if serve in done:
+            serve.result()
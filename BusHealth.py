@@ -0,0 +1,176 @@
+import PCANBasic as pb
+import time
+
+# Health of a PCAN channel's bus, from the status bits of CAN_GetStatus,
+# of the reads that end a receive queue drain and of the status frames the
+# driver queues on every bus state change. GetStatus is only sampled every
+# kSamplePeriod; the status frames also catch a bus-off the driver
+# recovers from in between.
+#  - bus state: active, light, heavy (warning), passive or off, the worst
+#    error counter limit the controller reports
+#  - queue and controller overruns (the driver reports each once)
+#  - error frames, counted by the receive loop among the frames that have
+#    no handler once PCAN_ALLOW_ERROR_FRAMES is on
+#  - bus-off episodes and their recovery: the driver resets the controller
+#    itself when PCAN_BUSOFF_AUTORESET is accepted; otherwise the monitor
+#    calls reopen once the channel has stayed bus-off for reset_delay_ns.
+#    CAN_Reset only flushes the queues and leaves the controller bus-off,
+#    so reopen must uninitialize and initialize the channel and configure
+#    it again (ChargerStation.ReopenChannel). A reset is counted once
+#    GetStatus reports the bus is no longer off.
+# Counts are per second over rate_window_ns. All times are
+# time.monotonic_ns() values.
+
+kSamplePeriod = 100000000     # GetStatus period, in ns
+kRateWindow = 1000000000      # Error frame and overrun rate window, in ns
+kResetDelay = 100000000       # Bus-off time before the channel is reopened, in ns
+
+kActive = 'active'
+kLight = 'light'
+kHeavy = 'heavy'
+kPassive = 'passive'
+kOff = 'off'
+
+# Bus state bits, worst first
+kStateBits = ((kOff, pb.PCAN_ERROR_BUSOFF), (kPassive, pb.PCAN_ERROR_BUSPASSIVE),
+              (kHeavy, pb.PCAN_ERROR_BUSHEAVY), (kLight, pb.PCAN_ERROR_BUSLIGHT))
+
+# States in order of severity; a state is exported as its index here
+kBusStates = (kActive, kLight, kHeavy, kPassive, kOff)
+
+kStatusFlags = (
+    ('transmit full', pb.PCAN_ERROR_XMTFULL),
+    ('controller overrun', pb.PCAN_ERROR_OVERRUN),
+    ('bus light', pb.PCAN_ERROR_BUSLIGHT),
+    ('bus heavy', pb.PCAN_ERROR_BUSHEAVY),
+    ('bus passive', pb.PCAN_ERROR_BUSPASSIVE),
+    ('bus-off', pb.PCAN_ERROR_BUSOFF),
+    ('queue empty', pb.PCAN_ERROR_QRCVEMPTY),
+    ('queue overrun', pb.PCAN_ERROR_QOVERRUN),
+    ('transmit queue full', pb.PCAN_ERROR_QXMTFULL),
+)
+kOverrunBits = pb.PCAN_ERROR_OVERRUN | pb.PCAN_ERROR_QOVERRUN
+
+# Bits that describe the bus and queues rather than a failed call
+kStatusBits = (pb.PCAN_ERROR_XMTFULL | pb.PCAN_ERROR_OVERRUN
+               | pb.PCAN_ERROR_ANYBUSERR | pb.PCAN_ERROR_QRCVEMPTY
+               | pb.PCAN_ERROR_QOVERRUN | pb.PCAN_ERROR_QXMTFULL)
+
+
+def BusState(status):
+    for state, bit in kStateBits:
+        if status & bit:
+            return state
+    return kActive
+
+
+def StatusText(status):
+    # Names of the status bits set, e.g. 'bus heavy, queue overrun'
+    if status == pb.PCAN_ERROR_OK:
+        return 'ok'
+    names = [name for name, bit in kStatusFlags if status & bit]
+    if status & ~kStatusBits:
+        names.append(f'error 0x{status & ~kStatusBits:X}')
+    return ', '.join(names)
+
+
+class BusHealthMonitor:
+    def __init__(self, pcan, channel, reopen=None, reset_delay_ns=kResetDelay,
+                 rate_window_ns=kRateWindow):
+        self.pcan = pcan
+        self.channel = channel
+        self.reopen = reopen             # callable, reinitializes the channel
+        self.reset_delay_ns = reset_delay_ns
+        self.rate_window_ns = rate_window_ns
+
+        self.status = pb.PCAN_ERROR_OK   # last CAN_GetStatus
+        self.state = kActive
+        self.autoreset = False           # the driver recovers from bus-off
+
+        self.error_frames = 0
+        self.overruns = 0
+        self.bus_off_count = 0
+        self.reopens = 0                 # reopen calls
+        self.resets = 0                  # reopens that left bus-off
+        self.error_frame_rate = 0.0      # per second
+        self.overrun_rate = 0.0          # per second
+
+        self._bus_off_since = None
+        self._reopened = False
+        self._window_start_ns = None
+        self._window_error_frames = 0
+        self._window_overruns = 0
+
+    def Configure(self):
+        # Asks the driver to report error frames and to recover from
+        # bus-off by itself. Returns the status of PCAN_BUSOFF_AUTORESET.
+        self.pcan.SetValue(self.channel, pb.PCAN_ALLOW_ERROR_FRAMES,
+                           pb.PCAN_PARAMETER_ON)
+        result = self.pcan.SetValue(self.channel, pb.PCAN_BUSOFF_AUTORESET,
+                                    pb.PCAN_PARAMETER_ON)
+        self.autoreset = result == pb.PCAN_ERROR_OK
+        return result
+
+    def Record(self, status):
+        # Status bits returned by the read that ended a drain. Only set bus
+        # bits change the state; GetStatus tells when the bus is back.
+        if status & kOverrunBits:
+            self.overruns += 1
+        if status & pb.PCAN_ERROR_ANYBUSERR:
+            self.SetState(BusState(status), time.monotonic_ns())
+
+    def RecordStatusFrame(self, data):
+        # DATA of a PCAN_MESSAGE_STATUS frame: the new bus status, a
+        # TPCANStatus in DATA[0..3], big-endian
+        status = int.from_bytes(bytes(data[:4]), 'big')
+        if status & kOverrunBits:
+            self.overruns += 1
+        self.SetState(BusState(status), time.monotonic_ns())
+
+    def SetState(self, state, now_ns):
+        if state == kOff and self.state != kOff:
+            self.bus_off_count += 1
+            self._bus_off_since = now_ns
+        elif state != kOff:
+            self._bus_off_since = None
+        self.state = state
+
+    def Sample(self):
+        # Reads the channel status; periodic, on the CAN loop
+        now_ns = time.monotonic_ns()
+        status = self.pcan.FastPath().GetStatus(self.channel)
+        self.status = status
+        if status & kOverrunBits:
+            self.overruns += 1
+        self.SetState(BusState(status), now_ns)
+
+        if self.state != kOff:
+            if self._reopened:
+                self.resets += 1
+                self._reopened = False
+        elif (not self.autoreset and self.reopen is not None and
+                now_ns - self._bus_off_since >= self.reset_delay_ns):
+            self.reopen()
+            self.reopens += 1
+            self._reopened = True
+            self._bus_off_since = now_ns
+
+        if self._window_start_ns is None:
+            self._window_start_ns = now_ns
+        elif now_ns - self._window_start_ns >= self.rate_window_ns:
+            seconds = (now_ns - self._window_start_ns) / 1e9
+            self.error_frame_rate = (self.error_frames
+                                     - self._window_error_frames) / seconds
+            self.overrun_rate = (self.overruns - self._window_overruns) / seconds
+            self._window_start_ns = now_ns
+            self._window_error_frames = self.error_frames
+            self._window_overruns = self.overruns
+
+    def Summary(self):
+        return ("CAN bus " + self.state + " (" + StatusText(self.status) + ")"
+                + f'  error frames {self.error_frame_rate:.1f}/s'
+                + f'  overruns {self.overrun_rate:.1f}/s'
+                + "  bus-off " + str(self.bus_off_count)
+                + " (" + ("auto-reset" if self.autoreset
+                          else str(self.resets) + " resets of "
+                          + str(self.reopens) + " reopens") + ")")
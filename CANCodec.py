@@ -0,0 +1,276 @@
+import struct
+from dataclasses import dataclass, field
+
+# Signal byte orders (DBC naming)
+kBigEndian = 'big_endian'        # Motorola, DBC "@0"
+kLittleEndian = 'little_endian'  # Intel, DBC "@1"
+
+# Signal layout definition
+#  - start_bit follows the DBC convention (byte * 8 + bit, bit 0 = LSB of the
+#    byte): the MSB of a big-endian signal, the LSB of a little-endian one
+#  - physical value = raw * scale + offset
+
+
+@dataclass
+class Signal:
+    name: str
+    start_bit: int
+    length: int
+    scale: float = 1.0
+    offset: float = 0.0
+    byte_order: str = kBigEndian
+    is_signed: bool = False
+    initial: float = 0.0
+
+
+# Message layout definition
+#  - initial_data holds the value of every bit not covered by a signal
+#    (e.g. 0xFF for "not reported"); it defaults to fill in every byte
+
+
+@dataclass
+class MessageLayout:
+    can_id: int
+    name: str
+    length: int = 8
+    signals: list = field(default_factory=list)
+    fill: int = 0x00
+    initial_data: bytes = None
+    is_extended: bool = False
+
+
+class MessageCodec:
+    # Compiles a MessageLayout once into a decode function (frame data to a
+    # tuple of physical values, in signal order) and an encode function
+    # (keyword physical values to frame bytes). Each is a single
+    # int.from_bytes/int.to_bytes plus one shift and mask per signal.
+    # Physical values are rounded to the nearest raw value, so every decoded
+    # value encodes back to the same bits.
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.can_id = layout.can_id
+        self.name = layout.name
+        self.length = layout.length
+        self.signal_names = tuple(sig.name for sig in layout.signals)
+
+        initial_data = layout.initial_data
+        if initial_data is None:
+            initial_data = bytes([layout.fill]) * layout.length
+        self.template = int.from_bytes(initial_data, 'big')
+
+        self._decode = self._CompileDecoder(layout.signals)
+        self._encode = self._CompileEncoder()
+
+    def Decode(self, data):
+        return self._decode(data)
+
+    def DecodeDict(self, data):
+        return dict(zip(self.signal_names, self._decode(data)))
+
+    def Decoder(self, *names):
+        # Returns a decode function for the named signals only, in the given
+        # order, so callers do not depend on the signal order of the layout
+        signals = {sig.name: sig for sig in self.layout.signals}
+        return self._CompileDecoder([signals[name] for name in names])
+
+    def Encode(self, **values):
+        return self._encode(**values)
+
+    def Patcher(self, *names):
+        # Returns patch(data, value, ...) writing the named signals, given in
+        # that order, in place into a writable byte view of frame data (see
+        # DataView). Every other bit is left as it is, so a frame whose
+        # constant bytes were set once from Encode() only has its changing
+        # signals rewritten.
+        signals = {sig.name: sig for sig in self.layout.signals}
+        return self._CompilePatcher([signals[name] for name in names])
+
+    def _SignalPosition(self, sig):
+        # Returns (shift, mask) of the raw signal inside the frame read as a
+        # big-endian integer, or inside the frame read as a little-endian
+        # integer for Intel signals
+        mask = (1 << sig.length) - 1
+        if sig.byte_order == kLittleEndian:
+            return sig.start_bit, mask
+        msb_index = (sig.start_bit // 8) * 8 + (7 - sig.start_bit % 8)
+        lsb_index = msb_index + sig.length - 1
+        return self.length * 8 - 1 - lsb_index, mask
+
+    def _Scaling(self, sig):
+        # Decimal scales such as 0.1 are applied as a division by their
+        # integer inverse so 2301 decodes to 230.1, not 230.10000000000002
+        inverse = 1.0 / sig.scale
+        if round(inverse) != 0 and abs(inverse - round(inverse)) < 1e-9:
+            return None, float(round(inverse))
+        return sig.scale, None
+
+    def _CompileDecoder(self, signals):
+        n_bytes = self.length
+        lines = ['def decode(data):']
+        values = []
+
+        # TPCANMsg.DATA is always 8 bytes; shorter layouts read a prefix
+        data = 'data' if n_bytes == 8 else f'data[:{n_bytes}]'
+        if any(sig.byte_order == kBigEndian for sig in signals):
+            lines.append(f"    b = _from_bytes({data}, 'big')")
+        if any(sig.byte_order == kLittleEndian for sig in signals):
+            lines.append(f"    l = _from_bytes({data}, 'little')")
+
+        for i, sig in enumerate(signals):
+            shift, mask = self._SignalPosition(sig)
+            source = 'l' if sig.byte_order == kLittleEndian else 'b'
+            raw = f'(({source} >> {shift}) & {mask:#x})'
+
+            if sig.is_signed:
+                sign_bit = 1 << (sig.length - 1)
+                lines.append(f'    r{i} = {raw}')
+                lines.append(
+                    f'    r{i} = r{i} - {1 << sig.length} if r{i} & {sign_bit:#x} else r{i}')
+                raw = f'r{i}'
+
+            scale, divisor = self._Scaling(sig)
+            if sig.scale == 1.0:
+                physical = raw
+            elif divisor is not None:
+                physical = f'{raw} / {divisor!r}'
+            else:
+                physical = f'{raw} * {scale!r}'
+            if sig.offset:
+                physical = f'{physical} + {sig.offset!r}'
+            values.append(physical)
+
+        lines.append(f"    return ({', '.join(values)},)"
+                     if values else '    return ()')
+        return self._Build('decode', lines)
+
+    def _CompileEncoder(self):
+        n_bytes = self.length
+        args = []
+        lines = []
+        little_lines = []
+        template = self.template
+
+        for sig in self.layout.signals:
+            shift, mask = self._SignalPosition(sig)
+            source = 'l' if sig.byte_order == kLittleEndian else 'b'
+
+            value = f'({sig.name} - {sig.offset!r})' if sig.offset else sig.name
+            scale, divisor = self._Scaling(sig)
+            if sig.scale == 1.0:
+                to_raw = f'round({value})'
+            elif divisor is not None:
+                to_raw = f'round({value} * {divisor!r})'
+            else:
+                to_raw = f'round({value} / {scale!r})'
+
+            args.append(f'{sig.name}={sig.initial!r}')
+            line = f'    {source} |= ({to_raw} & {mask:#x}) << {shift}'
+            if sig.byte_order == kLittleEndian:
+                little_lines.append(line)
+                template &= ~int.from_bytes(
+                    (mask << shift).to_bytes(n_bytes, 'little'), 'big')
+            else:
+                lines.append(line)
+                template &= ~(mask << shift)
+
+        header = f"def encode(*, {', '.join(args)}):" if args \
+            else 'def encode():'
+        body = [header, f'    b = {template:#x}']
+        body.extend(lines)
+        if little_lines:
+            body.append('    l = 0')
+            body.extend(little_lines)
+            body.append(
+                f"    b |= _from_bytes(l.to_bytes({n_bytes}, 'little'), 'big')")
+        body.append(f"    return b.to_bytes({n_bytes}, 'big')")
+
+        self.template = template
+        return self._Build('encode', body)
+
+    def _CompilePatcher(self, signals):
+        # Whole-byte signals are packed straight into the buffer; others
+        # rewrite only the bytes they span, keeping the bits around them
+        n_bytes = self.length
+        args = [f'v{i}' for i in range(len(signals))]
+        lines = [f"def patch(data{''.join(', ' + arg for arg in args)}):"]
+
+        for arg, sig in zip(args, signals):
+            shift, mask = self._SignalPosition(sig)
+            value = f'({arg} - {sig.offset!r})' if sig.offset else arg
+            scale, divisor = self._Scaling(sig)
+            if sig.scale == 1.0:
+                raw = f'(round({value}) & {mask:#x})'
+            elif divisor is not None:
+                raw = f'(round({value} * {divisor!r}) & {mask:#x})'
+            else:
+                raw = f'(round({value} / {scale!r}) & {mask:#x})'
+
+            # Bytes spanned, first to last in memory, and the signal's shift
+            # inside them
+            if sig.byte_order == kLittleEndian:
+                order, code = 'little', '<'
+                first = shift // 8
+                last = (shift + sig.length - 1) // 8
+                local_shift = shift - first * 8
+            else:
+                order, code = 'big', '>'
+                first = n_bytes - 1 - (shift + sig.length - 1) // 8
+                last = n_bytes - 1 - shift // 8
+                local_shift = shift - (n_bytes - 1 - last) * 8
+            span = last - first + 1
+            keep = ~(mask << local_shift) & ((1 << span * 8) - 1)
+
+            if local_shift == 0 and sig.length == span * 8 and span in (1, 2, 4, 8):
+                if span == 1:
+                    lines.append(f'    data[{first}] = {raw}')
+                else:
+                    struct_code = {2: 'H', 4: 'I', 8: 'Q'}[span]
+                    lines.append(f"    _pack_into('{code}{struct_code}', data, "
+                                 f"{first}, {raw})")
+            elif span == 1:
+                lines.append(f'    data[{first}] = (data[{first}] & {keep:#x}) '
+                             f'| {raw} << {local_shift}')
+            else:
+                lines.append(f"    w = _from_bytes(data[{first}:{last + 1}], "
+                             f"'{order}') & {keep:#x} | {raw} << {local_shift}")
+                lines.append(f"    data[{first}:{last + 1}] = w.to_bytes("
+                             f"{span}, '{order}')")
+
+        if len(signals) == 0:
+            lines.append('    pass')
+        return self._Build('patch', lines)
+
+    def _Build(self, name, lines):
+        env = {'_from_bytes': int.from_bytes, '_pack_into': struct.pack_into}
+        exec('\n'.join(lines), env)
+        return env[name]
+
+
+class CodecTable(dict):
+    # ID-indexed dispatch table of codecs. Codecs are compiled on first
+    # lookup, so loading a large database only pays for the messages used.
+    # Use [] or ByName to look up; get() only returns compiled codecs.
+
+    def __init__(self, layouts):
+        super().__init__()
+        self.layouts = {layout.can_id: layout for layout in layouts}
+        self.ids = {layout.name: layout.can_id for layout in layouts}
+
+    def __missing__(self, can_id):
+        codec = MessageCodec(self.layouts[can_id])
+        self[can_id] = codec
+        return codec
+
+    def ByName(self, name):
+        return self[self.ids[name]]
+
+
+def CompileLayouts(layouts):
+    return CodecTable(layouts)
+
+
+def DataView(data):
+    # Writable byte view over a ctypes DATA array. Slice assignment through
+    # it is several times faster than assigning to the ctypes array itself.
+    return memoryview(data).cast('B')
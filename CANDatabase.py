@@ -0,0 +1,139 @@
+import CANCodec as cc
+import marshal
+import os
+import re
+
+# DBC import
+#  - BO_ message and SG_ signal definitions are converted to MessageLayouts
+#  - BA_ "GenSigStartValue" sets the value a signal is encoded with when the
+#    caller does not provide it
+#  - multiplexed signals are not supported and are skipped
+#
+# Parsed layouts are cached next to the DBC ("<file>.cache") as marshalled
+# tuples, keyed on the DBC size and modification time, so later launches do
+# not reparse the file.
+
+kCacheVersion = 1
+kExtendedIdFlag = 0x80000000
+
+_message_re = re.compile(r'^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)')
+_signal_re = re.compile(
+    r'^SG_\s+(\w+)\s*(\w*)\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*'
+    r'\(\s*([^,]+),\s*([^)]+)\)')
+_start_value_re = re.compile(
+    r'^BA_\s+"GenSigStartValue"\s+SG_\s+(\d+)\s+(\w+)\s+([-+.\deE]+)\s*;')
+
+
+def ParseDBC(text, fill=0x00):
+    layouts = []
+    by_id = {}
+    start_values = []
+    layout = None
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        if line.startswith('SG_'):
+            match = _signal_re.match(line)
+            if match is None or layout is None or match.group(2):
+                continue
+            name, _, start_bit, length, order, sign, scale, offset = \
+                match.groups()
+            layout.signals.append(cc.Signal(
+                name,
+                start_bit=int(start_bit),
+                length=int(length),
+                scale=float(scale),
+                offset=float(offset),
+                byte_order=cc.kLittleEndian if order == '1' else cc.kBigEndian,
+                is_signed=(sign == '-')))
+
+        elif line.startswith('BO_ '):
+            match = _message_re.match(line)
+            if match is None:
+                layout = None
+                continue
+            raw_id = int(match.group(1))
+            layout = cc.MessageLayout(
+                can_id=raw_id & ~kExtendedIdFlag,
+                name=match.group(2),
+                length=int(match.group(3)),
+                fill=fill,
+                is_extended=bool(raw_id & kExtendedIdFlag))
+            layouts.append(layout)
+            by_id[raw_id] = layout
+
+        elif line.startswith('BA_ "GenSigStartValue"'):
+            match = _start_value_re.match(line)
+            if match is not None:
+                start_values.append(match.groups())
+
+        elif line != '':
+            layout = None
+
+    # Start values are raw in the DBC; the codecs take physical values
+    for raw_id, name, raw_value in start_values:
+        message = by_id.get(int(raw_id))
+        if message is None:
+            continue
+        for sig in message.signals:
+            if sig.name == name:
+                sig.initial = float(raw_value) * sig.scale + sig.offset
+
+    # TPCANMsg carries at most 8 data bytes, and the pseudo message holding
+    # unassigned signals is not a real frame
+    return [layout for layout in layouts
+            if layout.length <= 8 and
+            layout.name != 'VECTOR__INDEPENDENT_SIG_MSG']
+
+
+def LoadDBC(path, fill=0x00, use_cache=True):
+    stat = os.stat(path)
+    key = (kCacheVersion, stat.st_size, stat.st_mtime_ns, fill)
+    cache_path = path + '.cache'
+
+    if use_cache:
+        layouts = _ReadCache(cache_path, key)
+        if layouts is not None:
+            return layouts
+
+    with open(path, 'r', encoding='latin-1') as dbc_file:
+        layouts = ParseDBC(dbc_file.read(), fill)
+
+    if use_cache:
+        _WriteCache(cache_path, key, layouts)
+    return layouts
+
+
+def _ReadCache(cache_path, key):
+    try:
+        # marshal.loads on the whole file is several times faster than
+        # marshal.load on the file object
+        with open(cache_path, 'rb') as cache_file:
+            cached_key, records = marshal.loads(cache_file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if cached_key != key:
+        return None
+
+    return [cc.MessageLayout(can_id, name, length,
+                             [cc.Signal(*signal) for signal in signals],
+                             fill, initial_data, is_extended)
+            for can_id, name, length, signals, fill, initial_data, is_extended
+            in records]
+
+
+def _WriteCache(cache_path, key, layouts):
+    records = [(layout.can_id, layout.name, layout.length,
+                [(sig.name, sig.start_bit, sig.length, sig.scale, sig.offset,
+                  sig.byte_order, sig.is_signed, sig.initial)
+                 for sig in layout.signals],
+                layout.fill, layout.initial_data, layout.is_extended)
+               for layout in layouts]
+    try:
+        with open(cache_path, 'wb') as cache_file:
+            cache_file.write(marshal.dumps((key, records)))
+    except OSError:
+        # A read-only location only costs a reparse next launch
+        pass
@@ -0,0 +1,142 @@
+import PCANBasic as pb
+import platform
+import select
+import time
+
+# Wait period used when the driver cannot provide a receive event
+kRxPollPeriod = 0.0001  # in seconds
+
+# Span of read delays HardwareClock takes its offset from, in nanoseconds
+kClockWindow = 1000000000
+
+
+def TimestampMicros(timestamp):
+    # Total microseconds of a TPCANTimestamp, as one monotonic integer
+    return timestamp.micros + 1000 * (timestamp.millis
+                                      + (timestamp.millis_overflow << 32))
+
+
+class HardwareClock:
+    # Maps PCAN receive timestamps (microseconds on the adapter's clock)
+    # onto time.monotonic_ns(). A frame is always read after it arrived, so
+    # host read time - hardware time is the clock offset plus a read delay;
+    # the smallest value seen is the best estimate of the offset. It is taken
+    # over the last two windows of window_ns so drift between the clocks is
+    # followed, and started over when the hardware clock goes backwards
+    # (driver or adapter reset).
+
+    def __init__(self, window_ns=kClockWindow):
+        self.window_ns = window_ns
+        self.offset_ns = None        # host time - hardware time
+        self._window_start_ns = None
+        self._window_offset = None   # smallest offset of the current window
+        self._previous_offset = None  # ... and of the window before it
+        self._last_us = None
+
+    def Observe(self, hardware_us, host_ns):
+        # A frame with timestamp hardware_us read at host_ns
+        if self._last_us is not None and hardware_us < self._last_us:
+            self._window_start_ns = None
+        self._last_us = hardware_us
+
+        if (self._window_start_ns is None or
+                host_ns - self._window_start_ns >= self.window_ns):
+            self._previous_offset = (self._window_offset if
+                                     self._window_start_ns is not None else None)
+            self._window_offset = None
+            self._window_start_ns = host_ns
+
+        offset = host_ns - hardware_us * 1000
+        if self._window_offset is None or offset < self._window_offset:
+            self._window_offset = offset
+        if self._previous_offset is None:
+            self.offset_ns = self._window_offset
+        else:
+            self.offset_ns = min(self._window_offset, self._previous_offset)
+
+    def HostTime(self, hardware_us):
+        # time.monotonic_ns() value of a hardware timestamp
+        return hardware_us * 1000 + self.offset_ns
+
+
+class CANReceiveEvent:
+    # Wraps the PCAN receive event so the CAN loop can block until frames
+    # arrive instead of sleep-polling the receive queue.
+    #  - Windows: a kernel event registered via SetValue(PCAN_RECEIVE_EVENT)
+    #  - Linux/Mac: the file descriptor returned by GetValue(PCAN_RECEIVE_EVENT)
+
+    def __init__(self, pcan, channel):
+        self.pcan = pcan
+        self.channel = channel
+        self.fd = None
+        self.handle = None
+
+        if platform.system() == 'Windows':
+            import ctypes
+            self._kernel32 = ctypes.windll.kernel32
+            self.handle = self._kernel32.CreateEventW(None, 0, 0, None)
+            self.status = pcan.SetValue(
+                channel, pb.PCAN_RECEIVE_EVENT, self.handle)
+        else:
+            result = pcan.GetValue(channel, pb.PCAN_RECEIVE_EVENT)
+            self.status = result[0]
+            if self.status == pb.PCAN_ERROR_OK:
+                self.fd = result[1]
+
+    def IsAvailable(self):
+        return self.status == pb.PCAN_ERROR_OK
+
+    def Wait(self, timeout):
+        # Returns True if frames are pending, False on timeout
+        if timeout < 0:
+            timeout = 0
+
+        if not self.IsAvailable():
+            time.sleep(min(timeout, kRxPollPeriod))
+            return True
+
+        if self.fd is not None:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            return len(readable) != 0
+
+        kWaitObject0 = 0
+        return self._kernel32.WaitForSingleObject(
+            self.handle, int(timeout * 1000)) == kWaitObject0
+
+    def Close(self):
+        if self.handle is not None:
+            self.pcan.SetValue(self.channel, pb.PCAN_RECEIVE_EVENT, 0)
+            self._kernel32.CloseHandle(self.handle)
+            self.handle = None
+        self.fd = None
+        self.status = pb.PCAN_ERROR_ILLOPERATION
+
+
+def IdRanges(can_ids):
+    # Collapse a set of CAN IDs into the fewest inclusive (from, to) ranges
+    ranges = []
+    for can_id in sorted(set(can_ids)):
+        if len(ranges) != 0 and ranges[-1][1] + 1 == can_id:
+            ranges[-1] = (ranges[-1][0], can_id)
+        else:
+            ranges.append((can_id, can_id))
+    return ranges
+
+
+def ConfigureAcceptanceFilter(pcan, channel, id_ranges, mode=pb.PCAN_MODE_STANDARD):
+    # Close the driver filter, then open it only for the given ID ranges so
+    # unrelated bus traffic is dropped before it reaches the receive queue
+    result = pcan.SetValue(channel, pb.PCAN_MESSAGE_FILTER,
+                           pb.PCAN_FILTER_CLOSE)
+    if result != pb.PCAN_ERROR_OK:
+        return result
+
+    for from_id, to_id in id_ranges:
+        result = pcan.FilterMessages(channel, from_id, to_id, mode)
+        if result != pb.PCAN_ERROR_OK:
+            # Leave the bus fully readable rather than half filtered
+            pcan.SetValue(channel, pb.PCAN_MESSAGE_FILTER,
+                          pb.PCAN_FILTER_OPEN)
+            return result
+
+    return pb.PCAN_ERROR_OK
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+import CANReceiver as cr
+import PCANBasic as pb
+import TelemetryLog as tl
+import VirtualBus as vb
+import argparse
+import collections
+import itertools
+import os
+import re
+import time
+
+# CAN traces in standard formats, and their replay.
+#  - Capture: stations record to TelemetryLog files (--log-dir), which keeps
+#    text formatting off the CAN loop; Export() turns the logs into a
+#    candump log (.log) or a Vector ASC trace (.asc). StartDriverTrace()
+#    makes the PCAN driver itself write PEAK .trc files.
+#  - Replay: ReadTrace() reads a candump, ASC or telemetry log and Replay()
+#    feeds its received frames into a VirtualBus, at their recorded spacing
+#    divided by speed.
+#   python CANTrace.py export <telemetry logs...> -o session.asc
+# Error frames are written in each format's error syntax (candump: a
+# CAN_ERR_FLAG ID, ASC: ErrorFrame) and replayed as error frames. PCAN
+# status frames report the recording adapter, not bus traffic, and are
+# left out. BLF (Vector binary logging) is not supported.
+
+kReplayTick = 0.001   # Frames due within this are delivered together, in seconds
+kReplayBatch = 1024   # Most frames delivered at once
+kTraceSize = 100      # PCAN driver trace file size, in MB
+
+# SocketCAN error frames: CAN_ERR_FLAG | CAN_ERR_PROT, with the protocol
+# error type in data[2] (bit, form and stuff errors have the bits of the
+# PCAN error frame ID) and the TX and RX error counters in data[6] and [7].
+# PCAN error frames carry the RX and TX counters in DATA[2] and DATA[3].
+kCanErrFlag = 0x20000000
+kCanErrProt = 0x08
+kProtocolErrors = 0x07  # bit, form and stuff error
+kOtherError = 0x08      # PCAN error frame ID of any other error
+
+# time in seconds (since the epoch for telemetry logs and candump traces,
+# since the start of measurement for ASC traces), msgtype a PCAN_MESSAGE_*
+# value, direction 'Rx' or 'Tx'
+TraceFrame = collections.namedtuple(
+    'TraceFrame', 'time can_id msgtype data direction')
+
+kCandumpLine = re.compile(
+    r'^\((\d+\.\d+)\)\s+\S+\s+([0-9A-Fa-f]+)#(R\d?|[0-9A-Fa-f]*)\s*$')
+kAscLine = re.compile(
+    r'^\s*(\d+\.\d+)\s+\d+\s+([0-9A-Fa-f]+)(x?)\s+(Rx|Tx)\s+([dr])\s*([0-9A-Fa-f]?)'
+    r'((?:\s+[0-9A-Fa-f]{2})*)')
+kAscErrorLine = re.compile(r'^\s*(\d+\.\d+)\s+\d+\s+ErrorFrame\b')
+
+
+def _IsExtended(msgtype):
+    return bool(msgtype & pb.PCAN_MESSAGE_EXTENDED.value)
+
+
+def _IsRemote(msgtype):
+    return bool(msgtype & pb.PCAN_MESSAGE_RTR.value)
+
+
+def _IsError(msgtype):
+    return bool(msgtype & pb.PCAN_MESSAGE_ERRFRAME.value)
+
+
+def _IsStatus(msgtype):
+    return bool(msgtype & pb.PCAN_MESSAGE_STATUS.value)
+
+
+def _CandumpError(frame):
+    # ID#data of a PCAN error frame as a SocketCAN protocol error
+    data = bytearray(8)
+    data[2] = frame.can_id & kProtocolErrors
+    if len(frame.data) >= 4:
+        data[6], data[7] = frame.data[3], frame.data[2]
+    return f'{kCanErrFlag | kCanErrProt:08X}#{data.hex().upper()}'
+
+
+def _PCANError(stamp, data):
+    # The PCAN error frame of a SocketCAN one read from a candump log
+    data = data + bytes(8 - len(data))
+    error_type = data[2] & kProtocolErrors or kOtherError
+    return TraceFrame(stamp, error_type, pb.PCAN_MESSAGE_ERRFRAME.value,
+                      bytes([0, 0, data[7], data[6]]), 'Rx')
+
+
+# --------------------------------- Reading -------------------------------- #
+def ReadTelemetryLogs(paths):
+    # Frames of TelemetryLog files, in time order, timed in seconds since the
+    # epoch. Received frames are timed by their hardware timestamps, moved
+    # onto the host clock by a HardwareClock per file as the station did;
+    # transmitted frames by the host clock. Logs before version 3 do not
+    # record the wall clock, so the current offset is used, which is only
+    # right for logs written since the last boot.
+    frames = []
+    for path in paths:
+        with tl.TelemetryReader(path) as reader:
+            epoch_ns = reader.epoch_ns
+            if epoch_ns is None:
+                epoch_ns = time.time_ns() - time.monotonic_ns()
+            clock = cr.HardwareClock()
+            for record in reader.Frames():
+                if _IsStatus(record.msgtype):
+                    continue
+                if record.kind == tl.kReceived:
+                    clock.Observe(record.hardware_us, record.host_ns)
+                    time_ns = clock.HostTime(record.hardware_us)
+                    direction = 'Rx'
+                else:
+                    time_ns = record.host_ns
+                    direction = 'Tx'
+                frames.append(TraceFrame((time_ns + epoch_ns) / 1e9,
+                                         record.can_id, record.msgtype,
+                                         record.data, direction))
+    frames.sort(key=lambda frame: frame.time)
+    return frames
+
+
+def ReadCandump(path):
+    # candump -l log; it does not record direction, so every frame is 'Rx'
+    with open(path, 'r') as trace:
+        for line in trace:
+            match = kCandumpLine.match(line)
+            if match is None:
+                continue
+            stamp, can_id, payload = match.groups()
+            if int(can_id, 16) & kCanErrFlag:
+                yield _PCANError(float(stamp), bytes.fromhex(payload))
+                continue
+            msgtype = pb.PCAN_MESSAGE_STANDARD.value
+            if len(can_id) > 3:
+                msgtype |= pb.PCAN_MESSAGE_EXTENDED.value
+            data = b''
+            if payload.startswith('R'):
+                msgtype |= pb.PCAN_MESSAGE_RTR.value
+            else:
+                data = bytes.fromhex(payload)
+            yield TraceFrame(float(stamp), int(can_id, 16), msgtype, data, 'Rx')
+
+
+def ReadAsc(path):
+    with open(path, 'r') as trace:
+        for line in trace:
+            match = kAscLine.match(line)
+            if match is None:
+                error = kAscErrorLine.match(line)
+                if error is not None:
+                    # ASC error frames carry no details
+                    yield TraceFrame(float(error.group(1)), 0,
+                                     pb.PCAN_MESSAGE_ERRFRAME.value, b'', 'Rx')
+                continue
+            stamp, can_id, extended, direction, kind, _, data = match.groups()
+            msgtype = pb.PCAN_MESSAGE_STANDARD.value
+            if extended:
+                msgtype |= pb.PCAN_MESSAGE_EXTENDED.value
+            if kind == 'r':
+                msgtype |= pb.PCAN_MESSAGE_RTR.value
+                data = ''
+            yield TraceFrame(float(stamp), int(can_id, 16), msgtype,
+                             bytes.fromhex(data), direction)
+
+
+def ReadTrace(path):
+    # Frames of a trace, by file extension: .log (candump), .asc or .sctl
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.sctl':
+        return iter(ReadTelemetryLogs([path]))
+    if extension == '.asc':
+        return ReadAsc(path)
+    if extension == '.log':
+        return ReadCandump(path)
+    raise ValueError(f"{path}: unknown trace format (.log, .asc or .sctl)")
+
+
+# --------------------------------- Writing -------------------------------- #
+def WriteCandump(frames, path, interface='can0'):
+    # candump -l log; frame times are seconds since the epoch, as candump's
+    with open(path, 'w') as trace:
+        for frame in frames:
+            if _IsStatus(frame.msgtype):
+                continue
+            if _IsError(frame.msgtype):
+                trace.write(f'({frame.time:.6f}) {interface} '
+                            f'{_CandumpError(frame)}\n')
+                continue
+            can_id = (f'{frame.can_id:08X}' if _IsExtended(frame.msgtype)
+                      else f'{frame.can_id:03X}')
+            payload = 'R' if _IsRemote(frame.msgtype) else frame.data.hex().upper()
+            trace.write(f'({frame.time:.6f}) {interface} {can_id}#{payload}\n')
+
+
+def WriteAsc(frames, path, channel=1):
+    # Frame times are seconds since the epoch. The measurement starts at the
+    # first frame: the date header is its wall clock time and every frame
+    # is timed from it ("timestamps absolute" in ASC terms).
+    frames = iter(frames)
+    first_frame = next(frames, None)
+    first = time.time() if first_frame is None else first_frame.time
+    millis = int(first * 1000) % 1000
+    start = time.strftime(f'%a %b %d %H:%M:%S.{millis:03d} %Y',
+                          time.localtime(first))
+    with open(path, 'w') as trace:
+        trace.write(f'date {start}\nbase hex  timestamps absolute\n'
+                    f'internal events logged\nBegin Triggerblock {start}\n'
+                    f'   0.000000 Start of measurement\n')
+        if first_frame is not None:
+            frames = itertools.chain([first_frame], frames)
+        for frame in frames:
+            if _IsStatus(frame.msgtype):
+                continue
+            if _IsError(frame.msgtype):
+                trace.write(f'{frame.time - first:11.6f} {channel}  ErrorFrame\n')
+                continue
+            can_id = (f'{frame.can_id:X}x' if _IsExtended(frame.msgtype)
+                      else f'{frame.can_id:X}')
+            if _IsRemote(frame.msgtype):
+                body = 'r'
+            else:
+                body = f'd {len(frame.data)}' + ''.join(
+                    f' {byte:02X}' for byte in frame.data)
+            trace.write(f'{frame.time - first:11.6f} {channel}  {can_id:<15s} '
+                        f'{frame.direction:<4s} {body}\n')
+        trace.write('End TriggerBlock\n')
+
+
+def Export(log_paths, output_path):
+    # Writes TelemetryLog files as one trace, by the output extension
+    frames = ReadTelemetryLogs(log_paths)
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == '.asc':
+        WriteAsc(frames, output_path)
+    elif extension == '.log':
+        WriteCandump(frames, output_path)
+    else:
+        raise ValueError(f"{output_path}: export writes .log (candump) or .asc")
+    return len(frames)
+
+
+# --------------------------------- Replay --------------------------------- #
+def Replay(frames, bus, speed=1.0, include_tx=False, stop=None):
+    # Delivers trace frames on a VirtualBus with their recorded spacing
+    # divided by speed. Transmitted frames were the station's own and are
+    # skipped unless include_tx, status frames always. Error frames are
+    # injected as such (InjectErrorFrames). Returns the number of frames
+    # delivered; stops early once the stop event (threading.Event) is set.
+    start_ns = time.perf_counter_ns()
+    tick_ns = int(kReplayTick * 1e9)
+    first = None
+    batch = []
+    delivered = 0
+
+    for frame in frames:
+        if ((frame.direction == 'Tx' and not include_tx) or
+                _IsStatus(frame.msgtype)):
+            continue
+        if first is None:
+            first = frame.time
+        due_ns = start_ns + int((frame.time - first) / speed * 1e9)
+        error = _IsError(frame.msgtype)
+
+        # A batch holds the data frames due within kReplayTick of its first
+        # one; an error frame ends it
+        if len(batch) != 0 and (error or
+                                due_ns - batch[0].timestamp_ns > tick_ns or
+                                len(batch) >= kReplayBatch):
+            bus.DeliverMany(batch)
+            delivered += len(batch)
+            batch = []
+            if stop is not None and stop.is_set():
+                return delivered
+        if len(batch) == 0:
+            wait = (due_ns - time.perf_counter_ns()) / 1e9
+            if wait > 0:
+                time.sleep(wait)
+        if error:
+            bus.InjectErrorFrames()
+            delivered += 1
+        else:
+            batch.append(vb.VirtualFrame(due_ns, frame.can_id, frame.msgtype,
+                                         frame.data))
+
+    bus.DeliverMany(batch)
+    return delivered + len(batch)
+
+
+# ------------------------------- Driver trace ----------------------------- #
+def StartDriverTrace(pcan, channel, directory, max_size_mb=kTraceSize):
+    # Has the PCAN driver write the channel's traffic to segmented PEAK
+    # .trc files named by date and time in directory. Returns the status of
+    # the first setting that failed, or PCAN_ERROR_OK.
+    os.makedirs(directory, exist_ok=True)
+    settings = (
+        (pb.PCAN_TRACE_LOCATION, os.path.abspath(directory).encode()),
+        (pb.PCAN_TRACE_SIZE, max_size_mb),
+        (pb.PCAN_TRACE_CONFIGURE, pb.TRACE_FILE_SEGMENTED | pb.TRACE_FILE_DATE
+         | pb.TRACE_FILE_TIME),
+        (pb.PCAN_TRACE_STATUS, pb.PCAN_PARAMETER_ON),
+    )
+    for parameter, value in settings:
+        result = pcan.SetValue(channel, parameter, value)
+        if result != pb.PCAN_ERROR_OK:
+            return result
+    return pb.PCAN_ERROR_OK
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CAN trace tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser(
+        'export', help="write telemetry logs as a candump (.log) or ASC (.asc) trace")
+    export.add_argument('logs', nargs='+', help="TelemetryLog .sctl files")
+    export.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        count = Export(args.logs, args.output)
+        print(f"{count} frames written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,618 @@
+import PCANBasic as pb
+import BusHealth as bh
+import Chroma62000H as ch
+import CANCodec as cc
+import CANReceiver as cr
+import ShoreChargerProtocol as sp
+import SharedState as ss
+import Metrics as mt
+import Scheduler as sc
+import collections
+import time as tm
+
+kTxMessagePeriod = 100000000  # In Nano-seconds
+kRxBatchSize = 256            # Receive slots reused for every queue drain
+kErrorFrame = pb.PCAN_MESSAGE_ERRFRAME.value
+kStatusFrame = pb.PCAN_MESSAGE_STATUS.value
+kStandardData = pb.PCAN_MESSAGE_STANDARD.value  # MSGTYPE of the frames handled
+kLatencyTraces = 1024         # Latest setpoint latency traces kept
+kTraceTimeout = 10000000000   # Longest a setpoint is watched for at the output, in ns
+
+# PSU output taken as at a setpoint: its voltage this close, or its current
+# this close while the supply reports constant current (CC)
+kSettleVoltage = 0.5  # in V
+kSettleCurrent = 0.2  # in A
+
+
+def NewTxFrame(codec):
+    tx_msg = pb.TPCANMsg()
+    tx_msg.ID = codec.can_id
+    if codec.layout.is_extended:
+        tx_msg.MSGTYPE = pb.PCAN_MESSAGE_EXTENDED
+    else:
+        tx_msg.MSGTYPE = pb.PCAN_MESSAGE_STANDARD
+    tx_msg.LEN = codec.length
+    tx_msg.DATA[:codec.length] = codec.Encode()
+    return tx_msg
+
+
+def AtSetpoint(trace, measurement):
+    # Whether a PSU measurement shows the output at a traced setpoint: off
+    # when it is off, otherwise at its voltage, or at its current when the
+    # supply is current-limited. The current alone says nothing in CV: a
+    # small current request or an open output matches it from the start.
+    if (not trace.enable_output):
+        return not measurement.output_enable
+    if (not measurement.output_enable):
+        return False
+    if (measurement.status.cvcc == "CC"):
+        return abs(measurement.current - trace.current) <= kSettleCurrent
+    return abs(measurement.voltage - trace.voltage) <= kSettleVoltage
+
+
+class StationError(Exception):
+    pass
+
+
+class ChargerStation:
+    # One charge station: a PCAN channel and the Chroma PSU it drives, with
+    # the state, schedulers and metrics of that pair. The station never
+    # blocks on its own except in PSUStep; the runtimes decide when to call
+    #  - DrainReceive when the receive event fires
+    #  - RunTx at TimeToTx()
+    #  - PSUStep in a loop on a thread that may block on USB
+
+    def __init__(self, pcan, channel, chroma, codecs, name='Station',
+                 baudrate=pb.PCAN_BAUD_1M):
+        self.name = name
+        self.pcan = pcan
+        self.channel = channel
+        self.baudrate = baudrate  # to initialize the channel again after bus-off
+        self.chroma = chroma
+        self.codecs = codecs
+        self.receive_event = None
+        self.use_hardware_filter = True
+
+        # Called after ReopenChannel replaced the receive event, on the
+        # thread running RunTx (e.g. a runtime watching the event's fd)
+        self.on_reopen = None
+
+        self.state = ss.SharedState()
+        self.setpoints = ss.SetpointMailbox()
+
+        # Receive timestamps of the PCAN adapter, on the host clock
+        self.rx_clock = cr.HardwareClock()
+
+        # CAN request frame received -> SCPI setpoint written
+        self.setpoint_latency = mt.LatencyHistogram("Setpoint latency")
+
+        # CAN request frame received -> PSU output polled at the setpoint
+        self.response_latency = mt.LatencyHistogram("Response latency")
+
+        # Timeline of the latest setpoints (SharedState.LatencyTrace); the
+        # one written last is watched until the PSU output reaches it
+        self.latency_traces = collections.deque(maxlen=kLatencyTraces)
+        self.open_trace = None
+
+        # Age of the PSU measurement carried by each 0x611/0x615 report
+        self.report_age = mt.LatencyHistogram("Report data age")
+
+        # PSU polling: fast while the output is on or ramping, slow when idle
+        self.poll_scheduler = sc.AdaptivePollScheduler()
+
+        # Periodic CAN reports, scheduled on absolute deadlines
+        self.tx_scheduler = sc.PeriodicScheduler()
+
+        # Counters are published with each report cycle, not on every frame
+        self.msg_count = 0        # frames delivered by the driver
+        self.discarded_count = 0  # delivered frames without a handler (filtered in software)
+
+        # Bus state, overruns, error frames and bus-off recovery, sampled on
+        # a schedule of its own next to the reports
+        self.bus_health = bh.BusHealthMonitor(pcan, channel,
+                                              self.ReopenChannel)
+        self.health_scheduler = sc.PeriodicScheduler()
+        self.health_scheduler.Add('BusHealth', bh.kSamplePeriod,
+                                  self.bus_health.Sample)
+
+        # Record of every frame and measurement, when set (TelemetryLog)
+        self.telemetry_log = None
+
+        # Last setpoint written to the PSU
+        self.requested_voltage = 0.0
+        self.requested_current = 0.0
+        self.enable_output = False
+
+        request_codec = codecs.ByName(sp.kChargerRequest)
+        self._decode_request = request_codec.Decoder(
+            'EnableOutput', 'MaxACCurrent', 'RequestedVoltage', 'RequestedCurrent')
+
+        # Received message handlers keyed by CAN ID. The driver acceptance
+        # filter is built from these IDs, so only registered messages reach
+        # DrainReceive.
+        self.rx_handlers = {
+            request_codec.can_id: self.HandleChargerRequest,
+        }
+        self.rx_buffer = pb.TPCANReadBuffer(kRxBatchSize)
+
+        # Outgoing frames are templates: built once with their constant
+        # bytes, then only the reported signals are patched in place
+        self.output_codec = codecs.ByName(sp.kChargerOutput)
+        self.faults_codec = codecs.ByName(sp.kChargerFaults)
+        self.output_frame = NewTxFrame(self.output_codec)
+        self.faults_frame = NewTxFrame(self.faults_codec)
+        self.output_data = cc.DataView(self.output_frame.DATA)
+        self.faults_data = cc.DataView(self.faults_frame.DATA)
+        self._patch_output = self.output_codec.Patcher(
+            'MeasuredVoltage', 'MeasuredCurrent')
+        self._patch_faults = self.faults_codec.Patcher('ACFault', 'OPP', 'OVP')
+
+        # Frames of the reports due in one RunTx, written back to back
+        self.tx_pending = []
+
+        # Periodic messages, each with its own period and phase offset
+        self.tx_scheduler.Add(sp.kChargerOutput, kTxMessagePeriod,
+                              self.SendOutputReport)
+        self.tx_scheduler.Add(sp.kChargerFaults, kTxMessagePeriod,
+                              self.SendFaultReport)
+
+        self.RegisterMetrics(mt.registry)
+
+    def RegisterMetrics(self, registry):
+        # Exports the station in a Metrics registry. Counters the loops keep
+        # anyway are read at export time; the rest are recorded per drain,
+        # per TX run and per SCPI transaction, never per frame.
+        labels = {'station': self.name}
+        snapshot = self.state.Read
+
+        registry.Counter('shore_charger_can_rx_frames_total',
+                         "CAN frames read from the driver", labels,
+                         lambda: self.msg_count)
+        registry.Counter('shore_charger_can_rx_unhandled_total',
+                         "CAN frames read without a handler", labels,
+                         lambda: self.discarded_count)
+        self.rx_errors = registry.Counter(
+            'shore_charger_can_rx_errors_total',
+            "CAN reads that failed for other reasons than the bus state", labels)
+        health = self.bus_health
+        registry.Gauge('shore_charger_can_bus_state',
+                       "CAN bus state: 0 active, 1 light, 2 heavy, 3 passive, 4 off",
+                       labels, lambda: bh.kBusStates.index(health.state))
+        registry.Counter('shore_charger_can_error_frames_total',
+                         "CAN error frames reported by the driver", labels,
+                         lambda: health.error_frames)
+        registry.Counter('shore_charger_can_overruns_total',
+                         "CAN receive queue or controller overruns", labels,
+                         lambda: health.overruns)
+        registry.Counter('shore_charger_can_bus_off_total',
+                         "Times the CAN controller went bus-off", labels,
+                         lambda: health.bus_off_count)
+        registry.Counter('shore_charger_can_bus_resets_total',
+                         "Channel reinitializations that left bus-off", labels,
+                         lambda: health.resets)
+        self.rx_drain = registry.Histogram(
+            'shore_charger_can_rx_drain_seconds',
+            "Time to empty the receive queue, per CAN loop pass", labels)
+        self.tx_errors = registry.Counter(
+            'shore_charger_can_tx_errors_total',
+            "Periodic CAN reports the driver did not accept", labels)
+
+        for task in self.tx_scheduler.tasks:
+            task_labels = {**labels, 'message': task.name}
+            registry.Counter('shore_charger_can_tx_runs_total',
+                             "Periodic CAN report runs", task_labels,
+                             lambda task=task: task.lateness.count)
+            registry.Counter('shore_charger_can_tx_missed_total',
+                             "Periodic CAN report deadlines skipped",
+                             task_labels, lambda task=task: task.missed)
+            registry.Gauge('shore_charger_can_tx_jitter_p99_seconds',
+                           "P99 period jitter of the last 1024 reports",
+                           task_labels,
+                           lambda task=task: task.jitter.P99() / 1e9)
+            registry.Histogram('shore_charger_can_tx_lateness_seconds',
+                               "Report start after its deadline", task_labels,
+                               task.lateness)
+
+        registry.Histogram('shore_charger_setpoint_latency_seconds',
+                           "CAN request received to SCPI setpoint written",
+                           labels, self.setpoint_latency)
+        registry.Histogram('shore_charger_response_latency_seconds',
+                           "CAN request received to PSU output at the setpoint",
+                           labels, self.response_latency)
+        registry.Histogram('shore_charger_report_age_seconds',
+                           "Age of the PSU measurement in each report",
+                           labels, self.report_age)
+        registry.Gauge('shore_charger_psu_voltage_volts',
+                       "Measured PSU output voltage", labels,
+                       lambda: snapshot().measured_voltage)
+        registry.Gauge('shore_charger_psu_current_amperes',
+                       "Measured PSU output current", labels,
+                       lambda: snapshot().measured_current)
+        registry.Gauge('shore_charger_psu_output_enabled',
+                       "Measured PSU output state", labels,
+                       lambda: int(snapshot().measured_output_enable))
+        registry.Gauge('shore_charger_psu_poll_rate_hertz',
+                       "Effective PSU poll rate", labels,
+                       lambda: snapshot().poll_rate)
+        self.chroma.Instrument(registry, labels)
+
+    # ------------------------------- CAN side ------------------------------ #
+
+    def OpenReceive(self, use_hardware_filter=True):
+        # Configures the acceptance filter before any frames are read, then
+        # registers the receive event. Returns the filter ranges, or None if
+        # the whole bus is received.
+        self.use_hardware_filter = use_hardware_filter
+        id_ranges = None
+        if use_hardware_filter:
+            id_ranges = cr.IdRanges(self.rx_handlers.keys())
+            result = cr.ConfigureAcceptanceFilter(
+                self.pcan, self.channel, id_ranges)
+            if result != pb.PCAN_ERROR_OK:
+                id_ranges = None
+
+        self.bus_health.Configure()
+        self.receive_event = cr.CANReceiveEvent(self.pcan, self.channel)
+        return id_ranges
+
+    def CloseReceive(self):
+        if self.receive_event is not None:
+            self.receive_event.Close()
+
+    def Close(self):
+        # Releases the PCAN channel and the supply opened by OpenStation
+        self.CloseReceive()
+        self.pcan.Uninitialize(self.channel)
+        self.chroma.Close()
+
+    def ReopenChannel(self):
+        # Uninitializes and initializes the channel to take the controller
+        # out of bus-off (CAN_Reset only flushes the queues), then applies
+        # the filter, receive event and bus settings again
+        self.CloseReceive()
+        self.pcan.Uninitialize(self.channel)
+        result = self.pcan.Initialize(self.channel, self.baudrate)
+        if (result != pb.PCAN_ERROR_OK and result != pb.PCAN_ERROR_CAUTION):
+            return result
+        self.OpenReceive(self.use_hardware_filter)
+        if (self.on_reopen is not None):
+            self.on_reopen()
+        return pb.PCAN_ERROR_OK
+
+    def HandleChargerRequest(self, rx_msg, rx_timestamp):
+        handled_ns = tm.monotonic_ns()
+        enable, max_ac_current, requested_voltage, requested_current = \
+            self._decode_request(rx_msg.DATA)
+        enable_output = bool(enable)
+
+        # Requests repeat periodically; only changes are worth waking the PSU for
+        snapshot = self.state.Read()
+        if (requested_voltage == snapshot.requested_voltage and
+                requested_current == snapshot.requested_current and
+                enable_output == snapshot.enable_output and
+                max_ac_current == snapshot.max_ac_current):
+            return
+
+        # Publish the whole request at once so the PSU never sees half of it
+        self.state.Publish(
+            enable_output=enable_output,
+            max_ac_current=max_ac_current,
+            requested_voltage=requested_voltage,
+            requested_current=requested_current)
+
+        received_ns = self.rx_clock.HostTime(cr.TimestampMicros(rx_timestamp))
+        self.setpoints.Post(ss.Setpoint(requested_voltage, requested_current,
+                                        enable_output, received_ns, handled_ns))
+
+    def DrainReceive(self):
+        start_ns = tm.perf_counter_ns()
+        rx_buffer = self.rx_buffer
+        rx_handlers = self.rx_handlers
+
+        while(1):
+            result, count = self.pcan.ReadBatch(self.channel, rx_buffer)
+            self.msg_count = self.msg_count + count
+            if (count != 0):
+                # The last frame read waited least: it best relates the clocks
+                read_ns = tm.monotonic_ns()
+                self.rx_clock.Observe(
+                    cr.TimestampMicros(rx_buffer.Timestamps[count - 1]), read_ns)
+                if (self.telemetry_log is not None):
+                    self.telemetry_log.LogReceived(rx_buffer, count, read_ns)
+
+            for i in range(count):
+                rx_msg = rx_buffer.Messages[i]
+
+                # Handlers are keyed by 11-bit ID only: extended, remote,
+                # FD, error and status frames with the same ID are not
+                # requests (the software path receives them all)
+                if (rx_msg.MSGTYPE != kStandardData):
+                    if (rx_msg.MSGTYPE & kErrorFrame):
+                        self.bus_health.error_frames += 1
+                    elif (rx_msg.MSGTYPE & kStatusFrame):
+                        self.bus_health.RecordStatusFrame(rx_msg.DATA)
+                    else:
+                        self.discarded_count = self.discarded_count + 1
+                    continue
+
+                handler = rx_handlers.get(rx_msg.ID)
+                if (handler is None):
+                    self.discarded_count = self.discarded_count + 1
+                else:
+                    handler(rx_msg, rx_buffer.Timestamps[i])
+
+            # A full buffer means more frames may be pending
+            if (result != pb.PCAN_ERROR_OK):
+                if (result != pb.PCAN_ERROR_QRCVEMPTY):
+                    self.bus_health.Record(result)
+                    if (result & ~bh.kStatusBits):
+                        self.rx_errors.Inc()
+                break
+
+        self.rx_drain.Record(tm.perf_counter_ns() - start_ns)
+
+    def StartTx(self, now_ns):
+        self.tx_scheduler.Start(now_ns)
+        self.health_scheduler.Start(now_ns)
+
+    def TimeToTx(self):
+        # Seconds until the next periodic message or bus health sample is due
+        return (min(self.tx_scheduler.NextDeadline(),
+                    self.health_scheduler.NextDeadline())
+                - tm.monotonic_ns()) / 1e9
+
+    def RunTx(self):
+        now_ns = tm.monotonic_ns()
+        self.tx_scheduler.RunDue(now_ns, tm.monotonic_ns)
+        self.health_scheduler.RunDue(now_ns, tm.monotonic_ns)
+        if (len(self.tx_pending) != 0):
+            self.FlushTx()
+
+    def SendOutputReport(self):
+        snapshot = self.state.Read()
+
+        # How old the reported measurement is when it goes on the bus
+        if (snapshot.measured_time_ns != 0):
+            self.report_age.Record(tm.monotonic_ns() - snapshot.measured_time_ns)
+
+        self._patch_output(self.output_data, snapshot.measured_voltage,
+                           snapshot.measured_current)
+        self.Transmit(self.output_frame)
+
+        if (self.msg_count != snapshot.msg_count or
+                self.bus_health.state != snapshot.bus_state):
+            self.state.Publish(msg_count=self.msg_count,
+                               discarded_count=self.discarded_count,
+                               bus_state=self.bus_health.state)
+
+    def SendFaultReport(self):
+        status = self.state.Read().measured_status
+
+        self._patch_faults(self.faults_data, status.ac_fault, status.opp,
+                           status.ovp)
+        self.Transmit(self.faults_frame)
+
+    def Transmit(self, tx_msg):
+        # Queues a frame for the end of the current RunTx
+        self.tx_pending.append(tx_msg)
+
+    def FlushTx(self):
+        # Writes the queued frames. The driver stops at the first one it does
+        # not accept; that one and the rest are counted as TX errors and wait
+        # for their next period.
+        pending = self.tx_pending
+        result, count = self.pcan.WriteMany(self.channel, pending)
+        if (result != pb.PCAN_ERROR_OK):
+            self.tx_errors.Inc(len(pending) - count)
+        if (self.telemetry_log is not None):
+            host_ns = tm.monotonic_ns()
+            for i in range(count):
+                self.telemetry_log.LogTransmitted(pending[i], host_ns)
+        pending.clear()
+
+    # ------------------------------- PSU side ------------------------------ #
+
+    def PSUStep(self):
+        # Sleeps until the CAN decoder posts a setpoint or a poll is due, then
+        # writes the setpoint and/or polls. Blocks on USB I/O.
+        curr_time = tm.monotonic_ns()
+        time_to_fetch = (self.poll_scheduler.NextPoll(curr_time) - curr_time) / 1e9
+        setpoint = self.setpoints.Take(max(time_to_fetch, 0))
+
+        if (setpoint is not None):
+            self.ApplySetpoint(setpoint)
+
+        curr_time = tm.monotonic_ns()
+        if (curr_time >= self.poll_scheduler.NextPoll(curr_time)):
+            self.Poll(curr_time)
+
+    def ApplySetpoint(self, setpoint):
+        chroma = self.chroma
+        written = False
+
+        # Voltage, current and output go out as one SCPI transaction
+        with chroma.Batch():
+            if (self.requested_voltage != setpoint.voltage):
+                # send voltage request to PSU
+                self.requested_voltage = setpoint.voltage
+                chroma.SetVoltage(self.requested_voltage)
+                written = True
+
+            if (self.requested_current != setpoint.current):
+                # send current request to PSU
+                self.requested_current = setpoint.current
+                chroma.SetCurrent(self.requested_current)
+                written = True
+
+            if (self.enable_output != setpoint.enable_output):
+                self.enable_output = setpoint.enable_output
+                if (self.enable_output):
+                    chroma.EnableOutput()
+                else:
+                    chroma.DisableOutput()
+                written = True
+
+        if (written):
+            written_ns = tm.monotonic_ns()
+            self.setpoint_latency.Record(written_ns - setpoint.received_ns)
+            self.poll_scheduler.SetpointChanged(written_ns)
+
+            # A newer setpoint ends the trace of the one before it
+            if (self.open_trace is not None):
+                self.CloseTrace()
+            self.open_trace = ss.LatencyTrace(setpoint, written_ns)
+
+    def Poll(self, start_ns):
+        measurement = self.chroma.MeasureAll()
+        measured_time = tm.monotonic_ns()
+        self.poll_scheduler.RecordPoll(start_ns, measured_time,
+                                       measurement.output_enable)
+        if (self.telemetry_log is not None):
+            self.telemetry_log.LogMeasurement(measurement, measured_time)
+
+        # Publish the poll as one snapshot so reports never mix polls
+        self.state.Publish(measured_voltage=measurement.voltage,
+                           measured_current=measurement.current,
+                           measured_output_enable=measurement.output_enable,
+                           measured_status=measurement.status,
+                           measured_time_ns=measured_time,
+                           poll_rate=self.poll_scheduler.Rate(measured_time))
+
+        trace = self.open_trace
+        if (trace is not None):
+            if (AtSetpoint(trace, measurement)):
+                trace.reflected_ns = measured_time
+                self.response_latency.Record(measured_time - trace.received_ns)
+                self.CloseTrace()
+            elif (measured_time - trace.written_ns > kTraceTimeout):
+                self.CloseTrace()
+
+    def CloseTrace(self):
+        self.latency_traces.append(self.open_trace)
+        if (self.telemetry_log is not None):
+            self.telemetry_log.LogLatencyTrace(self.open_trace)
+        self.open_trace = None
+
+    def Abort(self):
+        self.chroma.Abort()
+        tm.sleep(0.1)
+        self.chroma.Abort()
+        tm.sleep(0.1)
+
+    # -------------------------------- Info --------------------------------- #
+
+    def Info(self, run_time):
+        # Status lines printed by the info loop; run_time in seconds
+        snapshot = self.state.Read()
+
+        if (snapshot.measured_output_enable == True):
+            output_enable_string = "ON"
+        else:
+            output_enable_string = "OFF"
+
+        return ("Run Time: " + f'{run_time/60:.2f}'
+                + "mins    CAN Msg Count: " + str(snapshot.msg_count)
+                + " (" + str(snapshot.discarded_count) + " unhandled, "
+                + str(self.rx_errors.Value()) + " RX errors, "
+                + str(self.tx_errors.Value()) + " TX errors)    "
+                + "PSU Measured Voltage: " + f'{snapshot.measured_voltage:.2f}'
+                + " V    "
+                + "PSU Measured Current: " + f'{snapshot.measured_current:.2f}'
+                + " A" + "    Output is " + output_enable_string + "\n"
+                + self.bus_health.Summary() + "\n"
+                + self.setpoint_latency.Summary() + "    "
+                + self.response_latency.Summary() + "\n"
+                + self.LastTrace()
+                + "PSU poll rate: " + f'{snapshot.poll_rate:.1f}' + " Hz    "
+                + self.report_age.Summary() + "\n"
+                + self.tx_scheduler.Summary())
+
+    def LastTrace(self):
+        # Info line of the latest finished latency trace, if any
+        if (len(self.latency_traces) == 0):
+            return ""
+        return "Last setpoint: " + self.latency_traces[-1].Format() + "\n"
+
+    def LatencyReport(self):
+        # Setpoint and response latency histograms
+        return (self.setpoint_latency.Format() + "\n"
+                + self.response_latency.Format())
+
+    def Telemetry(self, run_time):
+        # Picklable summary of the station for a supervising process
+        snapshot = self.state.Read()
+        telemetry = {name: getattr(snapshot, name) for name in snapshot.__slots__}
+        telemetry['name'] = self.name
+        telemetry['info'] = self.Info(run_time)
+        telemetry['latency'] = self.LatencyReport()
+        telemetry['tx_jitter_p99'] = {task.name: task.jitter.P99()
+                                      for task in self.tx_scheduler.tasks}
+        return telemetry
+
+
+def StationsInfo(stations, run_time):
+    # Info text of all stations, each under its name when there are several
+    if len(stations) == 1:
+        return stations[0].Info(run_time)
+    return "\n".join("--- " + station.name + " ---\n" + station.Info(run_time)
+                     for station in stations)
+
+
+def StationsLatency(stations):
+    # Setpoint and response latency histograms of all stations
+    if len(stations) == 1:
+        return stations[0].LatencyReport()
+    return "\n".join("--- " + station.name + " ---\n"
+                     + station.LatencyReport() for station in stations)
+
+
+def OpenStation(station_config, codecs, pcan, resource_manager=None,
+                device=None):
+    # Initializes the PCAN channel and the Chroma supply of a StationConfig
+    # and returns the ChargerStation with its receive path open. Raises
+    # StationError when either device cannot be used. device replaces the
+    # supply's VISA resource (e.g. a SimulatedChroma).
+    pcan_handle = station_config.Channel()   # Get PCAN Channel
+    baudrate = station_config.Baudrate()     # Setup Connection's Baud Rate
+    result = pcan.Initialize(pcan_handle, baudrate)  # initialize device
+
+    if result != pb.PCAN_ERROR_OK:
+        if result != pb.PCAN_ERROR_CAUTION:
+            raise StationError("PCAN Error! " + station_config.channel)
+        # The channel joined the bus at another bitrate; release it
+        pcan.Uninitialize(pcan_handle)
+        raise StationError("The bitrate being used is different than the given one")
+
+    # Initialize Chroma PSU object
+    print("Initializing Chroma")
+    chroma = ch.CHROMA_62000H(station_config.psu, device=device,
+                              resource_manager=resource_manager)
+
+    # The channel is released again if the supply cannot be used
+    if chroma.status == "Not Connected":
+        pcan.Uninitialize(pcan_handle)
+        raise StationError("Chroma PSU Error! " + chroma.error_reason)
+
+    try:
+        chroma.ConfigureDefaultProtections()
+    except Exception:
+        chroma.Close()
+        pcan.Uninitialize(pcan_handle)
+        raise
+
+    station = ChargerStation(pcan, pcan_handle, chroma, codecs,
+                             station_config.name, baudrate)
+
+    # Configure the acceptance filter, then register the receive event so
+    # the CAN loop sleeps until frames arrive. Without the filter the whole
+    # bus is received (e.g. for debugging).
+    rx_filter_ranges = station.OpenReceive(station_config.use_hardware_filter)
+    if rx_filter_ranges is not None:
+        print("PCAN filter accepting IDs: " + ", ".join(
+            f'0x{from_id:03X}-0x{to_id:03X}' for from_id, to_id in rx_filter_ranges))
+    elif station_config.use_hardware_filter:
+        print("PCAN filter could not be set, receiving all frames")
+    if not station.receive_event.IsAvailable():
+        print("PCAN receive event unavailable, falling back to polling")
+
+    return station
@@ -8,12 +8,25 @@
 # - Download and install National Instruments VISA software (https://www.ni.com/en-us/support/downloads/drivers/download.ni-visa.html#442805)
 # - Download and install PyVISA (eg. "pip install -U pyvisa" from command line)
 
-from dataclasses import dataclass
-from pyvisa import ResourceManager
-from visa import *
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import threading
 import time
 
-_delay = 0.01  # in seconds
+_delay = 0.01  # Minimum gap between two transactions, in seconds
+_compound_timeouts = 3  # Compound query timeouts in a row before it is given up
+
+
+def _QueryErrors():
+    # Exceptions of a query that got no usable response: VISA I/O errors
+    # (e.g. a timeout) from PyVISA, TimeoutError from in-process stand-ins.
+    # Only called once a query failed, so PyVISA stays unimported otherwise.
+    try:
+        from pyvisa.errors import VisaIOError
+    except ImportError:
+        return (TimeoutError,)
+    return (VisaIOError, TimeoutError)
+
 
 # Make a struct for the status
 
@@ -35,14 +48,56 @@ class ChromaStatus:
     cvcc: str = "CV"
 
 
+# Make a struct for one measurement of the output
+
+
+@dataclass
+class ChromaMeasurement:
+    voltage: float = 0.0
+    current: float = 0.0
+    output_enable: bool = False
+    status: ChromaStatus = field(default_factory=ChromaStatus)
+
+
 class CHROMA_62000H:
     kMaxPossibleVoltage = 1000.0
     kMaxPossibleCurrent = 15.0
     kMaxPossiblePower = 15000.0
 
-    def __init__(self, usb_or_serial='USB0'):
+    def __init__(self, usb_or_serial='USB0', device=None, command_gap=_delay,
+                 wait_for_completion=False, resource_manager=None):
+        # resource_manager: VISA ResourceManager shared by several supplies;
+        #   a new one is created when not given
+        # command_gap: minimum time between the end of one transaction and the
+        #   start of the next one
+        # wait_for_completion: follow every write with *OPC? instead of
+        #   relying on the gap alone
+        self.command_gap = command_gap
+        self.wait_for_completion = wait_for_completion
+        self._last_transaction = 0.0
+        self._batch = None
+        self.compound_queries = True
+        self.compound_timeouts = 0  # in a row
+        # Serializes transactions and batches issued from different threads
+        self._lock = threading.RLock()
+        # SCPI transaction timing, see Instrument()
+        self._metrics = None
+        self._transaction_time = {}
+
+        if device is not None:
+            # Already opened instrument (or an in-process stand-in)
+            self.device = device
+            self.address = getattr(device, 'resource_name', usb_or_serial)
+            self.status = "Chroma 62000H Supply Connected"
+            self.connected_with = 'USB'
+            return
+
         try:
-            self.rm = ResourceManager()
+            if resource_manager is None:
+                # PyVISA is only imported to open a real supply
+                import pyvisa
+                resource_manager = pyvisa.ResourceManager()
+            self.rm = resource_manager
             self.instrument_list = self.rm.list_resources()
 
             self.address = [elem for elem in self.instrument_list if (elem.find('USB') != -1 and elem.find(
@@ -59,6 +114,9 @@ class CHROMA_62000H:
                 self.status = "Chroma 62000H Supply Connected"
                 self.connected_with = 'USB'
 
+        except ImportError:
+            self.status = "Not Connected"
+            self.error_reason = "PyVISA is not installed"
         except:
             self.status = "Not Connected"
             self.error_reason = "except: PyVISA is not able to find any devices"
@@ -66,36 +124,118 @@ class CHROMA_62000H:
     def IsConnected(self):
         return self.status
 
+    def Close(self):
+        if self.status != "Not Connected":
+            self.device.close()
+            self.status = "Not Connected"
+
     def ConfigureDefaultProtections(self):
         # Configure default protection limits
-        kMinAllowableCurrent = 0.0
-        kMaxAllowableCurrent = 15.0
-        self.SetCurrentLimits(kMinAllowableCurrent, kMaxAllowableCurrent)
-
-        kMinAllowableVoltage = 0.0
-        kMaxAllowableVoltage = 706.0
-        self.SetVoltageLimits(kMinAllowableVoltage, kMaxAllowableVoltage)
-
-        kAbsoluteMaxVoltage = 708.0
-        kAbsoluteMaxCurrent = 15.0
-        kApsoluteMaxPower = 15000.0
-        self.SetOVP(kAbsoluteMaxVoltage)
-        self.SetOCP(kAbsoluteMaxCurrent)
-        self.SetOPP(kApsoluteMaxPower)
-
-        self.SetVoltage(0)
-        self.SetCurrent(0)
+        with self.Batch():
+            kMinAllowableCurrent = 0.0
+            kMaxAllowableCurrent = 15.0
+            self.SetCurrentLimits(kMinAllowableCurrent, kMaxAllowableCurrent)
+
+            kMinAllowableVoltage = 0.0
+            kMaxAllowableVoltage = 706.0
+            self.SetVoltageLimits(kMinAllowableVoltage, kMaxAllowableVoltage)
+
+            kAbsoluteMaxVoltage = 708.0
+            kAbsoluteMaxCurrent = 15.0
+            kApsoluteMaxPower = 15000.0
+            self.SetOVP(kAbsoluteMaxVoltage)
+            self.SetOCP(kAbsoluteMaxCurrent)
+            self.SetOPP(kApsoluteMaxPower)
+
+            self.SetVoltage(0)
+            self.SetCurrent(0)
+
+    def Instrument(self, registry, labels):
+        # Records the duration of every SCPI transaction in a Metrics
+        # registry, per command: the headers of a batch, without values
+        self._metrics = (registry, labels)
+        self._transaction_time = {}
+
+    def _RecordTransaction(self, command, start_ns):
+        headers = ';'.join(part.split(' ', 1)[0] for part in command.split(';'))
+        histogram = self._transaction_time.get(headers)
+        if histogram is None:
+            registry, labels = self._metrics
+            histogram = registry.Histogram(
+                'shore_charger_scpi_transaction_seconds',
+                "Duration of SCPI transactions with the PSU",
+                {**labels, 'command': headers})
+            self._transaction_time[headers] = histogram
+        histogram.Record(time.perf_counter_ns() - start_ns)
+
+    def _WaitForGap(self):
+        remaining = self._last_transaction + self.command_gap - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
 
     def WriteCommand(self, command):
+        with self._lock:
+            if self._batch is not None:
+                self._batch.append(command)
+                return
+            self._Send(command)
+
+    def _Send(self, command):
+        self._WaitForGap()
+        start_ns = time.perf_counter_ns()
         self.device.write(command)
-        time.sleep(_delay)
+        if self.wait_for_completion:
+            self.device.query('*OPC?')
+        self._last_transaction = time.perf_counter()
+        if self._metrics is not None:
+            self._RecordTransaction(command, start_ns)
+
+    def QueryCommand(self, query):
+        # Queries flush a pending batch first so they observe its settings
+        with self._lock:
+            self.FlushBatch()
+            self._WaitForGap()
+            start_ns = time.perf_counter_ns()
+            response = self.device.query(query)
+            self._last_transaction = time.perf_counter()
+            if self._metrics is not None:
+                self._RecordTransaction(query, start_ns)
+        return response
+
+    @contextmanager
+    def Batch(self):
+        # Commands issued inside the block are sent as a single ';'-joined
+        # write when the block exits, e.g.
+        #   with chroma.Batch():
+        #       chroma.SetVoltage(400)
+        #       chroma.SetCurrent(10)
+        #       chroma.EnableOutput()
+        with self._lock:
+            nested = self._batch is not None
+            if not nested:
+                self._batch = []
+            try:
+                yield self
+            finally:
+                if not nested:
+                    self.FlushBatch(close=True)
+
+    def FlushBatch(self, close=False):
+        commands = self._batch
+        if commands is None:
+            return
+        self._batch = None if close else []
+        if len(commands) != 0:
+            # Every command starts at the root (':'), so ';' chains them
+            self._Send(';'.join(commands))
 
     def Abort(self):
-        command = ':ABOR'
-        self.WriteCommand(command)
+        with self.Batch():
+            command = ':ABOR'
+            self.WriteCommand(command)
 
-        self.SetVoltage(0)
-        self.SetCurrent(0)
+            self.SetVoltage(0)
+            self.SetCurrent(0)
 
     def EnableOutput(self):
         command = ':CONF:OUTP ON'
@@ -151,71 +291,77 @@ class CHROMA_62000H:
 
     def GetOutputState(self):
         query = ':CONF:OUTP?'
-        out_state = self.device.query(query)
-        if (out_state == "ON\n"):
+        out_state = self.QueryCommand(query)
+        return self._ParseOutputState(out_state)
+
+    def _ParseOutputState(self, out_state):
+        if (out_state.strip() == "ON"):
             return True
         return False
 
     def GetConfiguredVoltage(self):
         query = ':SOUR:VOLT?'
-        voltage = self.device.query(query)
+        voltage = self.QueryCommand(query)
         return voltage
 
     def GetVoltageLimits(self):
         query = ':SOUR:VOLT:LIMIT:LOW?'
-        low = self.device.query(query)
+        low = self.QueryCommand(query)
         query = ':SOUR:VOLT:LIMIT:HIGH?'
-        high = self.device.query(query)
+        high = self.QueryCommand(query)
         return (low, high)
 
     def GetConfiguredCurrent(self):
         query = ':SOUR:CURR?'
-        current = self.device.query(query)
+        current = self.QueryCommand(query)
         return current
 
     def GetCurrentLimits(self):
         query = ':SOUR:CURR:LIMIT:LOW?'
-        low = self.device.query(query)
+        low = self.QueryCommand(query)
         query = ':SOUR:CURR:LIMIT:HIGH?'
-        high = self.device.query(query)
+        high = self.QueryCommand(query)
         return (low, high)
 
     def GetOVP(self):
         query = ':SOUR:VOLT:PROT:HIGH?'
-        ovp = self.device.query(query)
+        ovp = self.QueryCommand(query)
         return ovp
 
     def GetOCP(self):
         query = ':SOUR:CURR:PROT:HIGH?'
-        ocp = self.device.query(query)
+        ocp = self.QueryCommand(query)
         return ocp
 
     def GetOPP(self):
         query = ':SOUR:POW:PROT:HIGH?'
-        opp = self.device.query(query)
+        opp = self.QueryCommand(query)
         return opp
 
     def MeasureVoltage(self):
         command = ':MEAS:VOLT?'
-        volt = self.device.query(command)
+        volt = self.QueryCommand(command)
         volt = float(volt)
         return volt
 
     def MeasureCurrent(self):
         query = ':MEAS:CURR?'
-        curr = self.device.query(query)
+        curr = self.QueryCommand(query)
         curr = float(curr)
         return curr
 
     def MeasurePower(self):
         query = ':MEAS:POW?'
-        power = self.device.query(query)
+        power = self.QueryCommand(query)
         power = float(power)
         return power
 
     def FetchStatus(self):
         query = ':FETC:STAT?'
-        raw = self.device.query(query)
+        raw = self.QueryCommand(query)
+        return self._ParseStatus(raw)
+
+    def _ParseStatus(self, raw):
         status0 = ord(raw[0])
         status1 = ord(raw[1])
 
@@ -233,5 +379,54 @@ class CHROMA_62000H:
         status_struct.ac_fault = (status1 >> 9) & 0x01
         status_struct.fold_back_cv_2_cc = (status1 >> 10) & 0x01
         status_struct.fold_back_cc_2_cv = (status1 >> 11) & 0x01
-        # TODO Arg2 and Arg3
+
+        # Arg2 and Arg3, after the two status characters: output state and
+        # regulation mode, e.g. ',ON,CC'. Kept at their defaults if absent.
+        for arg in raw[2:].replace(',', ' ').split():
+            arg = arg.upper()
+            if arg in ('ON', 'OFF'):
+                status_struct.output_state = arg
+            elif arg in ('CV', 'CC'):
+                status_struct.cvcc = arg
         return status_struct
+
+    def MeasureAll(self):
+        # Voltage, current, output state and status in a single round trip.
+        # When the compound query fails, the supply's buffers are cleared
+        # and this poll falls back to one query per value. A malformed
+        # response means the supply does not support the compound query, so
+        # it is not sent again; a timeout may be a passing USB hiccup, so it
+        # is given up only after _compound_timeouts in a row.
+        if self.compound_queries:
+            query = ':MEAS:VOLT?;:MEAS:CURR?;:CONF:OUTP?;:FETC:STAT?'
+            raw = None
+            try:
+                raw = self.QueryCommand(query)
+            except _QueryErrors():
+                self.compound_timeouts += 1
+                if self.compound_timeouts >= _compound_timeouts:
+                    self.compound_queries = False
+            if raw is not None:
+                try:
+                    # The status is raw characters and may itself contain ';'
+                    fields = raw.split(';', 3)
+                    if len(fields) == 4:
+                        measurement = ChromaMeasurement(
+                            voltage=float(fields[0]),
+                            current=float(fields[1]),
+                            output_enable=self._ParseOutputState(fields[2]),
+                            status=self._ParseStatus(fields[3]))
+                        self.compound_timeouts = 0
+                        return measurement
+                except (ValueError, IndexError):
+                    pass
+                self.compound_queries = False
+            # Drop whatever is left of the response before the next query
+            with self._lock:
+                self.device.clear()
+
+        return ChromaMeasurement(
+            voltage=self.MeasureVoltage(),
+            current=self.MeasureCurrent(),
+            output_enable=self.GetOutputState(),
+            status=self.FetchStatus())
@@ -0,0 +1,196 @@
+import threading
+
+class LatencyHistogram:
+    # Histogram of latencies in nanoseconds with power-of-two buckets:
+    # bucket n counts values in [2^(n-1), 2^n). Recording is a bit_length()
+    # and an increment. Percentiles are reported as the upper bucket bound.
+    # Meant for a single writer thread; readers may see a slightly stale view.
+    kBuckets = 64
+
+    def __init__(self, name):
+        self.name = name
+        self.buckets = [0] * self.kBuckets
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def Record(self, value_ns):
+        if value_ns < 0:
+            value_ns = 0
+        self.buckets[min(value_ns.bit_length(), self.kBuckets - 1)] += 1
+        self.count += 1
+        self.total += value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+        if self.max is None or value_ns > self.max:
+            self.max = value_ns
+
+    def Percentile(self, percent):
+        if self.count == 0:
+            return 0
+        target = self.count * percent / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(1 << index, self.max)
+        return self.max
+
+    def Mean(self):
+        if self.count == 0:
+            return 0
+        return self.total / self.count
+
+    def Summary(self):
+        return (self.name + ": n=" + str(self.count)
+                + f'  p50={self.Percentile(50) / 1e6:.2f}ms'
+                + f'  p99={self.Percentile(99) / 1e6:.2f}ms'
+                + f'  max={(self.max or 0) / 1e6:.2f}ms')
+
+    def Format(self):
+        # Multi-line text histogram of the non-empty buckets
+        lines = [self.Summary()]
+        if self.count == 0:
+            return lines[0]
+        peak = max(self.buckets)
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count == 0:
+                continue
+            upper = (1 << index) / 1e6
+            bar = '#' * max(1, int(40 * bucket_count / peak))
+            lines.append(f'  < {upper:10.3f} ms  {bucket_count:8d}  {bar}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    # Monotonic count. Inc() is a plain attribute update, cheap enough for
+    # the hot paths; when function is given it is read at export time
+    # instead, so counters the code keeps anyway cost nothing to export.
+    def __init__(self, name, function=None):
+        self.name = name
+        self.value = 0
+        self.function = function
+
+    def Inc(self, amount=1):
+        self.value += amount
+
+    def Value(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class Gauge(Counter):
+    # Current value of something, set when it changes or read at export time
+    def Set(self, value):
+        self.value = value
+
+
+class Registry:
+    # Named metrics with labels, exported in the Prometheus text format.
+    # Registering a metric under the name and labels of an existing one
+    # replaces it (e.g. a station reopened under the same name).
+    kHistogramBuckets = range(10, 36)  # exported bucket bounds: 2^10..2^35 ns
+
+    def __init__(self):
+        self.metrics = {}  # (name, labels) -> (type, help, metric)
+        self.lock = threading.Lock()
+
+    def Add(self, kind, name, help, labels, metric):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.metrics[key] = (kind, help, metric)
+        return metric
+
+    def Counter(self, name, help, labels={}, function=None):
+        return self.Add('counter', name, help, labels, Counter(name, function))
+
+    def Gauge(self, name, help, labels={}, function=None):
+        return self.Add('gauge', name, help, labels, Gauge(name, function))
+
+    def Histogram(self, name, help, labels={}, histogram=None):
+        # Exports a LatencyHistogram (in seconds); a new one unless given
+        if histogram is None:
+            histogram = LatencyHistogram(name)
+        return self.Add('histogram', name, help, labels, histogram)
+
+    def Expose(self):
+        with self.lock:
+            metrics = sorted(self.metrics.items(), key=lambda item: item[0])
+
+        lines = []
+        described = None
+        for (name, labels), (kind, help, metric) in metrics:
+            if name != described:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                described = name
+            if kind == 'histogram':
+                lines.extend(self._HistogramLines(name, labels, metric))
+            else:
+                lines.append(f'{name}{_Labels(labels)} {metric.Value()}')
+        return '\n'.join(lines) + '\n'
+
+    def _HistogramLines(self, name, labels, histogram):
+        lines = []
+        buckets = histogram.buckets
+        cumulative = sum(buckets[:self.kHistogramBuckets[0]])
+        for index in self.kHistogramBuckets:
+            cumulative += buckets[index]
+            bound = (1 << index) / 1e9
+            lines.append(f'{name}_bucket{_Labels(labels, le=f"{bound:g}")} '
+                         f'{cumulative}')
+        lines.append(f'{name}_bucket{_Labels(labels, le="+Inf")} '
+                     f'{histogram.count}')
+        lines.append(f'{name}_sum{_Labels(labels)} {histogram.total / 1e9}')
+        lines.append(f'{name}_count{_Labels(labels)} {histogram.count}')
+        return lines
+
+
+def _Labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join(
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n') + '"' for key, value in pairs) + '}'
+
+
+# Metrics of this process
+registry = Registry()
+
+
+class MetricsServer:
+    # Serves registry.Expose() at http://host:port/metrics from a daemon
+    # thread. Binds to the loopback interface unless told otherwise.
+    def __init__(self, registry, port, host='127.0.0.1'):
+        import http.server
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.Expose().encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='metrics', daemon=True)
+
+    def Start(self):
+        self.thread.start()
+
+    def Stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -20,7 +20,7 @@
 # Module Imports
 #
 from ctypes import *
-from string import *
+import collections
 import platform
 
 #///////////////////////////////////////////////////////////
@@ -365,25 +365,78 @@ class TPCANChannelInformation (Structure):
                  ("device_id",         c_uint),                            # Device number
                  ("channel_condition", c_uint) ]                           # Availability status of a PCAN-Channel
 
+# Preallocated message storage for PCANBasic.ReadBatch
+#
+class TPCANReadBuffer:
+    """
+    Preallocated message storage for PCANBasic.ReadBatch
+
+    Messages and Timestamps hold one TPCANMsg/TPCANTimestamp view per slot.
+    The slots are reused on every ReadBatch call, so their content is only
+    valid until the buffer is passed to ReadBatch again
+    """
+    def __init__(self, Size = 64):
+        self.Size = Size
+        self.Count = 0
+        self.__m_msgArray = (TPCANMsg * Size)()
+        self.__m_timestampArray = (TPCANTimestamp * Size)()
+        self.Messages = [self.__m_msgArray[i] for i in range(Size)]
+        self.Timestamps = [self.__m_timestampArray[i] for i in range(Size)]
+        self.Refs = [(byref(self.Messages[i]), byref(self.Timestamps[i])) for i in range(Size)]
+
+# Entry points of the PCAN-Basic functions called for every frame
+#
+TPCANFastPath = collections.namedtuple('TPCANFastPath', 'Read Write GetStatus')
+
 #///////////////////////////////////////////////////////////
 # PCAN-Basic API function declarations
 #///////////////////////////////////////////////////////////
 
-# PCAN-Basic API class implementation
+# Prototypes of the PCAN-Basic functions called for every frame:
+# (name, result type, argument types)
 #
-class PCANBasic:
+_m_prototypes = (
+    ("CAN_Read",      c_uint, (TPCANHandle, POINTER(TPCANMsg), POINTER(TPCANTimestamp))),
+    ("CAN_Write",     c_uint, (TPCANHandle, POINTER(TPCANMsg))),
+    ("CAN_GetStatus", c_uint, (TPCANHandle,)) )
+
+def DeclarePrototypes(Library, CheckArguments = False):
     """
-      PCAN-Basic API class implementation
+      Declares the prototypes of CAN_Read, CAN_Write and CAN_GetStatus on a
+      loaded PCAN-Basic API (a ctypes library)
+
+    Remarks:
+      Only the result types are declared by default. Declared argument types
+      have ctypes check and convert every argument of every call, which
+      about doubles the cost of a call (see benchmarks/pcan_calls.py)
+
+    Parameters:
+      Library        : The ctypes library of the PCAN-Basic API
+      CheckArguments : Also declares the argument types
     """
-    def __init__(self):
-        # Loads the PCANBasic API
-        #
+    for name, restype, argtypes in _m_prototypes:
+        function = getattr(Library, name)
+        function.restype = restype
+        if CheckArguments:
+            function.argtypes = argtypes
+
+# Loads the native PCAN-Basic API once per process
+#
+_m_dllBasic = None
+
+def LoadLibrary():
+    """
+      Loads the PCAN-Basic API of the platform, or returns the one
+      already loaded
+    """
+    global _m_dllBasic
+    if _m_dllBasic is None:
         if platform.system() == 'Windows':
             # Loads the API on Windows
-            self.__m_dllBasic = windll.LoadLibrary("PCANBasic")
+            _m_dllBasic = windll.LoadLibrary("PCANBasic")
         elif platform.system() == 'Linux':
             # Loads the API on Linux
-            self.__m_dllBasic = cdll.LoadLibrary("libpcanbasic.so")
+            _m_dllBasic = cdll.LoadLibrary("libpcanbasic.so")
         elif platform.system() == 'Darwin':
             # Loads the API on Mac
             #
@@ -393,10 +446,50 @@ class PCANBasic:
             # is a third-party software creaded and mantained by the MacCAN project. For
             # information and support, please contact MacCAN (info@mac-can).
             #
-           self.__m_dllBasic = cdll.LoadLibrary("libPCBUSB.dylib")
+            _m_dllBasic = cdll.LoadLibrary("libPCBUSB.dylib")
 
-        if self.__m_dllBasic == None:
+        if _m_dllBasic == None:
             print ("Exception: The PCAN-Basic DLL couldn't be loaded!")
+        else:
+            DeclarePrototypes(_m_dllBasic)
+    return _m_dllBasic
+
+class _LazyLibrary:
+    """
+      Stands in for the PCAN-Basic API of a PCANBasic object until one of its
+      functions is first used, then loads the API and puts it in its place
+    """
+    def __init__(self, Owner):
+        self.__m_owner = Owner
+
+    def __getattr__(self, Name):
+        library = LoadLibrary()
+        self.__m_owner._PCANBasic__m_dllBasic = library
+        return getattr(library, Name)
+
+# PCAN-Basic API class implementation
+#
+class PCANBasic:
+    """
+      PCAN-Basic API class implementation
+    """
+    def __init__(self, Library = None):
+        """
+          Loads the PCAN-Basic API
+
+        Parameters:
+          Library : Optional object exposing the CAN_* functions of the
+                    PCAN-Basic library. When given, it is used instead of
+                    loading the native library (e.g. a stand-in for testing)
+        """
+        # The native PCANBasic API is loaded on first use, so creating the
+        # object (or importing this module) needs no driver installed
+        #
+        if Library is not None:
+            self.__m_dllBasic = Library
+        else:
+            self.__m_dllBasic = _LazyLibrary(self)
+        self.__m_fastPath = None
 
     # Initializes a PCAN Channel
     #
@@ -567,6 +660,78 @@ class PCANBasic:
             print ("Exception on PCANBasic.Read")
             raise
 
+    # Reads all pending CAN messages from the receive queue of a PCAN Channel
+    #
+    def ReadBatch(
+        self,
+        Channel,
+        Buffer):
+
+        """
+          Reads all pending CAN messages from the receive queue of a PCAN Channel
+
+        Remarks:
+          Messages are read into the preallocated slots of Buffer until the
+          receive queue is empty, an error is returned or the buffer is full.
+          No structures are allocated per message.
+
+          The return value of this method is a 2-touple, where
+          the first value is the result (TPCANStatus) that ended the batch:
+          PCAN_ERROR_QRCVEMPTY when the queue was drained, PCAN_ERROR_OK when
+          the buffer filled up (more messages may be pending), or an error code.
+          The order of the values are:
+          [0]: A TPCANStatus error code
+          [1]: The number of messages stored in Buffer.Messages[0..n-1]
+
+        Parameters:
+          Channel  : A TPCANHandle representing a PCAN Channel
+          Buffer   : A TPCANReadBuffer receiving the messages and timestamps
+
+        Returns:
+          A touple with two values
+        """
+        try:
+            read = self.__m_dllBasic.CAN_Read
+            refs = Buffer.Refs
+            size = Buffer.Size
+            count = 0
+            res = PCAN_ERROR_OK
+            while count < size:
+                msg_ref, timestamp_ref = refs[count]
+                res = read(Channel,msg_ref,timestamp_ref)
+                if res != PCAN_ERROR_OK:
+                    break
+                count += 1
+            Buffer.Count = count
+            return TPCANStatus(res),count
+        except:
+            print ("Exception on PCANBasic.ReadBatch")
+            raise
+
+    # Gets the entry points of the PCAN-Basic functions called for every frame
+    #
+    def FastPath(self):
+
+        """
+          Gets the entry points of the PCAN-Basic functions called for every frame
+
+        Remarks:
+          The functions are bound once, with their prototypes declared, and
+          are called directly: their arguments are not wrapped and their
+          exceptions are not caught. Each returns a TPCANStatus error code:
+          Read(Channel, byref(TPCANMsg), byref(TPCANTimestamp))
+          Write(Channel, byref(TPCANMsg))
+          GetStatus(Channel)
+
+        Returns:
+          A TPCANFastPath
+        """
+        if self.__m_fastPath is None:
+            self.__m_dllBasic.CAN_Read  # Loads the API if it is not yet
+            dll = self.__m_dllBasic
+            self.__m_fastPath = TPCANFastPath(dll.CAN_Read, dll.CAN_Write, dll.CAN_GetStatus)
+        return self.__m_fastPath
+
     # Reads a CAN message from the receive queue of a FD capable PCAN Channel
     #
     def ReadFD(
@@ -623,6 +788,48 @@ class PCANBasic:
             print ("Exception on PCANBasic.Write")
             raise
 
+    # Transmits several CAN messages back to back
+    #
+    def WriteMany(
+        self,
+        Channel,
+        Messages):
+
+        """
+          Transmits several CAN messages back to back
+
+        Remarks:
+          Messages are passed to the driver in order until all are sent or
+          one is not accepted; the messages after it are not sent.
+
+          The return value of this method is a 2-touple, where
+          the first value is the result (TPCANStatus) of the last message
+          passed to the driver.
+          The order of the values are:
+          [0]: A TPCANStatus error code
+          [1]: The number of messages sent, Messages[0..n-1]
+
+        Parameters:
+          Channel  : A TPCANHandle representing a PCAN Channel
+          Messages : A sequence of TPCANMsg to be sent
+
+        Returns:
+          A touple with two values
+        """
+        try:
+            write = self.FastPath().Write
+            count = 0
+            res = PCAN_ERROR_OK
+            for msg in Messages:
+                res = write(Channel,byref(msg))
+                if res != PCAN_ERROR_OK:
+                    break
+                count += 1
+            return TPCANStatus(res),count
+        except:
+            print ("Exception on PCANBasic.WriteMany")
+            raise
+
     # Transmits a CAN message over a FD capable PCAN Channel
     #
     def WriteFD(
@@ -0,0 +1,155 @@
+import Metrics as mt
+
+
+class AdaptivePollScheduler:
+    # Chooses how often the PSU is polled:
+    #  - fast_period while the output is enabled or for ramp_hold after a
+    #    setpoint change, so reports follow the output closely
+    #  - slow_period while idle
+    #  - never shorter than rtt_factor x the measured poll round trip, which
+    #    leaves the USB link free for setpoint writes
+    # All times are time.monotonic_ns() values.
+
+    def __init__(self, fast_period_ns=100000000, slow_period_ns=500000000,
+                 ramp_hold_ns=2000000000, rtt_factor=2.0):
+        self.fast_period_ns = fast_period_ns
+        self.slow_period_ns = slow_period_ns
+        self.ramp_hold_ns = ramp_hold_ns
+        self.rtt_factor = rtt_factor
+
+        self.rtt_ns = 0
+        self.output_enabled = False
+        self.last_change_ns = None
+        self.last_poll_ns = None
+
+    def SetpointChanged(self, now_ns):
+        self.last_change_ns = now_ns
+
+    def RecordPoll(self, start_ns, end_ns, output_enabled):
+        # Smoothed round trip (1/8 weight per sample, as in TCP's SRTT)
+        rtt_ns = end_ns - start_ns
+        if self.rtt_ns == 0:
+            self.rtt_ns = rtt_ns
+        else:
+            self.rtt_ns += (rtt_ns - self.rtt_ns) // 8
+        self.output_enabled = output_enabled
+        self.last_poll_ns = start_ns
+
+    def Period(self, now_ns):
+        ramping = self.last_change_ns is not None and \
+            now_ns - self.last_change_ns < self.ramp_hold_ns
+        if self.output_enabled or ramping:
+            period = self.fast_period_ns
+        else:
+            period = self.slow_period_ns
+        return max(period, int(self.rtt_ns * self.rtt_factor))
+
+    def NextPoll(self, now_ns):
+        if self.last_poll_ns is None:
+            return now_ns
+        return self.last_poll_ns + self.Period(now_ns)
+
+    def Rate(self, now_ns):
+        return 1e9 / self.Period(now_ns)
+
+
+class JitterStats:
+    # Period jitter of a periodic task: deviation of each measured period from
+    # the nominal one, in nanoseconds. min/max cover the whole run, the p99 of
+    # |deviation| covers the last kWindow periods.
+    kWindow = 1024
+
+    def __init__(self, period_ns):
+        self.period_ns = period_ns
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.window = [0] * self.kWindow
+
+    def Record(self, measured_period_ns):
+        deviation = measured_period_ns - self.period_ns
+        self.window[self.count % self.kWindow] = deviation
+        self.count += 1
+        if self.min is None or deviation < self.min:
+            self.min = deviation
+        if self.max is None or deviation > self.max:
+            self.max = deviation
+
+    def P99(self):
+        samples = sorted(abs(deviation) for deviation
+                         in self.window[:min(self.count, self.kWindow)])
+        if len(samples) == 0:
+            return 0
+        return samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+    def Summary(self):
+        return (f'n={self.count}'
+                + f'  min={(self.min or 0) / 1e6:+.3f}ms'
+                + f'  max={(self.max or 0) / 1e6:+.3f}ms'
+                + f'  p99={self.P99() / 1e6:.3f}ms')
+
+
+class PeriodicTask:
+    __slots__ = ('name', 'period_ns', 'phase_ns', 'callback',
+                 'next_deadline_ns', 'last_run_ns', 'missed', 'jitter',
+                 'lateness')
+
+    def __init__(self, name, period_ns, phase_ns, callback):
+        self.name = name
+        self.period_ns = period_ns
+        self.phase_ns = phase_ns
+        self.callback = callback
+        self.next_deadline_ns = None
+        self.last_run_ns = None
+        self.missed = 0
+        self.jitter = JitterStats(period_ns)
+        # Callback start after its deadline
+        self.lateness = mt.LatencyHistogram(name + " lateness")
+
+
+class PeriodicScheduler:
+    # Runs callbacks on absolute deadlines: the n-th run of a task is due at
+    # start + phase + n * period, so time spent in the loop or in the
+    # callbacks never accumulates into the period. A task that falls more
+    # than one period behind skips the missed deadlines instead of bursting.
+    # All times are time.monotonic_ns() values.
+
+    def __init__(self):
+        self.tasks = []
+
+    def Add(self, name, period_ns, callback, phase_ns=0):
+        task = PeriodicTask(name, period_ns, phase_ns, callback)
+        self.tasks.append(task)
+        return task
+
+    def Start(self, now_ns):
+        for task in self.tasks:
+            task.next_deadline_ns = now_ns + task.phase_ns
+            task.last_run_ns = None
+
+    def NextDeadline(self):
+        return min(task.next_deadline_ns for task in self.tasks)
+
+    def RunDue(self, now_ns, clock):
+        # Runs every task whose deadline has passed, in registration order.
+        # clock() is read right before each callback for the jitter stats
+        for task in self.tasks:
+            if now_ns < task.next_deadline_ns:
+                continue
+
+            run_ns = clock()
+            if task.last_run_ns is not None:
+                task.jitter.Record(run_ns - task.last_run_ns)
+            task.last_run_ns = run_ns
+            task.lateness.Record(run_ns - task.next_deadline_ns)
+            task.callback()
+
+            task.next_deadline_ns += task.period_ns
+            if task.next_deadline_ns <= now_ns:
+                skipped = (now_ns - task.next_deadline_ns) // task.period_ns + 1
+                task.missed += skipped
+                task.next_deadline_ns += skipped * task.period_ns
+
+    def Summary(self):
+        return '\n'.join(f'{task.name} period jitter: {task.jitter.Summary()}'
+                         f'  missed={task.missed}' for task in self.tasks)
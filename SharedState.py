@@ -0,0 +1,165 @@
+import threading
+import Chroma62000H as ch
+
+
+class StateSnapshot:
+    # Immutable view of everything the threads share. A new snapshot is
+    # published for every change, so a reader always sees the fields of one
+    # publish together (e.g. voltage and current from the same PSU poll).
+    # seq increases with every publish; readers compare it to skip work.
+    __slots__ = (
+        'seq',
+        # Requested by the vehicle (0x618)
+        'requested_voltage',
+        'requested_current',
+        'max_ac_current',
+        'enable_output',
+        # Measured by the PSU
+        'measured_voltage',
+        'measured_current',
+        'measured_output_enable',
+        'measured_status',
+        'measured_time_ns',  # time.monotonic_ns() when the poll completed
+        'poll_rate',         # effective PSU poll rate, in Hz
+        # CAN counters and bus state (BusHealth.kBusStates)
+        'msg_count',
+        'discarded_count',
+        'bus_state',
+    )
+
+    _defaults = {
+        'seq': 0,
+        'requested_voltage': 0.0,
+        'requested_current': 0.0,
+        'max_ac_current': 0.0,
+        'enable_output': False,
+        'measured_voltage': 0.0,
+        'measured_current': 0.0,
+        'measured_output_enable': False,
+        'measured_status': None,
+        'measured_time_ns': 0,
+        'poll_rate': 0.0,
+        'msg_count': 0,
+        'discarded_count': 0,
+        'bus_state': 'active',
+    }
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name, self._defaults[name]))
+        if self.measured_status is None:
+            object.__setattr__(self, 'measured_status', ch.ChromaStatus())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StateSnapshot is immutable, use SharedState.Publish")
+
+    def Replace(self, **changes):
+        snapshot = object.__new__(StateSnapshot)
+        for name in self.__slots__:
+            _set(snapshot, name, changes[name] if name in changes
+                 else _get(self, name))
+        _set(snapshot, 'seq', self.seq + 1)
+        return snapshot
+
+
+_get = object.__getattribute__
+_set = object.__setattr__
+
+
+class SharedState:
+    # Holds the latest StateSnapshot. Reading is a single attribute load and
+    # takes no lock; publishers serialize on a lock so two producers (CAN and
+    # PSU threads) never drop each other's fields.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snapshot = StateSnapshot()
+
+    def Read(self):
+        return self.snapshot
+
+    def Publish(self, **changes):
+        with self._lock:
+            snapshot = self.snapshot.Replace(**changes)
+            self.snapshot = snapshot
+        return snapshot
+
+
+class Setpoint:
+    # One PSU setpoint decoded from a charger request, with the
+    # time.monotonic_ns() times its frame was received by the PCAN adapter
+    # (its hardware timestamp on the host clock) and handled by the station.
+    __slots__ = ('voltage', 'current', 'enable_output', 'received_ns',
+                 'handled_ns')
+
+    def __init__(self, voltage, current, enable_output, received_ns,
+                 handled_ns):
+        self.voltage = voltage
+        self.current = current
+        self.enable_output = enable_output
+        self.received_ns = received_ns
+        self.handled_ns = handled_ns
+
+
+class LatencyTrace:
+    # Timeline of one setpoint written to the PSU, in time.monotonic_ns():
+    # request frame received, handled, written to the PSU, and first polled
+    # with the PSU output at it. reflected_ns stays None when a newer
+    # setpoint is written first or the output never gets there.
+    __slots__ = ('voltage', 'current', 'enable_output', 'received_ns',
+                 'handled_ns', 'written_ns', 'reflected_ns')
+
+    def __init__(self, setpoint, written_ns, reflected_ns=None):
+        self.voltage = setpoint.voltage
+        self.current = setpoint.current
+        self.enable_output = setpoint.enable_output
+        self.received_ns = setpoint.received_ns
+        self.handled_ns = setpoint.handled_ns
+        self.written_ns = written_ns
+        self.reflected_ns = reflected_ns
+
+    def Format(self):
+        def Since(time_ns):
+            if time_ns is None:
+                return '-'
+            return f'+{(time_ns - self.received_ns) / 1e6:.2f}ms'
+        return (f'{self.voltage:.1f}V {self.current:.1f}A '
+                + ('on' if self.enable_output else 'off')
+                + f': handled {Since(self.handled_ns)}'
+                + f'  written {Since(self.written_ns)}'
+                + f'  output {Since(self.reflected_ns)}')
+
+
+class SetpointMailbox:
+    # Single-slot mailbox from the CAN decoder to the PSU worker. Posting
+    # replaces any setpoint not yet taken, so a burst of requests collapses
+    # into the latest one. The worker blocks in Take until a setpoint arrives.
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._pending = None
+        self.closed = False
+
+    def Post(self, setpoint):
+        with self._condition:
+            self._pending = setpoint
+            self._condition.notify()
+
+    def Take(self, timeout):
+        # Returns the latest setpoint, or None on timeout, Wake() or Close()
+        with self._condition:
+            if self._pending is None and not self.closed:
+                self._condition.wait(timeout)
+            setpoint = self._pending
+            self._pending = None
+        return setpoint
+
+    def Wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def Close(self):
+        # Wakes the worker for good: later Takes return without waiting
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
@@ -0,0 +1,65 @@
+import CANCodec as cc
+import CANDatabase as db
+import os
+
+# Shore charger CAN protocol
+#  - 0x618 Charger request, received from the vehicle
+#  - 0x611 Charger output report, sent every 100 ms
+#  - 0x615 Charger fault report, sent every 100 ms
+# Bytes the Chroma PSU cannot report are sent as 0xFF.
+#
+# The protocol is maintained as ShoreCharger.dbc; the layouts below are the
+# built-in fallback used when no DBC is available. Messages are looked up by
+# name, so a DBC may move them to other IDs.
+
+kChargerRequest = 'ChargerRequest'
+kChargerOutput = 'ChargerOutput'
+kChargerFaults = 'ChargerFaults'
+
+kChargerRequestId = 0x618
+kChargerOutputId = 0x611
+kChargerFaultsId = 0x615
+
+kFill = 0xFF
+default_dbc_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'ShoreCharger.dbc')
+
+charger_request = cc.MessageLayout(
+    can_id=kChargerRequestId,
+    name=kChargerRequest,
+    signals=[
+        cc.Signal('EnableOutput', start_bit=7, length=1),
+        cc.Signal('MaxACCurrent', start_bit=15, length=16, scale=0.1),
+        cc.Signal('RequestedVoltage', start_bit=31, length=16, scale=0.1),
+        cc.Signal('RequestedCurrent', start_bit=47, length=16, scale=0.1),
+    ])
+
+charger_output = cc.MessageLayout(
+    can_id=kChargerOutputId,
+    name=kChargerOutput,
+    fill=kFill,
+    signals=[
+        cc.Signal('MeasuredVoltage', start_bit=39, length=16, scale=0.1),
+        cc.Signal('MeasuredCurrent', start_bit=55, length=16, scale=0.1),
+    ])
+
+# Byte 0 bit 6 and byte 4 bits 7, 5 and 3 are always reported as set
+charger_faults = cc.MessageLayout(
+    can_id=kChargerFaultsId,
+    name=kChargerFaults,
+    initial_data=bytes([0x40, 0xFF, 0xFF, 0xFF, 0xA8, 0xFF, 0xFF, 0xFF]),
+    signals=[
+        cc.Signal('ACFault', start_bit=7, length=1),
+        cc.Signal('OPP', start_bit=5, length=1),
+        cc.Signal('OVP', start_bit=4, length=1),
+    ])
+
+layouts = [charger_request, charger_output, charger_faults]
+
+
+def LoadCodecs(dbc_path=default_dbc_path):
+    # Returns the ID-indexed codec table from the DBC, or from the built-in
+    # layouts when dbc_path is None or does not exist
+    if dbc_path is not None and os.path.exists(dbc_path):
+        return cc.CompileLayouts(db.LoadDBC(dbc_path, fill=kFill))
+    return cc.CompileLayouts(layouts)
@@ -0,0 +1,225 @@
+import collections
+import random
+import time
+
+# In-process stand-in for the VISA resource of a Chroma 62000H, for running
+# the translation layer without a supply:
+#
+#   sim = SimulatedChroma(latency=0.002, load_resistance=40.0)
+#   chroma = ch.CHROMA_62000H(device=sim)
+#
+# It implements the SCPI subset CHROMA_62000H uses, ';'-chained commands and
+# compound queries included. Every transaction takes latency (plus up to
+# jitter) seconds. The output slews towards its setpoint at the programmed
+# voltage and current slew rates into a resistive load, going constant
+# current when the load would draw more than the current setpoint.
+# Exceeding the OVP, OCP or OPP level turns the output off and latches the
+# protection bit reported by :FETC:STAT? until :OUTP:PROT:CLE.
+# :FETC:STAT? also reports the output state and CV/CC mode, e.g.
+# '\x00\x00,ON,CC'.
+# Commands it does not know are put in the error queue (:SYST:ERR?); a
+# query it does not know raises TimeoutError, as the VISA read would.
+
+kVoltageSlew = 10.0  # Default output voltage slew, in V/ms
+kCurrentSlew = 1.0   # Default output current slew, in A/ms
+kCommandLogSize = 100000
+
+# Bit of each protection in the first :FETC:STAT? character
+kStatusBits = {
+    'ovp': 0x01,
+    'ocp': 0x02,
+    'opp': 0x04,
+    'remote_inhibit': 0x08,
+    'otp': 0x10,
+    'fan_lock': 0x20,
+    'sense_fault': 0x40,
+    'series_fault': 0x80,
+}
+
+
+class SimulatedChroma:
+    def __init__(self, latency=0.002, jitter=0.0, load_resistance=40.0,
+                 resource_name='USB0::0x1698::0x0837::SIMULATED::INSTR'):
+        self.latency = latency              # per transaction, in seconds
+        self.jitter = jitter                # extra random latency up to this
+        self.load_resistance = load_resistance  # in ohm, None for no load
+        self.resource_name = resource_name
+        self.transactions = 0
+
+        # Commands as they took effect: (time.perf_counter_ns(), command)
+        self.commands = collections.deque(maxlen=kCommandLogSize)
+        self.errors = collections.deque()
+
+        self.Reset()
+
+        self._write_handlers = {
+            '*RST': lambda value: self.Reset(),
+            '*CLS': lambda value: self.errors.clear(),
+            ':ABOR': lambda value: None,
+            ':CONF:OUTP': self._SetOutput,
+            ':SOUR:VOLT': lambda value: self._SetSetpoint('voltage', value),
+            ':SOUR:CURR': lambda value: self._SetSetpoint('current', value),
+            ':SOUR:VOLT:LIMIT:LOW': lambda value: self._SetFloat('voltage_low', value),
+            ':SOUR:VOLT:LIMIT:HIGH': lambda value: self._SetFloat('voltage_high', value),
+            ':SOUR:CURR:LIMIT:LOW': lambda value: self._SetFloat('current_low', value),
+            ':SOUR:CURR:LIMIT:HIGH': lambda value: self._SetFloat('current_high', value),
+            ':SOUR:VOLT:PROT:HIGH': lambda value: self._SetFloat('ovp_level', value),
+            ':SOUR:CURR:PROT:HIGH': lambda value: self._SetFloat('ocp_level', value),
+            ':SOUR:POW:PROT:HIGH': lambda value: self._SetFloat('opp_level', value),
+            ':SOUR:VOLT:SLEW': lambda value: self._SetFloat('voltage_slew', value),
+            ':SOUR:CURR:SLEW': lambda value: self._SetFloat('current_slew', value),
+            ':OUTP:PROT:CLE': lambda value: self.ClearProtection(),
+        }
+        self._query_handlers = {
+            '*IDN?': lambda: 'Chroma,62000H,SIMULATED,1.00',
+            '*OPC?': lambda: '1',
+            ':SYST:ERR?': self._NextError,
+            ':CONF:OUTP?': lambda: 'ON' if self.output_on else 'OFF',
+            ':SOUR:VOLT?': lambda: '%.3f' % self.voltage,
+            ':SOUR:CURR?': lambda: '%.3f' % self.current,
+            ':SOUR:VOLT:LIMIT:LOW?': lambda: '%.3f' % self.voltage_low,
+            ':SOUR:VOLT:LIMIT:HIGH?': lambda: '%.3f' % self.voltage_high,
+            ':SOUR:CURR:LIMIT:LOW?': lambda: '%.3f' % self.current_low,
+            ':SOUR:CURR:LIMIT:HIGH?': lambda: '%.3f' % self.current_high,
+            ':SOUR:VOLT:PROT:HIGH?': lambda: '%.3f' % self.ovp_level,
+            ':SOUR:CURR:PROT:HIGH?': lambda: '%.3f' % self.ocp_level,
+            ':SOUR:POW:PROT:HIGH?': lambda: '%.3f' % self.opp_level,
+            ':MEAS:VOLT?': lambda: '%.3f' % self.output_voltage,
+            ':MEAS:CURR?': lambda: '%.3f' % self.output_current,
+            ':MEAS:POW?': lambda: '%.3f' % (self.output_voltage * self.output_current),
+            ':FETC:STAT?': self._Status,
+        }
+
+    def Reset(self):
+        # Power-on state
+        self.output_on = False
+        self.voltage = 0.0
+        self.current = 0.0
+        self.voltage_low = 0.0
+        self.voltage_high = 1000.0
+        self.current_low = 0.0
+        self.current_high = 15.0
+        self.ovp_level = 1100.0
+        self.ocp_level = 16.5
+        self.opp_level = 16500.0
+        self.voltage_slew = kVoltageSlew
+        self.current_slew = kCurrentSlew
+        self.status = 0
+        self.output_voltage = 0.0
+        self.output_current = 0.0
+        self._time = time.perf_counter()
+
+    # ------------------------------ VISA resource ------------------------- #
+    def write(self, command):
+        self._Transaction()
+        for part in command.strip().split(';'):
+            header, _, value = part.strip().partition(' ')
+            handler = self._write_handlers.get(header.upper())
+            if handler is None:
+                self.errors.append('-113,"Undefined header;%s"' % part)
+                continue
+            try:
+                handler(value)
+            except ValueError:
+                self.errors.append('-224,"Illegal parameter value;%s"' % part)
+                continue
+            self.commands.append((time.perf_counter_ns(), part))
+        return len(command)
+
+    def query(self, query):
+        self._Transaction()
+        responses = []
+        for part in query.strip().split(';'):
+            handler = self._query_handlers.get(part.strip().upper())
+            if handler is None:
+                self.errors.append('-113,"Undefined header;%s"' % part)
+                raise TimeoutError('SimulatedChroma: no response to ' + part)
+            responses.append(handler())
+        return ';'.join(responses) + '\n'
+
+    def clear(self):
+        # Device clear; responses are never left pending here
+        pass
+
+    def close(self):
+        pass
+
+    # ------------------------------ Fault injection ----------------------- #
+    def Trip(self, protection):
+        # Latches a protection (a kStatusBits name) and turns the output off
+        self.status |= kStatusBits[protection]
+        self.output_on = False
+        self.output_voltage = 0.0
+        self.output_current = 0.0
+
+    def ClearProtection(self):
+        self.status = 0
+
+    # ------------------------------ Model --------------------------------- #
+    def _Transaction(self):
+        delay = self.latency
+        if self.jitter > 0:
+            delay += random.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        self.transactions += 1
+        self._Advance(time.perf_counter())
+
+    def _Advance(self, now):
+        elapsed_ms = (now - self._time) * 1000.0
+        self._time = now
+
+        target_voltage = self.voltage if self.output_on else 0.0
+        if self.load_resistance:
+            # Constant current once the load would draw more than the setpoint
+            target_voltage = min(target_voltage,
+                                 self.current * self.load_resistance)
+        self.output_voltage = _Slew(self.output_voltage, target_voltage,
+                                    self.voltage_slew * elapsed_ms)
+        target_current = (self.output_voltage / self.load_resistance
+                          if self.load_resistance else 0.0)
+        self.output_current = _Slew(self.output_current, target_current,
+                                    self.current_slew * elapsed_ms)
+
+        if self.output_voltage > self.ovp_level:
+            self.Trip('ovp')
+        elif self.output_current > self.ocp_level:
+            self.Trip('ocp')
+        elif self.output_voltage * self.output_current > self.opp_level:
+            self.Trip('opp')
+
+    def _SetOutput(self, value):
+        if value.upper() not in ('ON', 'OFF', '1', '0'):
+            raise ValueError(value)
+        # A latched protection keeps the output off until it is cleared
+        self.output_on = value.upper() in ('ON', '1') and self.status == 0
+
+    def _SetSetpoint(self, name, value):
+        low = getattr(self, name + '_low')
+        high = getattr(self, name + '_high')
+        setattr(self, name, min(max(float(value), low), high))
+
+    def _SetFloat(self, name, value):
+        setattr(self, name, float(value))
+
+    def _NextError(self):
+        if len(self.errors) == 0:
+            return '0,"No error"'
+        return self.errors.popleft()
+
+    def _Status(self):
+        return (chr(self.status) + chr(0)
+                + (',ON' if self.output_on else ',OFF')
+                + (',CC' if self.IsCurrentLimited() else ',CV'))
+
+    def IsCurrentLimited(self):
+        # The load would draw more than the current setpoint at the voltage
+        # setpoint, so the output regulates the current instead
+        return (self.output_on and bool(self.load_resistance) and
+                self.current * self.load_resistance < self.voltage)
+
+
+def _Slew(value, target, step):
+    if value < target:
+        return min(value + step, target)
+    return max(value - step, target)
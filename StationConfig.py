@@ -0,0 +1,72 @@
+import PCANBasic as pb
+from dataclasses import dataclass
+import json
+import os
+
+# Station configuration file (JSON), one entry per charge station:
+#   {
+#     "dbc": "ShoreCharger.dbc",
+#     "stations": [
+#       {"name": "Bay 1", "channel": "PCAN_USBBUS1", "psu": "USB0::0x1698::0x0837::000001"},
+#       {"name": "Bay 2", "channel": "PCAN_USBBUS2", "psu": "USB0::0x1698::0x0837::000002",
+#        "baudrate": "PCAN_BAUD_500K"}
+#     ]
+#   }
+#  - channel and baudrate are PCANBasic constant names
+#  - psu selects the Chroma like usb_or_serial of CHROMA_62000H: the first
+#    USB resource whose name contains it
+#  - dbc is optional and relative to the configuration file
+
+
+@dataclass
+class StationConfig:
+    name: str = 'Station'
+    channel: str = 'PCAN_USBBUS1'
+    psu: str = 'USB0'
+    baudrate: str = 'PCAN_BAUD_1M'
+    use_hardware_filter: bool = True
+
+    def Channel(self):
+        return _Constant(self.channel, 'BUS', pb.TPCANHandle)
+
+    def Baudrate(self):
+        return _Constant(self.baudrate, 'PCAN_BAUD_', pb.TPCANBaudrate)
+
+
+def _Constant(name, tag, ctype):
+    value = getattr(pb, name, None)
+    if tag not in name or not isinstance(value, ctype):
+        raise ValueError(f"'{name}' is not a PCANBasic {ctype.__name__} constant")
+    return value
+
+
+def LoadStationConfig(path):
+    # Returns (dbc path or None, [StationConfig])
+    with open(path, 'r') as config_file:
+        config = json.load(config_file)
+
+    dbc_path = config.get('dbc')
+    if dbc_path is not None:
+        dbc_path = os.path.join(os.path.dirname(os.path.abspath(path)), dbc_path)
+
+    stations = []
+    for index, entry in enumerate(config['stations']):
+        station = StationConfig(**{'name': f'Station {index + 1}', **entry})
+        station.Channel()
+        station.Baudrate()
+        stations.append(station)
+
+    for field_name in ('name', 'channel', 'psu'):
+        values = [getattr(station, field_name) for station in stations]
+        for value in values:
+            if values.count(value) > 1:
+                raise ValueError(f"{field_name} '{value}' is used by more than one station")
+
+    # A supply is the first resource containing psu, so one psu inside
+    # another can select the same supply for both stations
+    for station in stations:
+        for other in stations:
+            if station is not other and station.psu in other.psu:
+                raise ValueError(f"psu '{station.psu}' also matches '{other.psu}'")
+
+    return dbc_path, stations
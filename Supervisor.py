@@ -0,0 +1,262 @@
+import AsyncRuntime as ar
+import ChargerStation as cs
+import PCANBasic as pb
+import ShoreChargerProtocol as sp
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time as tm
+
+kTelemetryPeriod = 1.0   # Worker telemetry period, in seconds
+kRestartDelay = 1.0      # First restart delay after a crash, in seconds
+kMaxRestartDelay = 30.0  # The delay doubles per crash up to this
+kStableRunTime = 60.0    # A worker up this long is restarted without delay growth
+kStopTimeout = 5.0       # Time given to the workers to abort their PSU and exit
+
+
+def OpenWorkerStation(station_config, dbc_path):
+    # Default station factory of a worker process: the real PCAN and VISA
+    # libraries, loaded inside the worker
+    codecs = sp.LoadCodecs(dbc_path)
+    return cs.OpenStation(station_config, codecs, pb.PCANBasic())
+
+
+def StationWorker(station_config, dbc_path, connection, open_station,
+                  telemetry_period):
+    # Worker process entry point. A failing station raises out of here, so
+    # the process exits with a non-zero code and the supervisor restarts it.
+    station = open_station(station_config, dbc_path)
+    asyncio.run(_ServeWorker(station, connection, telemetry_period))
+
+
+async def _ServeWorker(station, connection, telemetry_period):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def Listen():
+        # A closed pipe means the supervisor is gone; stop as if asked to
+        try:
+            while connection.recv() != 'stop':
+                pass
+        except (EOFError, OSError):
+            pass
+        loop.call_soon_threadsafe(stop.set)
+
+    threading.Thread(target=Listen, daemon=True).start()
+
+    start_time = tm.time()
+    serve = asyncio.create_task(ar.AsyncRuntime([station], None).Serve())
+    stopping = asyncio.create_task(stop.wait())
+    try:
+        while not serve.done() and not stop.is_set():
+            await asyncio.wait((serve, stopping), timeout=telemetry_period)
+            connection.send(('telemetry',
+                             station.Telemetry(tm.time() - start_time)))
+    finally:
+        stopping.cancel()
+        serve.cancel()
+        await asyncio.gather(serve, stopping, return_exceptions=True)
+        await loop.run_in_executor(None, station.Abort)
+
+    if not serve.cancelled():
+        serve.result()
+
+
+class StationProcess:
+    # Supervisor bookkeeping for one station's worker process
+    def __init__(self, config):
+        self.config = config
+        self.name = config.name
+        self.process = None
+        self.connection = None
+        self.started = 0.0
+        self.restarts = 0
+        self.restart_delay = kRestartDelay
+        self.restart_at = None
+        self.exitcode = None
+        self.telemetry = None
+
+
+class Supervisor:
+    # Runs every charger station in a worker process of its own, so the GIL
+    # and a slow supply of one station cannot stall the CAN timing of
+    # another. Each worker serves its station on the asyncio runtime and
+    # sends telemetry over its pipe every telemetry_period. A worker that
+    # exits without being asked to is restarted after a delay that doubles
+    # on every crash in a row.
+    # open_station(station_config, dbc_path) builds the station inside the
+    # worker; it must be importable by name (workers are spawned, not forked).
+
+    def __init__(self, station_configs, dbc_path=None,
+                 open_station=OpenWorkerStation,
+                 telemetry_period=kTelemetryPeriod, info_rate=10):
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = [StationProcess(config) for config in station_configs]
+        self.dbc_path = dbc_path
+        self.open_station = open_station
+        self.telemetry_period = telemetry_period
+        self.info_rate = info_rate  # Info message rate in seconds
+        self.stopping = False
+        self.stop_monitor_thread = False
+        self.monitor_thread = None
+
+    def Start(self):
+        for worker in self.workers:
+            self._Spawn(worker)
+
+    def _Spawn(self, worker):
+        parent_end, child_end = self.context.Pipe()
+        worker.process = self.context.Process(
+            target=StationWorker,
+            args=(worker.config, self.dbc_path, child_end, self.open_station,
+                  self.telemetry_period),
+            name=worker.name, daemon=True)
+        worker.process.start()
+        child_end.close()
+        worker.connection = parent_end
+        worker.started = tm.monotonic()
+        worker.restart_at = None
+
+    def Poll(self, timeout):
+        # Receives telemetry and handles worker exits and restarts; returns
+        # after at most timeout seconds
+        now = tm.monotonic()
+        for worker in self.workers:
+            if (worker.restart_at is not None and now >= worker.restart_at and
+                    not self.stopping):
+                worker.restarts += 1
+                self._Spawn(worker)
+            elif worker.restart_at is not None:
+                timeout = min(timeout, worker.restart_at - now)
+
+        handles = {}
+        for worker in self.workers:
+            if worker.process is not None:
+                handles[worker.connection] = worker
+                handles[worker.process.sentinel] = worker
+
+        ready = multiprocessing.connection.wait(list(handles), max(timeout, 0))
+
+        # Telemetry first, so the last report of an exiting worker is kept
+        for handle in ready:
+            worker = handles[handle]
+            if handle is worker.connection:
+                self._Receive(worker)
+        for handle in ready:
+            worker = handles[handle]
+            if handle is not worker.connection:
+                self._Exited(worker)
+
+    def _Receive(self, worker):
+        try:
+            while worker.connection.poll():
+                kind, payload = worker.connection.recv()
+                if kind == 'telemetry':
+                    worker.telemetry = payload
+        except (EOFError, OSError):
+            # The exit is handled through the process sentinel
+            pass
+
+    def _Exited(self, worker):
+        worker.process.join()
+        worker.exitcode = worker.process.exitcode
+        worker.connection.close()
+        worker.process = None
+        worker.connection = None
+        if self.stopping:
+            return
+
+        now = tm.monotonic()
+        if now - worker.started >= kStableRunTime:
+            worker.restart_delay = kRestartDelay
+        worker.restart_at = now + worker.restart_delay
+        print(f"{worker.name} worker exited with code {worker.exitcode}, "
+              f"restarting in {worker.restart_delay:.0f} s")
+        worker.restart_delay = min(worker.restart_delay * 2, kMaxRestartDelay)
+
+    def Stop(self):
+        # Asks every worker to abort its PSU and exit, then terminates the
+        # ones still running after kStopTimeout
+        self.stopping = True
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.connection.send('stop')
+                except OSError:
+                    pass
+
+        deadline = tm.monotonic() + kStopTimeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(deadline - tm.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._Receive(worker)
+            self._Exited(worker)
+
+    def Info(self):
+        lines = []
+        for worker in self.workers:
+            if worker.process is not None:
+                state = f"pid {worker.process.pid}"
+            elif worker.restart_at is not None:
+                state = f"exited with code {worker.exitcode}, restarting"
+            else:
+                state = f"exited with code {worker.exitcode}"
+            lines.append("--- " + worker.name + " --- " + state
+                         + ", " + str(worker.restarts) + " restarts")
+            if worker.telemetry is not None:
+                lines.append(worker.telemetry['info'])
+        return "\n".join(lines)
+
+    def Latency(self):
+        return "\n".join("--- " + worker.name + " ---\n"
+                         + (worker.telemetry['latency']
+                            if worker.telemetry is not None else "No telemetry")
+                         for worker in self.workers)
+
+    def MonitorThread(self):
+        prev_app_time = tm.time()
+
+        # ---------------------------- Monitor Loop ------------------------- #
+        while(1):
+            self.Poll(0.25)
+
+            if ((tm.time() - prev_app_time) > self.info_rate):
+                print(self.Info())
+                prev_app_time = tm.time()
+
+            if (self.stop_monitor_thread):
+                break
+
+    def Run(self):
+        # Starts the workers and serves console commands until 'x'
+        self.Start()
+        self.monitor_thread = threading.Thread(target=self.MonitorThread,
+                                               daemon=True)
+        self.monitor_thread.start()
+
+        print("\nShore Charger Translation Layer Running!\n")
+
+        while(True):
+            user_input = str(input())
+
+            if user_input == "x":
+                self.stop_monitor_thread = True
+                self.monitor_thread.join()
+                self.Stop()
+                return
+            elif user_input == "l":
+                print(self.Latency())
+            elif user_input == "r":
+                print("Enter new info rate in seconds:")
+                new_rate = float(input())
+                self.info_rate = new_rate
+            elif user_input == "?":
+                print("'x' - Terminate program\n" +
+                      "'r' - Change info print rate\n" +
+                      "'l' - Show setpoint latency histogram")
+            else:
+                print("Invalid command! Enter '?' for command list\n")
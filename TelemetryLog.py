@@ -0,0 +1,315 @@
+import CANReceiver as cr
+import collections
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+# Append-only binary log of the CAN frames a station receives and sends, of
+# its PSU measurements and of the latency trace of each setpoint.
+#
+# File layout: a 16-byte header (magic, version, record size, wall clock
+# offset), then fixed 32-byte little-endian records, so record n is at
+# 16 + 32 * n:
+#   CAN frame    B kind (kReceived/kTransmitted), B msgtype, B length, x,
+#                I CAN ID, Q host time (ns), Q hardware timestamp (us, 0 for
+#                transmitted frames), 8s data
+#   measurement  B kind (kMeasurement), B output enabled, H status bits
+#                (kStatusFlags order), 4x, Q host time (ns), f voltage,
+#                f current, 8x
+#   latency      B kind (kLatencyTrace), B output enabled, 2x, I handled,
+#   trace        Q received host time (ns), I written, I output reached
+#                (kNotReached if never), f voltage, f current; handled,
+#                written and output reached in us after received
+# Version 1 files have no latency traces; versions before 3 leave the wall
+# clock offset 0.
+# Host times are time.monotonic_ns() values; the wall clock offset is
+# time.time_ns() - time.monotonic_ns() when the file was opened. Files
+# rotate at max_file_size; names sort in write order:
+# <prefix>-<start time>-<sequence>.sctl
+#
+# The loops only pack records and append them to a queue. A background
+# thread joins them into large writes. The queue holds at most
+# max_pending_bytes of records (kMaxPendingBytes, 4 MB: about 15 s of a
+# fully loaded 1 Mbit/s bus; Python keeps each 32-byte record in about 80
+# bytes of memory). When the disk falls behind by more than that, new
+# records are dropped and counted (dropped, exported by Instrument) instead
+# of blocking the caller or growing without bound.
+
+kMagic = b'SCTL'
+kVersion = 3
+kReadableVersions = (1, 2, 3)
+kHeader = struct.Struct('<4sHHq')
+kRecordSize = 32
+
+kReceived = 1
+kTransmitted = 2
+kMeasurement = 3
+kLatencyTrace = 4
+
+kFrameRecord = struct.Struct('<BBBxIQQ8s')
+kMeasurementRecord = struct.Struct('<BBH4xQff8x')
+kLatencyTraceRecord = struct.Struct('<BBxxIQIIff')
+kNotReached = 0xFFFFFFFF
+
+# ChromaStatus fields, bit 0 first
+kStatusFlags = ('ovp', 'ocp', 'opp', 'remote_inhibit', 'otp', 'fan_lock',
+                'sense_fault', 'series_fault', 'ac_fault',
+                'fold_back_cv_2_cc', 'fold_back_cc_2_cv')
+
+kMaxFileSize = 64 * 1024 * 1024
+kBufferSize = 1024 * 1024        # Bytes gathered into one write
+kFlushPeriod = 0.5               # Longest a record waits for the writer, in seconds
+kMaxPendingBytes = 4 * 1024 * 1024  # Records queued before new ones are dropped
+
+FrameRecord = collections.namedtuple(
+    'FrameRecord', 'kind msgtype can_id host_ns hardware_us data')
+MeasurementRecord = collections.namedtuple(
+    'MeasurementRecord', 'host_ns voltage current output_enable status')
+# Times in host ns; reflected_ns is None if the output never got there
+LatencyTraceRecord = collections.namedtuple(
+    'LatencyTraceRecord', 'received_ns handled_ns written_ns reflected_ns '
+    'voltage current enable_output')
+
+
+def _Micros(delta_ns):
+    # A latency trace step as stored: microseconds, clamped to a uint32
+    return min(max(delta_ns // 1000, 0), kNotReached - 1)
+
+
+class TelemetryLog:
+    def __init__(self, directory, prefix='telemetry',
+                 max_file_size=kMaxFileSize, buffer_size=kBufferSize,
+                 flush_period=kFlushPeriod, max_pending_bytes=kMaxPendingBytes):
+        self.directory = directory
+        self.prefix = re.sub(r'[^\w.-]', '_', prefix)
+        self.max_file_size = max_file_size
+        self.buffer_size = buffer_size
+        self.flush_period = flush_period
+        self.max_pending = max_pending_bytes // kRecordSize  # in records
+
+        self.records = 0          # records written
+        self.dropped = 0          # records dropped while the disk was behind
+        self.files = []           # paths written, oldest first
+
+        self._pending = collections.deque()
+        self._wake = threading.Event()
+        self._stop = False
+        self._file = None
+        self._file_size = 0
+        self._started = time.strftime('%Y%m%d-%H%M%S')
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._Run, daemon=True,
+                                        name='telemetry-log')
+        self._thread.start()
+
+    def Instrument(self, registry, labels):
+        # Exports the records written and dropped in a Metrics registry
+        registry.Counter('shore_charger_telemetry_records_total',
+                         "Telemetry records written to disk", labels,
+                         lambda: self.records)
+        registry.Counter('shore_charger_telemetry_dropped_total',
+                         "Telemetry records dropped while the disk was behind",
+                         labels, lambda: self.dropped)
+
+    # ------------------------------ Loop side ----------------------------- #
+    def _Append(self, record):
+        pending = self._pending
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        pending.append(record)
+        if len(pending) * kRecordSize >= self.buffer_size:
+            self._wake.set()
+
+    def LogReceived(self, rx_buffer, count, host_ns):
+        # The first count frames of a TPCANReadBuffer, read at host_ns
+        pack = kFrameRecord.pack
+        messages = rx_buffer.Messages
+        timestamps = rx_buffer.Timestamps
+        for i in range(count):
+            msg = messages[i]
+            self._Append(pack(kReceived, msg.MSGTYPE, msg.LEN, msg.ID, host_ns,
+                              cr.TimestampMicros(timestamps[i]), bytes(msg.DATA)))
+
+    def LogTransmitted(self, msg, host_ns):
+        self._Append(kFrameRecord.pack(kTransmitted, msg.MSGTYPE, msg.LEN,
+                                       msg.ID, host_ns, 0, bytes(msg.DATA)))
+
+    def LogMeasurement(self, measurement, host_ns):
+        status = measurement.status
+        bits = 0
+        for bit, flag in enumerate(kStatusFlags):
+            if getattr(status, flag):
+                bits |= 1 << bit
+        self._Append(kMeasurementRecord.pack(
+            kMeasurement, int(bool(measurement.output_enable)), bits, host_ns,
+            measurement.voltage, measurement.current))
+
+    def LogLatencyTrace(self, trace):
+        # A SharedState.LatencyTrace
+        received_ns = trace.received_ns
+        reflected = (kNotReached if trace.reflected_ns is None
+                     else _Micros(trace.reflected_ns - received_ns))
+        self._Append(kLatencyTraceRecord.pack(
+            kLatencyTrace, int(bool(trace.enable_output)),
+            _Micros(trace.handled_ns - received_ns), received_ns,
+            _Micros(trace.written_ns - received_ns), reflected,
+            trace.voltage, trace.current))
+
+    def Close(self):
+        # Writes what is queued and closes the file
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    # ------------------------------ Writer -------------------------------- #
+    def _Run(self):
+        while True:
+            self._wake.wait(self.flush_period)
+            self._wake.clear()
+            stop = self._stop
+            self._WritePending()
+            if stop:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _WritePending(self):
+        pending = self._pending
+        while len(pending) != 0:
+            # Gather up to the room left in the file (or one buffer)
+            room = min(self.buffer_size,
+                       self.max_file_size - self._file_size) // kRecordSize
+            if self._file is None or room <= 0:
+                self._Rotate()
+                continue
+            records = []
+            while len(records) < room and len(pending) != 0:
+                records.append(pending.popleft())
+            self._file.write(b''.join(records))
+            self._file.flush()
+            self._file_size += len(records) * kRecordSize
+            self.records += len(records)
+
+    def _Rotate(self):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f'{self.prefix}-{self._started}-'
+                            f'{len(self.files):04d}.sctl')
+        self._file = open(path, 'wb', buffering=self.buffer_size)
+        self._file.write(kHeader.pack(kMagic, kVersion, kRecordSize,
+                                      time.time_ns() - time.monotonic_ns()))
+        self._file_size = kHeader.size
+        self.files.append(path)
+
+
+class TelemetryReader:
+    # Memory-maps a log file for offline analysis. A record cut short by a
+    # crash at the end of the file is ignored.
+    #   with TelemetryReader(path) as log:
+    #       for frame in log.Frames(can_id=0x618): ...
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, epoch_ns = kHeader.unpack_from(self._map, 0)
+        if (magic != kMagic or version not in kReadableVersions or
+                record_size != kRecordSize):
+            self.Close()
+            raise ValueError(f"{path} is not a readable telemetry log")
+        # Wall clock - host clock in ns, None if the file does not record it
+        self.epoch_ns = epoch_ns if version >= 3 else None
+        self.count = (len(self._map) - kHeader.size) // kRecordSize
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.Close()
+
+    def Close(self):
+        self._map.close()
+        self._file.close()
+
+    def Record(self, index):
+        offset = kHeader.size + index * kRecordSize
+        if self._map[offset] == kMeasurement:
+            return self._Measurement(kMeasurementRecord.unpack_from(self._map, offset))
+        if self._map[offset] == kLatencyTrace:
+            return self._LatencyTrace(kLatencyTraceRecord.unpack_from(self._map, offset))
+        return self._Frame(kFrameRecord.unpack_from(self._map, offset))
+
+    def Records(self):
+        for index in range(self.count):
+            yield self.Record(index)
+
+    def Frames(self, can_id=None, kind=None):
+        # CAN frames, optionally of one ID and/or kind (kReceived/kTransmitted)
+        view = memoryview(self._map)[kHeader.size:
+                                     kHeader.size + self.count * kRecordSize]
+        for fields in kFrameRecord.iter_unpack(view):
+            if fields[0] != kReceived and fields[0] != kTransmitted:
+                continue
+            if kind is not None and fields[0] != kind:
+                continue
+            if can_id is not None and fields[3] != can_id:
+                continue
+            yield self._Frame(fields)
+        view.release()
+
+    def Measurements(self):
+        view = memoryview(self._map)[kHeader.size:
+                                     kHeader.size + self.count * kRecordSize]
+        for fields in kMeasurementRecord.iter_unpack(view):
+            if fields[0] == kMeasurement:
+                yield self._Measurement(fields)
+        view.release()
+
+    def LatencyTraces(self):
+        view = memoryview(self._map)[kHeader.size:
+                                     kHeader.size + self.count * kRecordSize]
+        for fields in kLatencyTraceRecord.iter_unpack(view):
+            if fields[0] == kLatencyTrace:
+                yield self._LatencyTrace(fields)
+        view.release()
+
+    @staticmethod
+    def _Frame(fields):
+        kind, msgtype, length, can_id, host_ns, hardware_us, data = fields
+        return FrameRecord(kind, msgtype, can_id, host_ns, hardware_us,
+                           data[:length])
+
+    @staticmethod
+    def _Measurement(fields):
+        kind, output_enable, bits, host_ns, voltage, current = fields
+        status = {flag: bool(bits >> bit & 1)
+                  for bit, flag in enumerate(kStatusFlags)}
+        return MeasurementRecord(host_ns, voltage, current,
+                                 bool(output_enable), status)
+
+
+    @staticmethod
+    def _LatencyTrace(fields):
+        (kind, enable_output, handled_us, received_ns, written_us, reflected_us,
+         voltage, current) = fields
+        reflected_ns = (None if reflected_us == kNotReached
+                        else received_ns + reflected_us * 1000)
+        return LatencyTraceRecord(received_ns, received_ns + handled_us * 1000,
+                                  received_ns + written_us * 1000, reflected_ns,
+                                  voltage, current, bool(enable_output))
+
+
+def LogFiles(directory, prefix='telemetry'):
+    # Log files of a prefix, oldest first
+    prefix = re.sub(r'[^\w.-]', '_', prefix)
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith(prefix + '-') and name.endswith('.sctl'))
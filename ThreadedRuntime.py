@@ -0,0 +1,135 @@
+import ChargerStation as cs
+import threading
+import time as tm
+
+
+class ThreadedRuntime:
+    # Runs charger stations on daemon threads: a CAN thread (receive +
+    # periodic TX) and a serial thread (PSU I/O) per station, and one info
+    # thread. Each thread checks its stop flag once per loop; Stop() sets
+    # them in order and joins.
+
+    def __init__(self, stations, info_rate=10):
+        self.stations = stations
+        self.info_rate = info_rate  # Info message rate in seconds
+
+        # Thread stop flags
+        self.stop_can_thread = False
+        self.stop_serial_thread = False
+        self.stop_info_thread = False
+
+        self.can_threads = []
+        self.serial_threads = []
+        self.info_thread = None
+
+    def CANThread(self, station):
+        # Send a message to inform that the CAN code is running
+        print("PCAN Signal Received. CAN Loop Running...")
+        tm.sleep(0.5)
+
+        station.StartTx(tm.monotonic_ns())
+
+        # ------------------------------ CAN Loop --------------------------- #
+        while(1):
+            # Block until the driver signals pending frames or the next TX is due
+            station.receive_event.Wait(station.TimeToTx())
+
+            station.DrainReceive()
+
+            # Messages to Send
+            station.RunTx()
+
+            if (self.stop_can_thread):
+                break
+
+        station.CloseReceive()
+
+    def SerialThread(self, station):
+        # Send a message to inform that the PSU code is running
+        print("Chroma Signal Received. Serial Loop Running...")
+        tm.sleep(0.5)
+
+        # ---------------------------- Serial Loop -------------------------- #
+        while(1):
+            station.PSUStep()
+
+            if (self.stop_serial_thread):
+                break
+
+    def InfoThread(self):
+        # timing for status print
+        app_start_time = tm.time()
+        curr_app_time = tm.time()
+        prev_app_time = tm.time()
+
+        # Send a message to inform that the main code is running
+        print("Info Loop Running...")
+        tm.sleep(0.5)
+
+        print("")
+        # ----------------------------- Info Loop --------------------------- #
+        while(1):
+            if ((curr_app_time - prev_app_time) > self.info_rate):
+                print(cs.StationsInfo(self.stations,
+                                      curr_app_time - app_start_time))
+
+                curr_app_time = tm.time()
+                prev_app_time = tm.time()
+            else:
+                curr_app_time = tm.time()
+
+            if (self.stop_info_thread):
+                break
+
+            tm.sleep(0.25)
+
+    def Start(self):
+        self.can_threads = [
+            threading.Thread(target=self.CANThread, args=(station,), daemon=True)
+            for station in self.stations]
+        self.serial_threads = [
+            threading.Thread(target=self.SerialThread, args=(station,), daemon=True)
+            for station in self.stations]
+        self.info_thread = threading.Thread(target=self.InfoThread, daemon=True)
+
+        for thread in self.can_threads + self.serial_threads + [self.info_thread]:
+            thread.start()
+
+    def Stop(self):
+        self.stop_can_thread = True
+        for thread in self.can_threads:
+            thread.join()
+        self.stop_serial_thread = True
+        for station in self.stations:
+            station.setpoints.Wake()
+        for thread in self.serial_threads:
+            thread.join()
+        self.stop_info_thread = True
+        self.info_thread.join()
+
+    def Run(self):
+        # Starts the threads and serves console commands until 'x'
+        self.Start()
+
+        print("\nShore Charger Translation Layer Running!\n")
+
+        while(True):
+            user_input = str(input())
+
+            if user_input == "x":
+                for station in self.stations:
+                    station.Abort()
+                self.Stop()
+                return
+            elif user_input == "l":
+                print(cs.StationsLatency(self.stations))
+            elif user_input == "r":
+                print("Enter new info rate in seconds:")
+                new_rate = float(input())
+                self.info_rate = new_rate
+            elif user_input == "?":
+                print("'x' - Terminate program\n" +
+                      "'r' - Change info print rate\n" +
+                      "'l' - Show setpoint latency histogram")
+            else:
+                print("Invalid command! Enter '?' for command list\n")
@@ -0,0 +1,527 @@
+import PCANBasic as pb
+import collections
+import os
+import platform
+import threading
+import time
+
+# Pure-Python stand-in for the PCAN-Basic library, so the translation layer
+# runs without a PEAK adapter:
+#
+#   bus = vb.VirtualBus(bitrate=1000000)
+#   library = vb.VirtualPCANLibrary()
+#   library.Attach(pb.PCAN_USBBUS1, bus)
+#   pcan = pb.PCANBasic(Library=library)
+#
+#   bus.Traffic(0x618, rate=10, data=request_bytes)   # another node's frames
+#   bus.Burst(0x100, count=5000)                      # back to back at bus speed
+#   library.Channel(pb.PCAN_USBBUS1).transmitted      # what the channel sent
+#   bus.SetBusOff()                                   # error injection
+#
+# A VirtualBus is one CAN segment: frames injected on it or written by one
+# attached channel are received by every other attached channel. Channels
+# that are not attached get a bus of their own, which runs at the bitrate
+# the channel is initialized with.
+#
+# Each channel models the driver side of a PCAN channel: a bounded receive
+# queue (frames are dropped and PCAN_ERROR_QOVERRUN is reported when it is
+# full), the receive event, the acceptance filter, error frames, error
+# counters and bus-off, with a status frame queued when the bus goes off
+# and when auto-reset brings it back (PCAN_ALLOW_STATUS_FRAMES, on by
+# default). As with the driver, CAN_Reset only flushes the
+# queues: bus-off ends with PCAN_BUSOFF_AUTORESET or when the channel is
+# uninitialized and initialized again, which also drops its settings.
+
+kReceiveQueueSize = 32768    # Frames held by the driver receive queue
+kTransmitRecordSize = 100000  # Transmitted frames kept per channel
+kTrafficTick = 0.001          # Traffic generators deliver in batches of this period, in seconds
+kBusOffRecoveryBits = 128 * 11
+kNotFilteredTypes = pb.PCAN_MESSAGE_ERRFRAME.value | pb.PCAN_MESSAGE_STATUS.value
+
+# Error counter limits reported as bus status
+kBusLightLimit = 96
+kBusHeavyLimit = 128
+
+kBitrates = {
+    pb.PCAN_BAUD_1M.value: 1000000,
+    pb.PCAN_BAUD_800K.value: 800000,
+    pb.PCAN_BAUD_500K.value: 500000,
+    pb.PCAN_BAUD_250K.value: 250000,
+    pb.PCAN_BAUD_125K.value: 125000,
+    pb.PCAN_BAUD_100K.value: 100000,
+    pb.PCAN_BAUD_50K.value: 50000,
+    pb.PCAN_BAUD_20K.value: 20000,
+    pb.PCAN_BAUD_10K.value: 10000,
+    pb.PCAN_BAUD_5K.value: 5000,
+}
+
+
+def FrameBits(length, extended=False):
+    # Bits a data frame occupies on the bus, including the interframe space.
+    # Stuff bits are not counted, so rates derived from it are the upper bound.
+    return (67 if extended else 47) + 8 * length
+
+
+class VirtualFrame:
+    __slots__ = ('timestamp_ns', 'can_id', 'msgtype', 'data')
+
+    def __init__(self, timestamp_ns, can_id, msgtype, data):
+        self.timestamp_ns = timestamp_ns  # time.perf_counter_ns() on the bus
+        self.can_id = can_id
+        self.msgtype = msgtype            # TPCANMessageType value
+        self.data = data
+
+    def __repr__(self):
+        return (f'VirtualFrame(0x{self.can_id:03X}, {self.data.hex(" ")}, '
+                f't={self.timestamp_ns})')
+
+
+class Traffic:
+    # Frames sent by a simulated node at a fixed rate, on a thread. Frames are
+    # delivered in kTrafficTick batches but carry their exact scheduled
+    # timestamps. data is bytes or a function of the frame index.
+
+    def __init__(self, bus, can_id, rate, data, count=None,
+                 msgtype=pb.PCAN_MESSAGE_STANDARD):
+        self.bus = bus
+        self.can_id = can_id
+        self.rate = rate
+        self.data = data
+        self.count = count
+        self.msgtype = _Key(msgtype)
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._Run, daemon=True,
+                                        name=f'traffic-0x{can_id:03X}')
+
+    def Start(self):
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def Wait(self, timeout=None):
+        # Waits for a count-limited source to finish
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _Run(self):
+        period_ns = int(1e9 / self.rate)
+        data = self.data
+        start_ns = time.perf_counter_ns()
+
+        while not self._stop.is_set():
+            due = (time.perf_counter_ns() - start_ns) // period_ns + 1
+            if self.count is not None:
+                due = min(due, self.count)
+
+            frames = []
+            while self.sent < due:
+                frames.append(VirtualFrame(
+                    start_ns + self.sent * period_ns, self.can_id, self.msgtype,
+                    data(self.sent) if callable(data) else data))
+                self.sent += 1
+            self.bus.DeliverMany(frames)
+
+            if self.count is not None and self.sent >= self.count:
+                return
+            next_ns = start_ns + self.sent * period_ns
+            self._stop.wait(max((next_ns - time.perf_counter_ns()) / 1e9,
+                                kTrafficTick))
+
+
+class VirtualBus:
+    def __init__(self, bitrate=1000000):
+        self.bitrate = bitrate
+        self.channels = []
+        self.listeners = []  # callables(frame), called for every frame on the bus
+        self.traffic = []
+
+    def FrameTime(self, length=8, extended=False):
+        # Seconds one data frame occupies the bus
+        return FrameBits(length, extended) / self.bitrate
+
+    def MaxFrameRate(self, length=8, extended=False):
+        return 1.0 / self.FrameTime(length, extended)
+
+    def Inject(self, can_id, data=bytes(8), msgtype=pb.PCAN_MESSAGE_STANDARD):
+        self.DeliverMany([VirtualFrame(time.perf_counter_ns(), can_id,
+                                       _Key(msgtype), bytes(data))])
+
+    def Traffic(self, can_id, rate, data=bytes(8), count=None,
+                msgtype=pb.PCAN_MESSAGE_STANDARD):
+        source = Traffic(self, can_id, rate, data, count, msgtype)
+        self.traffic.append(source)
+        return source.Start()
+
+    def Burst(self, can_id, count, data=bytes(8), bus_load=1.0,
+              msgtype=pb.PCAN_MESSAGE_STANDARD):
+        # count frames back to back at bus_load x the maximum frame rate
+        length = len(data) if not callable(data) else len(data(0))
+        extended = bool(_Key(msgtype) & pb.PCAN_MESSAGE_EXTENDED.value)
+        rate = self.MaxFrameRate(length, extended) * bus_load
+        return self.Traffic(can_id, rate, data, count, msgtype)
+
+    def StopTraffic(self):
+        for source in self.traffic:
+            source.Stop()
+        self.traffic = []
+
+    def DeliverMany(self, frames, sender=None):
+        if len(frames) == 0:
+            return
+        for channel in self.channels:
+            if channel is not sender:
+                channel.ReceiveMany(frames)
+        for listener in self.listeners:
+            for frame in frames:
+                listener(frame)
+
+    def InjectErrorFrames(self, count=1):
+        # Error frames seen by every channel; they raise the receive error
+        # counters and are queued where PCAN_ALLOW_ERROR_FRAMES is on
+        for channel in self.channels:
+            channel.ErrorFrames(count)
+
+    def SetBusOff(self):
+        # Puts every attached controller in bus-off (e.g. a shorted bus)
+        for channel in self.channels:
+            channel.SetBusOff()
+
+
+class VirtualChannel:
+    def __init__(self, library, handle, bus, queue_size=kReceiveQueueSize):
+        self.library = library
+        self.handle = handle
+        self.bus = bus
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.queue_size = queue_size
+        self.transmitted = collections.deque(maxlen=kTransmitRecordSize)
+
+        self.initialized = False
+        self.filter_state = pb.PCAN_FILTER_OPEN
+        self.filter_ranges = []
+        self.allow_error_frames = False
+        self.allow_status_frames = True
+        self.busoff_autoreset = False
+        self.autoreset_supported = True  # False: PCAN_BUSOFF_AUTORESET is refused
+
+        # Driver status
+        self.overrun = False
+        self.error_counter = 0
+        self.bus_off_since = None
+        self.received = 0
+        self.dropped = 0
+        self.error_frames = 0
+        self.bus_off_count = 0
+
+        # Receive event: a pipe readable while the queue holds frames
+        # (Linux/Mac driver semantics), or a Windows event handle set by the
+        # application
+        self.event_r = None
+        self.event_w = None
+        self.event_handle = None
+        if platform.system() != 'Windows':
+            self.event_r, self.event_w = os.pipe()
+
+    def Accepts(self, frame):
+        # The filter is on IDs; error and status frames always pass it
+        if (self.filter_state == pb.PCAN_FILTER_OPEN or
+                frame.msgtype & kNotFilteredTypes):
+            return True
+        extended = frame.msgtype & pb.PCAN_MESSAGE_EXTENDED.value
+        for from_id, to_id, mode in self.filter_ranges:
+            if (from_id <= frame.can_id <= to_id and
+                    bool(mode & pb.PCAN_MESSAGE_EXTENDED.value) == bool(extended)):
+                return True
+        return False
+
+    def ReceiveMany(self, frames):
+        if not self.initialized or self.IsBusOff():
+            return
+        accepted = [frame for frame in frames if self.Accepts(frame)]
+        with self.lock:
+            was_empty = len(self.queue) == 0
+            room = self.queue_size - len(self.queue)
+            if len(accepted) > room:
+                self.dropped += len(accepted) - room
+                self.overrun = True
+                accepted = accepted[:room]
+            self.queue.extend(accepted)
+            self.received += len(accepted)
+            self.error_counter = max(self.error_counter - len(accepted), 0)
+            if was_empty and len(accepted) != 0:
+                self._SignalEvent()
+
+    def ErrorFrames(self, count):
+        if not self.initialized or self.IsBusOff():
+            return
+        self.error_frames += count
+        self.error_counter = min(self.error_counter + 8 * count, 255)
+        if self.allow_error_frames:
+            now = time.perf_counter_ns()
+            self.ReceiveMany([VirtualFrame(now, 0, pb.PCAN_MESSAGE_ERRFRAME.value,
+                                           bytes(8)) for _ in range(count)])
+
+    def SetBusOff(self):
+        if not self.initialized:
+            return
+        with self.lock:
+            self.bus_off_since = time.perf_counter_ns()
+            self.bus_off_count += 1
+            self.error_counter = 255
+        self._QueueStatus(pb.PCAN_ERROR_BUSOFF)
+
+    def IsBusOff(self):
+        if self.bus_off_since is None:
+            return False
+        if self.busoff_autoreset:
+            recovery_ns = kBusOffRecoveryBits * 1000000000 // self.bus.bitrate
+            if time.perf_counter_ns() - self.bus_off_since >= recovery_ns:
+                self.bus_off_since = None
+                self.error_counter = 0
+                self._QueueStatus(pb.PCAN_ERROR_OK)
+                return False
+        return True
+
+    def Status(self):
+        # Bus state bits of CAN_GetStatus; a queue overrun is reported once
+        status = pb.PCAN_ERROR_OK
+        if self.IsBusOff():
+            status |= pb.PCAN_ERROR_BUSOFF
+        elif self.error_counter >= kBusHeavyLimit:
+            status |= pb.PCAN_ERROR_BUSHEAVY
+        elif self.error_counter >= kBusLightLimit:
+            status |= pb.PCAN_ERROR_BUSLIGHT
+        if self.overrun:
+            self.overrun = False
+            status |= pb.PCAN_ERROR_QOVERRUN
+        return status
+
+    def Reset(self):
+        # CAN_Reset: flushes the queues; the controller stays as it is
+        with self.lock:
+            if len(self.queue) != 0:
+                self._ClearEvent()
+            self.queue.clear()
+            self.overrun = False
+
+    def Initialize(self):
+        # CAN_Initialize/CAN_Uninitialize: a fresh controller with the
+        # driver defaults, so bus-off ends and every setting is lost
+        self.Reset()
+        with self.lock:
+            self.bus_off_since = None
+            self.error_counter = 0
+            self.filter_state = pb.PCAN_FILTER_OPEN
+            self.filter_ranges = []
+            self.allow_error_frames = False
+            self.allow_status_frames = True
+            self.busoff_autoreset = False
+            self.event_handle = None
+
+    def _QueueStatus(self, status):
+        # A status frame: the new bus status in DATA[0..3], big-endian. It
+        # is queued while bus-off too, as the driver reports it.
+        if not self.allow_status_frames:
+            return
+        frame = VirtualFrame(time.perf_counter_ns(), 0,
+                             pb.PCAN_MESSAGE_STATUS.value,
+                             _Key(status).to_bytes(4, 'big'))
+        with self.lock:
+            if len(self.queue) >= self.queue_size:
+                self.dropped += 1
+                self.overrun = True
+                return
+            self.queue.append(frame)
+            if len(self.queue) == 1:
+                self._SignalEvent()
+
+    def _SignalEvent(self):
+        if self.event_w is not None:
+            os.write(self.event_w, b'\x01')
+        elif self.event_handle:
+            import ctypes
+            ctypes.windll.kernel32.SetEvent(self.event_handle)
+
+    def _ClearEvent(self):
+        if self.event_r is not None:
+            os.read(self.event_r, 1)
+
+    def Close(self):
+        if self.event_r is not None:
+            os.close(self.event_r)
+            os.close(self.event_w)
+            self.event_r = self.event_w = None
+
+
+class VirtualPCANLibrary:
+    # The CAN_* functions of libpcanbasic, for PCANBasic(Library=...)
+
+    def __init__(self):
+        self.channels = {}
+        self.own_buses = set()  # channels on a bus Channel() created for them
+        self.epoch_ns = time.perf_counter_ns()  # receive timestamp zero
+
+    def Attach(self, Channel, bus, queue_size=kReceiveQueueSize):
+        channel = VirtualChannel(self, Channel, bus, queue_size)
+        self.channels[_Key(Channel)] = channel
+        bus.channels.append(channel)
+        return channel
+
+    def Channel(self, Channel):
+        channel = self.channels.get(_Key(Channel))
+        if channel is None:
+            channel = self.Attach(Channel, VirtualBus())
+            self.own_buses.add(_Key(Channel))
+        return channel
+
+    def _Initialized(self, Channel):
+        channel = self.channels.get(_Key(Channel))
+        if channel is None or not channel.initialized:
+            return None
+        return channel
+
+    def CAN_Initialize(self, Channel, Btr0Btr1, HwType=None, IOPort=None,
+                       Interrupt=None):
+        channel = self.Channel(Channel)
+        channel.Initialize()
+        channel.initialized = True
+        bitrate = kBitrates.get(_Key(Btr0Btr1))
+        if _Key(Channel) in self.own_buses and bitrate is not None:
+            channel.bus.bitrate = bitrate
+        if bitrate != channel.bus.bitrate:
+            # The driver joins the bus at the bitrate already in use
+            return pb.PCAN_ERROR_CAUTION
+        return pb.PCAN_ERROR_OK
+
+    def CAN_Uninitialize(self, Channel):
+        if _Key(Channel) == pb.PCAN_NONEBUS.value:
+            channels = list(self.channels.values())
+        else:
+            channels = [self.channels.get(_Key(Channel))]
+        for channel in channels:
+            if channel is None or not channel.initialized:
+                return pb.PCAN_ERROR_INITIALIZE
+            channel.Initialize()
+            channel.initialized = False
+        return pb.PCAN_ERROR_OK
+
+    def CAN_Reset(self, Channel):
+        channel = self._Initialized(Channel)
+        if channel is None:
+            return pb.PCAN_ERROR_INITIALIZE
+        channel.Reset()
+        return pb.PCAN_ERROR_OK
+
+    def CAN_GetStatus(self, Channel):
+        channel = self._Initialized(Channel)
+        if channel is None:
+            return pb.PCAN_ERROR_INITIALIZE
+        return channel.Status()
+
+    def CAN_Read(self, Channel, Message, Timestamp):
+        channel = self._Initialized(Channel)
+        if channel is None:
+            return pb.PCAN_ERROR_INITIALIZE
+
+        with channel.lock:
+            frame = None
+            if len(channel.queue) != 0:
+                frame = channel.queue.popleft()
+                if len(channel.queue) == 0:
+                    channel._ClearEvent()
+        # Status() may queue a status frame, so it runs outside the lock
+        if frame is None:
+            return pb.PCAN_ERROR_QRCVEMPTY | channel.Status()
+
+        msg = Message._obj
+        msg.ID = frame.can_id
+        msg.MSGTYPE = frame.msgtype
+        msg.LEN = len(frame.data)
+        msg.DATA[:len(frame.data)] = frame.data
+        if Timestamp is not None:
+            micros = (frame.timestamp_ns - self.epoch_ns) // 1000
+            millis = micros // 1000
+            timestamp = Timestamp._obj
+            timestamp.millis = millis & 0xFFFFFFFF
+            timestamp.millis_overflow = (millis >> 32) & 0xFFFF
+            timestamp.micros = micros % 1000
+        return pb.PCAN_ERROR_OK
+
+    def CAN_Write(self, Channel, MessageBuffer):
+        channel = self._Initialized(Channel)
+        if channel is None:
+            return pb.PCAN_ERROR_INITIALIZE
+        if channel.IsBusOff():
+            return pb.PCAN_ERROR_BUSOFF
+
+        msg = MessageBuffer._obj
+        frame = VirtualFrame(time.perf_counter_ns(), msg.ID, msg.MSGTYPE,
+                             bytes(msg.DATA[:msg.LEN]))
+        channel.transmitted.append(frame)
+        channel.bus.DeliverMany([frame], sender=channel)
+        return pb.PCAN_ERROR_OK
+
+    def CAN_FilterMessages(self, Channel, FromID, ToID, Mode):
+        channel = self._Initialized(Channel)
+        if channel is None:
+            return pb.PCAN_ERROR_INITIALIZE
+        if channel.filter_state != pb.PCAN_FILTER_CUSTOM:
+            channel.filter_ranges = []
+        channel.filter_state = pb.PCAN_FILTER_CUSTOM
+        channel.filter_ranges.append((_Key(FromID), _Key(ToID), _Key(Mode)))
+        return pb.PCAN_ERROR_OK
+
+    def CAN_GetValue(self, Channel, Parameter, Buffer, Length):
+        channel = self.Channel(Channel)
+        parameter = _Key(Parameter)
+        buffer = Buffer._obj
+
+        if parameter == pb.PCAN_RECEIVE_EVENT.value and channel.event_r is not None:
+            buffer.value = channel.event_r
+        elif parameter == pb.PCAN_MESSAGE_FILTER.value:
+            buffer.value = channel.filter_state
+        elif parameter == pb.PCAN_ALLOW_ERROR_FRAMES.value:
+            buffer.value = int(channel.allow_error_frames)
+        elif parameter == pb.PCAN_ALLOW_STATUS_FRAMES.value:
+            buffer.value = int(channel.allow_status_frames)
+        elif parameter == pb.PCAN_BUSOFF_AUTORESET.value:
+            buffer.value = int(channel.busoff_autoreset)
+        elif parameter == pb.PCAN_CHANNEL_CONDITION.value:
+            buffer.value = pb.PCAN_CHANNEL_AVAILABLE
+        else:
+            return pb.PCAN_ERROR_ILLPARAMTYPE
+        return pb.PCAN_ERROR_OK
+
+    def CAN_SetValue(self, Channel, Parameter, Buffer, Length):
+        channel = self.Channel(Channel)
+        parameter = _Key(Parameter)
+        value = Buffer._obj.value
+
+        if parameter == pb.PCAN_RECEIVE_EVENT.value and channel.event_r is None:
+            channel.event_handle = value
+        elif parameter == pb.PCAN_MESSAGE_FILTER.value:
+            channel.filter_state = value
+            channel.filter_ranges = []
+        elif parameter == pb.PCAN_ALLOW_ERROR_FRAMES.value:
+            channel.allow_error_frames = value == pb.PCAN_PARAMETER_ON
+        elif parameter == pb.PCAN_ALLOW_STATUS_FRAMES.value:
+            channel.allow_status_frames = value == pb.PCAN_PARAMETER_ON
+        elif (parameter == pb.PCAN_BUSOFF_AUTORESET.value and
+                channel.autoreset_supported):
+            channel.busoff_autoreset = value == pb.PCAN_PARAMETER_ON
+        else:
+            return pb.PCAN_ERROR_ILLPARAMTYPE
+        return pb.PCAN_ERROR_OK
+
+    def CAN_GetErrorText(self, Error, Language, Buffer):
+        Buffer._obj.value = b'Virtual PCAN error 0x%X' % _Key(Error)
+        return pb.PCAN_ERROR_OK
+
+
+def _Key(value):
+    return getattr(value, 'value', value)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# Per-frame cost of the compiled CANCodec versus the hand-written shifting
+# previously inlined in CANThread (decode 0x618, encode 0x611 + 0x615).
+#   python benchmarks/codec.py
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import CANCodec as cc
+import ShoreChargerProtocol as sp
+
+kIterations = 200000
+
+codecs = cc.CompileLayouts(sp.layouts)
+request_codec = codecs[sp.kChargerRequestId]
+output_codec = codecs[sp.kChargerOutputId]
+faults_codec = codecs[sp.kChargerFaultsId]
+
+rx_msg = pb.TPCANMsg()
+rx_msg.ID = sp.kChargerRequestId
+rx_msg.LEN = 8
+rx_msg.DATA[:] = bytes([0x80, 0x00, 0x64, 0x08, 0xFD, 0x00, 0x96, 0x00])
+
+measured_voltage = 230.1
+measured_current = 15.0
+ac_fault, opp, ovp = 0, 1, 0
+
+
+def DecodeHandWritten():
+    enable_output = bool((rx_msg.DATA[0] >> 7) & 0b1)
+    max_ac_current = ((rx_msg.DATA[1] << 8) | (rx_msg.DATA[2]))/10.0
+    requested_voltage = ((rx_msg.DATA[3] << 8) | (rx_msg.DATA[4]))/10.0
+    requested_current = ((rx_msg.DATA[5] << 8) | (rx_msg.DATA[6]))/10.0
+    return enable_output, max_ac_current, requested_voltage, requested_current
+
+
+def DecodeCodec():
+    return request_codec.Decode(rx_msg.DATA)
+
+
+def EncodeHandWritten():
+    tx_msg = pb.TPCANMsg()
+    tx_msg.ID = 0x611
+    tx_msg.MSGTYPE = pb.PCAN_MESSAGE_STANDARD
+    tx_msg.LEN = 8
+    tx_msg.DATA[7] = (int(measured_current * 10.0) & 0x00FF)
+    tx_msg.DATA[6] = ((int(measured_current * 10.0) >> 8) & 0x00FF)
+    tx_msg.DATA[5] = (int(measured_voltage * 10.0) & 0x00FF)
+    tx_msg.DATA[4] = ((int(measured_voltage * 10.0) >> 8) & 0x00FF)
+    tx_msg.DATA[3] = 0xFF
+    tx_msg.DATA[2] = 0xFF
+    tx_msg.DATA[1] = 0xFF
+    tx_msg.DATA[0] = 0xFF
+    tx_msg.ID = 0x615
+    tx_msg.DATA[7] = 0xFF
+    tx_msg.DATA[6] = 0xFF
+    tx_msg.DATA[5] = 0xFF
+    tx_msg.DATA[4] = ((True & 0b1) << 7) | ((True & 0b1) << 5) | \
+        ((True & 0b1) << 3)
+    tx_msg.DATA[3] = 0xFF
+    tx_msg.DATA[2] = 0xFF
+    tx_msg.DATA[1] = 0xFF
+    tx_msg.DATA[0] = ((ac_fault & 0b1) << 7) | ((True & 0b1) << 6) | \
+        ((opp & 0b1) << 5) | ((ovp & 0b1) << 4)
+
+
+output_frame = pb.TPCANMsg()
+faults_frame = pb.TPCANMsg()
+output_data = cc.DataView(output_frame.DATA)
+faults_data = cc.DataView(faults_frame.DATA)
+
+
+def EncodeCodec():
+    output_data[:8] = output_codec.Encode(
+        MeasuredVoltage=measured_voltage, MeasuredCurrent=measured_current)
+    faults_data[:8] = faults_codec.Encode(
+        ACFault=ac_fault, OPP=opp, OVP=ovp)
+
+
+if __name__ == '__main__':
+    assert DecodeCodec() == (1, 10.0, 230.1, 15.0)
+    for name, func in (('decode 0x618 hand-written', DecodeHandWritten),
+                       ('decode 0x618 codec', DecodeCodec),
+                       ('encode 0x611+0x615 hand-written', EncodeHandWritten),
+                       ('encode 0x611+0x615 codec', EncodeCodec)):
+        elapsed = min(timeit.repeat(func, number=kIterations, repeat=3))
+        print(f"{name:34s} {elapsed / kIterations * 1e6:6.2f} us/frame")
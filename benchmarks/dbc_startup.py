@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Startup cost of loading a large DBC: first launch (parse + write cache),
+# later launches (cache hit) and compiling the codecs actually used.
+#   python benchmarks/dbc_startup.py [message_count]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import CANCodec as cc
+import CANDatabase as db
+
+
+def GenerateDBC(path, message_count):
+    lines = ['VERSION ""', '', 'BU_: Vehicle Charger', '']
+    for i in range(message_count):
+        lines.append(f'BO_ {0x100 + i} Message{i}: 8 Vehicle')
+        for j in range(8):
+            lines.append(f' SG_ Signal{i}_{j} : {j * 8 + 7}|8@0+ (0.1,0) '
+                         f'[0|25.5] "" Charger')
+        lines.append('')
+    with open(path, 'w') as dbc_file:
+        dbc_file.write('\n'.join(lines))
+
+
+def Timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000.0
+
+
+if __name__ == '__main__':
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'large.dbc')
+        GenerateDBC(path, message_count)
+
+        _, parse_ms = Timed(lambda: db.LoadDBC(path))
+        layouts, cached_ms = Timed(lambda: db.LoadDBC(path))
+        table, table_ms = Timed(lambda: cc.CompileLayouts(layouts))
+        _, lookup_ms = Timed(lambda: [table[0x100 + i] for i in range(3)])
+        _, compile_all_ms = Timed(lambda: [cc.MessageCodec(layout)
+                                           for layout in layouts])
+
+    print(f"{message_count} messages")
+    print(f"  parse DBC + write cache   {parse_ms:8.1f} ms")
+    print(f"  load from cache           {cached_ms:8.1f} ms")
+    print(f"  build dispatch table      {table_ms:8.1f} ms")
+    print(f"  compile 3 used codecs     {lookup_ms:8.1f} ms")
+    print(f"  (compile every codec      {compile_all_ms:8.1f} ms)")
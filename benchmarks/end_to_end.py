@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+# End-to-end benchmark of the CAN <-> PSU translation loop: a station opened
+# like the interpreter does (OpenStation) on a virtual CAN bus, driving a
+# simulated supply, served by the threaded or asyncio runtime. Reports, as
+# JSON for comparing versions:
+#  - throughput: 0x618 frames/s read without drops or a growing backlog,
+#    for each rate of kRates (every frame a new setpoint)
+#  - setpoint_latency_ms: 0x618 request on the bus -> :SOUR:VOLT taking
+#    effect in the supply, with the vehicle sending every 100 ms
+#  - response_latency_ms: request received -> PSU output polled at the
+#    setpoint, from the station's latency traces
+#  - receive_time_error_ms: request time in the traces (the adapter's
+#    timestamp on the host clock) - time the request was put on the bus
+#  - report_period_ms: 0x611 periods on the bus
+#  - measurement_age_ms: age of the PSU data carried by the reports
+#  - cpu_percent: per thread, over the latency run
+#   python benchmarks/end_to_end.py [--seconds S] [--runtime R] [--output FILE]
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import ChargerStation as cs
+import ShoreChargerProtocol as sp
+import StationConfig as cfg
+import SimulatedChroma as sc
+import ThreadedRuntime as tr
+import AsyncRuntime as ar
+import VirtualBus as vb
+
+kPSULatency = 0.002    # per USB transaction, in seconds
+kRequestPeriod = 0.1   # vehicle request period, in seconds
+kRates = (1000, 2000, 4000, 'bus')  # 'bus': back to back at 1 Mbit/s
+kMaxBacklog = 0.99     # share of the frames read by the end of a window
+kSettle = 1.0          # startup time excluded from the measurements, in seconds
+kDrain = 0.2           # in seconds
+
+
+def NewStation(use_hardware_filter=True):
+    bus = vb.VirtualBus(bitrate=1000000)
+    lib = vb.VirtualPCANLibrary()
+    channel = lib.Attach(pb.PCAN_USBBUS1, bus)
+    supply = sc.SimulatedChroma(latency=kPSULatency)
+    station = cs.OpenStation(cfg.StationConfig(use_hardware_filter=use_hardware_filter),
+                             sp.LoadCodecs(None),
+                             pb.PCANBasic(Library=lib), device=supply)
+    return bus, channel, supply, station
+
+
+def Serve(runtime, station, scenario):
+    # Runs scenario() on a thread of its own while the runtime serves station
+    if runtime == 'threads':
+        threaded = tr.ThreadedRuntime([station], info_rate=1e9)
+        threaded.Start()
+        try:
+            return scenario()
+        finally:
+            threaded.Stop()
+
+    async def Main():
+        serve = asyncio.create_task(ar.AsyncRuntime([station], None).Serve())
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, scenario)
+        finally:
+            serve.cancel()
+            await asyncio.gather(serve, return_exceptions=True)
+    return asyncio.run(Main())
+
+
+def Requests(count, first_voltage=0.0):
+    # count distinct 0x618 requests and the voltage each one asks for
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    voltages = [round(first_voltage + 0.1 * index, 1) for index in range(count)]
+    return codec.can_id, voltages, [
+        codec.Encode(EnableOutput=1, RequestedVoltage=voltage,
+                     RequestedCurrent=10) for voltage in voltages]
+
+
+def ThreadCPU():
+    # CPU seconds used so far by each live thread
+    usage = {}
+    for thread in threading.enumerate():
+        try:
+            clock = time.pthread_getcpuclockid(thread.ident)
+            usage[thread.name] = time.clock_gettime(clock)
+        except (AttributeError, OSError, TypeError):
+            pass
+    return usage
+
+
+def Percentiles(values_ns):
+    values = sorted(round(value / 1e6, 3) for value in values_ns)
+    if len(values) == 0:
+        return {'n': 0}
+    return {
+        'n': len(values),
+        'p50': values[len(values) // 2],
+        'p90': values[int(len(values) * 0.9)],
+        'p99': values[min(int(len(values) * 0.99), len(values) - 1)],
+        'max': values[-1],
+    }
+
+
+def HistogramPercentiles(histogram):
+    return {
+        'n': histogram.count,
+        'p50': round(histogram.Percentile(50) / 1e6, 3),
+        'p99': round(histogram.Percentile(99) / 1e6, 3),
+        'max': round((histogram.max or 0) / 1e6, 3),
+    }
+
+
+def Throughput(runtime, seconds):
+    bus, channel, supply, station = NewStation()
+    max_rate = bus.MaxFrameRate(8)
+    can_id, voltages, requests = Requests(4000)
+
+    def Scenario():
+        time.sleep(kSettle)
+        windows = []
+        for rate in kRates:
+            rate = max_rate if rate == 'bus' else rate
+            read = station.msg_count
+            dropped = channel.dropped
+            source = bus.Traffic(can_id, rate,
+                                 lambda index: requests[index % len(requests)])
+            time.sleep(seconds)
+            backlog = len(channel.queue)
+            source.Stop()
+            sent = source.sent
+            read_in_window = station.msg_count - read
+            time.sleep(kDrain)
+            windows.append({
+                'rate': round(rate),
+                'sent': sent,
+                'read': station.msg_count - read,
+                'dropped': channel.dropped - dropped,
+                'backlog': backlog,
+                'sustained': (channel.dropped == dropped and
+                              read_in_window >= sent * kMaxBacklog),
+            })
+        return windows
+
+    windows = Serve(runtime, station, Scenario)
+    sustained = [window['rate'] for window in windows if window['sustained']]
+    return {
+        'max_sustained_frames_per_s': max(sustained) if sustained else 0,
+        'windows': windows,
+    }
+
+
+def Latency(runtime, seconds):
+    bus, channel, supply, station = NewStation()
+    count = int(seconds / kRequestPeriod) + 1
+    can_id, voltages, requests = Requests(count, first_voltage=100.0)
+    voltage_of = dict(zip(requests, voltages))
+    sent_ns = {}
+
+    def OnFrame(frame):
+        if frame.can_id == can_id and frame.data in voltage_of:
+            sent_ns.setdefault(voltage_of[frame.data], frame.timestamp_ns)
+
+    def Scenario():
+        time.sleep(kSettle)
+        bus.listeners.append(OnFrame)
+        start_ns = time.perf_counter_ns()
+        cpu = ThreadCPU()
+        wall = time.perf_counter()
+        source = bus.Traffic(can_id, 1.0 / kRequestPeriod,
+                             lambda index: requests[min(index, count - 1)],
+                             count=count)
+        source.Wait(seconds + 1.0)
+        time.sleep(kDrain)
+        wall = time.perf_counter() - wall
+        cpu_end = ThreadCPU()
+        return start_ns, {name: (cpu_end[name] - cpu[name]) / wall * 100.0
+                          for name in cpu_end if name in cpu}
+
+    start_ns, cpu = Serve(runtime, station, Scenario)
+
+    # The bus stamps frames with perf_counter_ns() and the station uses
+    # monotonic_ns(), the same clock on Linux and Windows
+    receive_errors = [trace.received_ns - sent_ns[trace.voltage]
+                      for trace in station.latency_traces
+                      if trace.voltage in sent_ns]
+
+    latencies = []
+    for applied_ns, command in supply.commands:
+        if command.startswith(':SOUR:VOLT '):
+            voltage = round(float(command.split(' ')[1]), 1)
+            if voltage in sent_ns:
+                latencies.append(applied_ns - sent_ns.pop(voltage))
+
+    reports = [frame.timestamp_ns for frame in channel.transmitted
+               if frame.can_id == station.output_codec.can_id and
+               frame.timestamp_ns >= start_ns]
+    return {
+        'requests': count,
+        'setpoints_applied': len(latencies),
+        'setpoint_latency_ms': Percentiles(latencies),
+        'response_latency_ms': HistogramPercentiles(station.response_latency),
+        'receive_time_error_ms': Percentiles(receive_errors),
+        'report_period_ms': Percentiles(
+            [b - a for a, b in zip(reports, reports[1:])]),
+        'report_jitter_p99_ms': {
+            task.name: round(task.jitter.P99() / 1e6, 3)
+            for task in station.tx_scheduler.tasks},
+        'measurement_age_ms': HistogramPercentiles(station.report_age),
+        'cpu_percent': {name: round(percent, 3)
+                        for name, percent in sorted(cpu.items())},
+    }
+
+
+def Version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="End-to-end benchmark of the translation loop")
+    parser.add_argument('--seconds', type=float, default=5.0,
+                        help="length of each measurement window")
+    parser.add_argument('--runtime', choices=('threads', 'asyncio'),
+                        action='append',
+                        help="runtime to measure (default: both)")
+    parser.add_argument('--output', help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        'version': Version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seconds': args.seconds,
+        'runtimes': {},
+    }
+    # The stations' console output goes to stderr, keeping stdout JSON only
+    with contextlib.redirect_stdout(sys.stderr):
+        for runtime in args.runtime or ['threads', 'asyncio']:
+            results['runtimes'][runtime] = {
+                'throughput': Throughput(runtime, args.seconds),
+                **Latency(runtime, args.seconds),
+            }
+
+    text = json.dumps(results, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + '\n')
+    else:
+        print(text)
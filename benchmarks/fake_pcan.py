@@ -0,0 +1,86 @@
+import collections
+import os
+import threading
+import time
+
+import PCANBasic as pb
+
+
+class FakeChannel:
+    def __init__(self):
+        self.queue = collections.deque()
+        self.event_r, self.event_w = os.pipe()
+        self.written = 0
+
+
+class FakePCANBasicLibrary:
+    # Minimal libpcanbasic stand-in. Every channel has its own receive queue
+    # and receive event, a pipe that is readable while the queue holds frames
+    # (Linux driver semantics). Each queued frame carries its enqueue time
+    # (perf_counter_ns) in the millis/millis_overflow timestamp fields.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def Channel(self, Channel=pb.PCAN_USBBUS1):
+        key = getattr(Channel, 'value', Channel)
+        channel = self.channels.get(key)
+        if channel is None:
+            with self.lock:
+                channel = self.channels.setdefault(key, FakeChannel())
+        return channel
+
+    @property
+    def written(self):
+        return sum(channel.written for channel in self.channels.values())
+
+    def Inject(self, can_id, data=bytes(8), Channel=pb.PCAN_USBBUS1):
+        channel = self.Channel(Channel)
+        with self.lock:
+            channel.queue.append((can_id, data, time.perf_counter_ns()))
+            if len(channel.queue) == 1:
+                os.write(channel.event_w, b'\x01')
+
+    def CAN_Initialize(self, Channel, Btr0Btr1, HwType, IOPort, Interrupt):
+        self.Channel(Channel)
+        return pb.PCAN_ERROR_OK
+
+    def CAN_GetValue(self, Channel, Parameter, Buffer, Length):
+        if Parameter.value == pb.PCAN_RECEIVE_EVENT.value:
+            Buffer._obj.value = self.Channel(Channel).event_r
+            return pb.PCAN_ERROR_OK
+        return pb.PCAN_ERROR_ILLPARAMTYPE
+
+    def CAN_SetValue(self, Channel, Parameter, Buffer, Length):
+        return pb.PCAN_ERROR_OK
+
+    def CAN_FilterMessages(self, Channel, FromID, ToID, Mode):
+        return pb.PCAN_ERROR_OK
+
+    def CAN_GetStatus(self, Channel):
+        return pb.PCAN_ERROR_OK
+
+    def CAN_Write(self, Channel, MessageBuffer):
+        self.Channel(Channel).written += 1
+        return pb.PCAN_ERROR_OK
+
+    def CAN_Read(self, Channel, Message, Timestamp):
+        channel = self.Channel(Channel)
+        with self.lock:
+            if len(channel.queue) == 0:
+                return pb.PCAN_ERROR_QRCVEMPTY
+            can_id, data, enqueued = channel.queue.popleft()
+            if len(channel.queue) == 0:
+                os.read(channel.event_r, 1)
+        msg = Message._obj
+        msg.ID = can_id
+        msg.LEN = len(data)
+        msg.DATA[:len(data)] = data
+        Timestamp._obj.millis = enqueued & 0xFFFFFFFF
+        Timestamp._obj.millis_overflow = (enqueued >> 32) & 0xFFFF
+        return pb.PCAN_ERROR_OK
+
+
+def Enqueued(ts):
+    return ts.millis | (ts.millis_overflow << 32)
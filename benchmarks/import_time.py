@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+# Import time of the modules tools and benchmarks build on, each in a fresh
+# interpreter, from python -X importtime (best of kRuns, cumulative, in ms).
+#   python benchmarks/import_time.py [source directory]
+
+import os
+import subprocess
+import sys
+
+kRuns = 5
+kModules = ('PCANBasic', 'CANCodec', 'ShoreChargerProtocol', 'SharedState',
+            'Chroma62000H', 'ChargerStation', 'ShoreChargerInterpreter')
+
+
+def ImportTime(module, directory):
+    # Cumulative microseconds of module, or None if it does not import
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=directory, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    return None
+
+
+if __name__ == '__main__':
+    directory = (sys.argv[1] if len(sys.argv) > 1
+                 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    for module in kModules:
+        ImportTime(module, directory)  # compiles the .pyc files
+        times = [ImportTime(module, directory) for _ in range(kRuns)]
+        if None in times:
+            print(f"{module:26s} does not import")
+        else:
+            print(f"{module:26s} {min(times) / 1000:7.1f} ms")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# Telemetry rate achievable with four separate queries per poll versus the
+# single compound query of CHROMA_62000H.MeasureAll, against an in-process
+# instrument that adds a fixed latency to every USB transaction.
+#   python benchmarks/measure_all.py [latency_ms]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import Chroma62000H as ch
+
+kPolls = 50
+
+responses = {
+    ':MEAS:VOLT?': '400.0',
+    ':MEAS:CURR?': '10.0',
+    ':CONF:OUTP?': 'ON',
+    ':FETC:STAT?': '\x00\x00',
+}
+
+
+class LatencyInstrument:
+    def __init__(self, latency):
+        self.latency = latency
+        self.transactions = 0
+
+    def write(self, command):
+        time.sleep(self.latency)
+        self.transactions += 1
+
+    def query(self, query):
+        time.sleep(self.latency)
+        self.transactions += 1
+        return ';'.join(responses[part] for part in query.split(';')) + '\n'
+
+
+def SeparateQueries(chroma):
+    return (chroma.MeasureVoltage(), chroma.MeasureCurrent(),
+            chroma.GetOutputState(), chroma.FetchStatus())
+
+
+def Run(name, poll, latency):
+    chroma = ch.CHROMA_62000H(device=LatencyInstrument(latency),
+                              command_gap=0.0)
+    start = time.perf_counter()
+    for _ in range(kPolls):
+        poll(chroma)
+    per_poll = (time.perf_counter() - start) / kPolls
+    print(f"{name:18s} {per_poll * 1000.0:6.2f} ms/poll   "
+          f"max rate {1.0 / per_poll:6.1f} Hz   "
+          f"{chroma.device.transactions // kPolls} transactions/poll")
+
+
+if __name__ == '__main__':
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 2.0) / 1000.0
+    print(f"{latency * 1000.0:.1f} ms per transaction")
+    Run('separate queries', SeparateQueries, latency)
+    Run('MeasureAll', lambda chroma: chroma.MeasureAll(), latency)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# Cost of the metrics recorded on the hot paths: a counter increment, a
+# histogram record, the timing of one SCPI transaction (against an instrument
+# that answers at once), the timing of one empty receive drain, and one
+# scrape of a station's registry.
+#   python benchmarks/metrics.py
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import Chroma62000H as ch
+import ChargerStation as cs
+import Metrics as mt
+import ShoreChargerProtocol as sp
+from fake_pcan import FakePCANBasicLibrary
+from measure_all import LatencyInstrument
+
+kIterations = 200000
+kSlowIterations = 20000
+
+
+def PerCall(statement, number=kIterations):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    registry = mt.Registry()
+    counter = registry.Counter('counter_total', "Counter")
+    histogram = registry.Histogram('histogram_seconds', "Histogram")
+
+    plain = ch.CHROMA_62000H(device=LatencyInstrument(0.0), command_gap=0.0)
+    instrumented = ch.CHROMA_62000H(device=LatencyInstrument(0.0),
+                                    command_gap=0.0)
+    instrumented.Instrument(registry, {'station': 'Station'})
+
+    station = cs.ChargerStation(
+        pb.PCANBasic(Library=FakePCANBasicLibrary()), pb.PCAN_USBBUS1,
+        ch.CHROMA_62000H(device=LatencyInstrument(0.0), command_gap=0.0),
+        sp.LoadCodecs(None))
+    station.RegisterMetrics(registry)
+    station.rx_drain.Record(1000)
+
+    results = [
+        ('Counter.Inc', PerCall(counter.Inc)),
+        ('LatencyHistogram.Record', PerCall(lambda: histogram.Record(123456))),
+        ('perf_counter_ns pair', PerCall(
+            lambda: time.perf_counter_ns() - time.perf_counter_ns())),
+        ('SCPI write, plain', PerCall(lambda: plain.SetVoltage(400.0), kSlowIterations)),
+        ('SCPI write, instrumented',
+         PerCall(lambda: instrumented.SetVoltage(400.0), kSlowIterations)),
+        ('SCPI compound query, plain', PerCall(plain.MeasureAll, kSlowIterations)),
+        ('SCPI compound query, instrumented',
+         PerCall(instrumented.MeasureAll, kSlowIterations)),
+        ('DrainReceive, empty queue', PerCall(station.DrainReceive, kSlowIterations)),
+        ('Registry.Expose', PerCall(registry.Expose, number=200)),
+    ]
+
+    for name, microseconds in results:
+        print(f"{name:40s} {microseconds:8.3f} us")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Per-call overhead of the PCAN-Basic functions called for every frame,
+# through the PCANBasic methods and through the PCANBasic.FastPath entry
+# points, with the library's prototypes
+#  - undeclared (as PCANBasic used to load it)
+#  - result types declared (what LoadLibrary does)
+#  - argument types declared too (DeclarePrototypes(CheckArguments=True))
+# The library is a stub libpcanbasic compiled here with the system C
+# compiler. Its functions return at once, so the Python and ctypes side is
+# what is measured.
+#   python benchmarks/pcan_calls.py [--cc CC]
+
+import argparse
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+
+kCalls = 200000
+kBatch = 256
+
+kStubSource = r'''
+typedef struct { unsigned int ID; unsigned char MSGTYPE; unsigned char LEN;
+                 unsigned char DATA[8]; } TPCANMsg;
+typedef struct { unsigned int millis; unsigned short millis_overflow;
+                 unsigned short micros; } TPCANTimestamp;
+
+unsigned int CAN_Read(unsigned short Channel, TPCANMsg *Message,
+                      TPCANTimestamp *Timestamp)
+{
+    Message->ID = 0x618;
+    Message->LEN = 8;
+    Timestamp->millis++;
+    return 0;
+}
+
+unsigned int CAN_Write(unsigned short Channel, TPCANMsg *Message)
+{
+    return 0;
+}
+
+unsigned int CAN_GetStatus(unsigned short Channel)
+{
+    return 0;
+}
+'''
+
+
+def BuildStub(directory, compiler):
+    source = os.path.join(directory, 'pcanstub.c')
+    library = os.path.join(directory, 'libpcanstub.so')
+    with open(source, 'w') as stub:
+        stub.write(kStubSource)
+    subprocess.run([compiler, '-O2', '-shared', '-fPIC', '-o', library, source],
+                   check=True)
+    return library
+
+
+def PerCall(function, calls=kCalls):
+    # ns per call of function(), best of 3
+    best = None
+    for _ in range(3):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            function()
+        elapsed = (time.perf_counter_ns() - start) / calls
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def Measure(pcan, channel):
+    msg = pb.TPCANMsg()
+    timestamp = pb.TPCANTimestamp()
+    msg_ref, timestamp_ref = ctypes.byref(msg), ctypes.byref(timestamp)
+    rx_buffer = pb.TPCANReadBuffer(kBatch)
+    fast = pcan.FastPath()
+    return {
+        'Read': PerCall(lambda: pcan.Read(channel)),
+        'ReadBatch (per frame)': PerCall(
+            lambda: pcan.ReadBatch(channel, rx_buffer), kCalls // kBatch) / kBatch,
+        'Write': PerCall(lambda: pcan.Write(channel, msg)),
+        'GetStatus': PerCall(lambda: pcan.GetStatus(channel)),
+        'FastPath.Read': PerCall(lambda: fast.Read(channel, msg_ref, timestamp_ref)),
+        'FastPath.Write': PerCall(lambda: fast.Write(channel, msg_ref)),
+        'FastPath.GetStatus': PerCall(lambda: fast.GetStatus(channel)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PCAN-Basic call overhead")
+    parser.add_argument('--cc', default=os.environ.get('CC', 'cc'))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = BuildStub(directory, args.cc)
+
+        # Each CDLL has its own function objects, so each keeps its prototypes
+        libraries = {
+            'undeclared': ctypes.CDLL(path),
+            'result types': ctypes.CDLL(path),
+            'checked arguments': ctypes.CDLL(path),
+        }
+        pb.DeclarePrototypes(libraries['result types'])
+        pb.DeclarePrototypes(libraries['checked arguments'], CheckArguments=True)
+
+        empty = PerCall(lambda: None)
+        results = {name: Measure(pb.PCANBasic(Library=library), pb.PCAN_USBBUS1)
+                   for name, library in libraries.items()}
+
+    print(f"ns per call, less {empty:.0f} ns of loop and lambda")
+    print(f"{'':22s}" + ''.join(f"{name:>18s}" for name in results))
+    for call in results['undeclared']:
+        print(f"{call:22s}" + ''.join(f"{result[call] - empty:18.0f}"
+                                      for result in results.values()))
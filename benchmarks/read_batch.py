@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+# Drain throughput of PCANBasic.Read (one allocation per frame) versus
+# PCANBasic.ReadBatch (preallocated TPCANReadBuffer) on a burst of queued
+# frames, using the fake libpcanbasic stand-in.
+#   python benchmarks/read_batch.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+from fake_pcan import FakePCANBasicLibrary
+
+kFrameCount = 100000
+
+
+def Fill(lib):
+    for i in range(kFrameCount):
+        lib.Inject(0x100 + (i & 0xFF))
+
+
+def DrainRead(pcan, channel):
+    count = 0
+    while True:
+        result, msg, ts = pcan.Read(channel)
+        if result != pb.PCAN_ERROR_OK:
+            return count
+        count += 1
+
+
+def DrainReadBatch(pcan, channel):
+    buffer = pb.TPCANReadBuffer(256)
+    count = 0
+    while True:
+        result, n = pcan.ReadBatch(channel, buffer)
+        count += n
+        if result != pb.PCAN_ERROR_OK:
+            return count
+
+
+if __name__ == '__main__':
+    for name, drain in (('Read', DrainRead), ('ReadBatch', DrainReadBatch)):
+        lib = FakePCANBasicLibrary()
+        pcan = pb.PCANBasic(Library=lib)
+        Fill(lib)
+        start = time.perf_counter()
+        frames = drain(pcan, pb.PCAN_USBBUS1)
+        elapsed = time.perf_counter() - start
+        print(f"{name:10s} {frames / elapsed:10.0f} frames/s "
+              f"({elapsed / frames * 1e6:.2f} us/frame)")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# Replays a CAN trace into one station (virtual bus, simulated supply,
+# asyncio runtime) at a speed-up, and reports the frames read per second,
+# the frames the driver queue dropped and the CPU used. Without a trace, a
+# session is synthesized: the vehicle's 0x618 every 100 ms, ramping, on a
+# bus carrying kBackgroundRate frames/s of other traffic.
+#   python benchmarks/replay.py [trace] [--speed S] [--no-filter]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import CANTrace as ct
+import PCANBasic as pb
+import ShoreChargerProtocol as sp
+from end_to_end import NewStation, Serve, kSettle, kDrain
+
+kSessionLength = 60.0   # in seconds
+kBackgroundRate = 2000  # frames/s
+kBackgroundIds = (0x100, 0x200, 0x300, 0x18FF50E5)
+
+
+def SynthesizeSession(path):
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    frames = []
+    for index in range(int(kSessionLength / 0.1)):
+        frames.append(ct.TraceFrame(
+            index * 0.1, codec.can_id, pb.PCAN_MESSAGE_STANDARD.value,
+            codec.Encode(EnableOutput=1, RequestedVoltage=index % 400,
+                         RequestedCurrent=10), 'Rx'))
+    for index in range(int(kSessionLength * kBackgroundRate)):
+        can_id = kBackgroundIds[index % len(kBackgroundIds)]
+        msgtype = (pb.PCAN_MESSAGE_EXTENDED.value if can_id > 0x7FF
+                   else pb.PCAN_MESSAGE_STANDARD.value)
+        frames.append(ct.TraceFrame(index / kBackgroundRate, can_id, msgtype,
+                                    index.to_bytes(8, 'little'), 'Rx'))
+    frames.sort(key=lambda frame: frame.time)
+    ct.WriteCandump(frames, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Trace replay benchmark")
+    parser.add_argument('trace', nargs='?', default=None)
+    parser.add_argument('--speed', type=float, default=10.0)
+    parser.add_argument('--no-filter', action='store_true',
+                        help="receive the whole bus instead of the station's IDs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace = args.trace
+        if trace is None:
+            trace = os.path.join(directory, 'session.log')
+            SynthesizeSession(trace)
+        frames = list(ct.ReadTrace(trace))
+
+        bus, channel, supply, station = NewStation(not args.no_filter)
+        result = {}
+
+        def Scenario():
+            time.sleep(kSettle)
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            result['delivered'] = ct.Replay(frames, bus, args.speed)
+            time.sleep(kDrain)
+            result['wall'] = time.perf_counter() - wall
+            result['cpu'] = (time.process_time() - cpu) / result['wall'] * 100.0
+
+        Serve('asyncio', station, Scenario)
+
+    print(f"\n{trace if args.trace else 'synthesized session'} at {args.speed:g}x: "
+          f"{result['delivered']} frames on the bus in {result['wall']:.2f} s "
+          f"({result['delivered'] / result['wall']:.0f} frames/s), "
+          f"{station.msg_count} read by the station, "
+          f"{channel.dropped} dropped, cpu {result['cpu']:.1f}%")
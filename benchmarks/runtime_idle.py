@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# CPU use of one charger station on the threaded and asyncio runtimes, with
+# the bus silent and with 0x618 requests arriving every 10 ms, plus the p99
+# period jitter of the 0x611 report. Runs against the fake libpcanbasic and
+# an in-process instrument that answers every query after a fixed latency.
+#   python benchmarks/runtime_idle.py [seconds]
+# asyncio does not use less CPU than the threads here, idle or loaded (e.g.
+# idle 0.37% against 0.29%): both block on the receive event, the setpoint
+# mailbox and the TX deadlines, so neither has polling left to remove.
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import Chroma62000H as ch
+import ChargerStation as cs
+import ShoreChargerProtocol as sp
+import ThreadedRuntime as tr
+import AsyncRuntime as ar
+from fake_pcan import FakePCANBasicLibrary
+from measure_all import LatencyInstrument, responses
+
+kRequestGap = 0.01  # in seconds
+kLatency = 0.002    # per USB transaction, in seconds
+kSettle = 1.0       # startup time excluded from the CPU figure, in seconds
+
+
+class OutputInstrument(LatencyInstrument):
+    # Reports the output state last written, so an idle station polls slowly
+    def __init__(self, latency):
+        super().__init__(latency)
+        self.output = 'OFF'
+
+    def write(self, command):
+        super().write(command)
+        for part in command.split(';'):
+            if part.startswith(':CONF:OUTP '):
+                self.output = part.split(' ')[1]
+
+    def query(self, query):
+        time.sleep(self.latency)
+        self.transactions += 1
+        return ';'.join(self.output if part == ':CONF:OUTP?'
+                        else responses[part] for part in query.split(';')) + '\n'
+
+
+def NewStation(lib, channel=pb.PCAN_USBBUS1, name='Station'):
+    chroma = ch.CHROMA_62000H(device=OutputInstrument(kLatency),
+                              command_gap=0.0)
+    station = cs.ChargerStation(pb.PCANBasic(Library=lib), channel,
+                                chroma, sp.LoadCodecs(None), name)
+    station.OpenReceive(use_hardware_filter=False)
+    return station
+
+
+def Traffic(lib, seconds, loaded, usage):
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    time.sleep(kSettle)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    end = time.monotonic() + seconds
+    voltage = 0.0
+    while time.monotonic() < end:
+        if loaded:
+            voltage = (voltage + 0.1) % 400.0
+            lib.Inject(codec.can_id, codec.Encode(
+                EnableOutput=1, RequestedVoltage=voltage, RequestedCurrent=10))
+            time.sleep(kRequestGap)
+        else:
+            time.sleep(seconds)
+    usage.append((time.process_time() - cpu) / (time.perf_counter() - wall))
+
+
+def Measure(start, seconds, loaded):
+    lib = FakePCANBasicLibrary()
+    station = NewStation(lib)
+    usage = []
+    start(station, lambda: Traffic(lib, seconds, loaded, usage))
+    p99 = station.tx_scheduler.tasks[0].jitter.P99()
+    return usage[0] * 100.0, p99 / 1e6, station.msg_count
+
+
+def Threads(station, traffic):
+    runtime = tr.ThreadedRuntime([station], info_rate=1e9)
+    runtime.Start()
+    traffic()
+    runtime.Stop()
+
+
+def Asyncio(station, traffic):
+    async def Main():
+        serve = asyncio.create_task(ar.AsyncRuntime([station], 1e9).Serve())
+        await asyncio.get_running_loop().run_in_executor(None, traffic)
+        serve.cancel()
+        await asyncio.gather(serve, return_exceptions=True)
+    asyncio.run(Main())
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    results = []
+    for name, start in (('threads', Threads), ('asyncio', Asyncio)):
+        for loaded in (False, True):
+            results.append((name, loaded, Measure(start, seconds, loaded)))
+
+    print('')
+    for name, loaded, (cpu, p99, frames) in results:
+        print(f"{name:8s} {'100 Hz requests' if loaded else 'idle bus':16s} "
+              f"cpu {cpu:6.2f}%   0x611 jitter p99 {p99:6.3f} ms   "
+              f"frames {frames}")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Compares the original 100 us sleep-polling receive loop with the
+# event-driven loop used by CANThread.
+#  - Idle CPU: CPU time consumed by the receive thread while the bus is silent
+#  - Latency: time from a frame entering the driver queue to it being read
+#
+# Runs against a fake libpcanbasic stand-in, so no PEAK hardware is needed.
+#   python benchmarks/rx_wakeup.py
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import CANReceiver as cr
+from fake_pcan import FakePCANBasicLibrary, Enqueued
+
+kIdleSeconds = 2.0
+kFrameCount = 200
+kFrameGap = 0.005  # in seconds
+
+
+def PollingLoop(pcan, channel, stop, latencies):
+    while not stop.is_set():
+        result, msg, ts = pcan.Read(channel)
+        if result == pb.PCAN_ERROR_OK:
+            latencies.append(time.perf_counter_ns() - Enqueued(ts))
+        time.sleep(0.0001)
+
+
+def EventLoop(pcan, channel, stop, latencies):
+    receive_event = cr.CANReceiveEvent(pcan, channel)
+    while not stop.is_set():
+        receive_event.Wait(0.1)
+        while True:
+            result, msg, ts = pcan.Read(channel)
+            if result != pb.PCAN_ERROR_OK:
+                break
+            latencies.append(time.perf_counter_ns() - Enqueued(ts))
+
+
+def Run(loop, frame_count):
+    lib = FakePCANBasicLibrary()
+    pcan = pb.PCANBasic(Library=lib)
+    channel = pb.PCAN_USBBUS1
+    stop = threading.Event()
+    latencies = []
+    cpu = {}
+
+    def Worker():
+        start = time.thread_time()
+        loop(pcan, channel, stop, latencies)
+        cpu['total'] = time.thread_time() - start
+
+    worker = threading.Thread(target=Worker)
+    start = time.perf_counter()
+    worker.start()
+
+    if frame_count == 0:
+        time.sleep(kIdleSeconds)
+    for _ in range(frame_count):
+        lib.Inject(0x618)
+        time.sleep(kFrameGap)
+    time.sleep(0.05)
+
+    stop.set()
+    worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return cpu['total'] / elapsed * 100.0, latencies
+
+
+if __name__ == '__main__':
+    for name, loop in (('polling', PollingLoop), ('event', EventLoop)):
+        idle_cpu, _ = Run(loop, 0)
+        _, latencies = Run(loop, kFrameCount)
+        print(f"{name:8s} idle cpu {idle_cpu:6.2f}%   "
+              f"latency p50 {latencies[len(latencies) // 2] / 1000.0:8.1f} us   "
+              f"max {latencies[-1] / 1000.0:8.1f} us   "
+              f"frames {len(latencies)}")
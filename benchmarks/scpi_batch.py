@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+# Time spent configuring the Chroma and applying a setpoint, one SCPI write
+# per command with a blind 10 ms sleep (the previous WriteCommand) versus
+# ';'-joined batches with a minimum inter-command gap or *OPC? completion.
+# Uses an in-process instrument that records every transaction.
+#   python benchmarks/scpi_batch.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import Chroma62000H as ch
+
+kTransactionLatency = 0.001  # USB round trip of the fake instrument, in seconds
+
+
+class RecordingInstrument:
+    def __init__(self):
+        self.log = []
+
+    def write(self, command):
+        time.sleep(kTransactionLatency)
+        self.log.append((time.perf_counter(), command))
+
+    def query(self, query):
+        time.sleep(kTransactionLatency)
+        self.log.append((time.perf_counter(), query))
+        return '1\n'
+
+
+class UnbatchedChroma(ch.CHROMA_62000H):
+    # The previous behaviour: every command is its own write + 10 ms sleep
+    def WriteCommand(self, command):
+        self.device.write(command)
+        time.sleep(ch._delay)
+
+
+def Setpoint(chroma):
+    with chroma.Batch():
+        chroma.SetVoltage(400.0)
+        chroma.SetCurrent(10.0)
+        chroma.EnableOutput()
+
+
+def Run(name, chroma):
+    start = time.perf_counter()
+    chroma.ConfigureDefaultProtections()
+    configure_ms = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    Setpoint(chroma)
+    setpoint_ms = (time.perf_counter() - start) * 1000.0
+
+    print(f"{name:22s} configure {configure_ms:6.1f} ms   "
+          f"setpoint {setpoint_ms:6.1f} ms   "
+          f"transactions {len(chroma.device.log)}")
+
+
+if __name__ == '__main__':
+    Run('unbatched + sleep', UnbatchedChroma(device=RecordingInstrument()))
+    Run('batched, 10 ms gap', ch.CHROMA_62000H(device=RecordingInstrument()))
+    Run('batched, *OPC?', ch.CHROMA_62000H(device=RecordingInstrument(),
+                                           command_gap=0.0,
+                                           wait_for_completion=True))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# CPU use of 1 to 8 charger stations in one process on the threaded and
+# asyncio runtimes. Every station receives a changing 0x618 request every
+# 100 ms (the vehicle's rate) on its own channel of one fake libpcanbasic,
+# and drives its own in-process instrument.
+#   python benchmarks/stations.py [seconds]
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import ShoreChargerProtocol as sp
+import ThreadedRuntime as tr
+import AsyncRuntime as ar
+from fake_pcan import FakePCANBasicLibrary
+from runtime_idle import NewStation, kSettle
+
+kRequestGap = 0.1  # per station, in seconds
+kStationCounts = (1, 2, 4, 8)
+kChannels = [pb.PCAN_USBBUS1, pb.PCAN_USBBUS2, pb.PCAN_USBBUS3,
+             pb.PCAN_USBBUS4, pb.PCAN_USBBUS5, pb.PCAN_USBBUS6,
+             pb.PCAN_USBBUS7, pb.PCAN_USBBUS8]
+
+
+def Traffic(lib, channels, seconds, usage):
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    time.sleep(kSettle)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    end = time.monotonic() + seconds
+    voltage = 0.0
+    while time.monotonic() < end:
+        voltage = (voltage + 0.1) % 400.0
+        data = codec.Encode(EnableOutput=1, RequestedVoltage=voltage,
+                            RequestedCurrent=10)
+        for channel in channels:
+            lib.Inject(codec.can_id, data, channel)
+        time.sleep(kRequestGap)
+    usage.append((time.process_time() - cpu) / (time.perf_counter() - wall))
+
+
+def Threads(stations, traffic):
+    runtime = tr.ThreadedRuntime(stations, info_rate=1e9)
+    runtime.Start()
+    traffic()
+    runtime.Stop()
+
+
+def Asyncio(stations, traffic):
+    async def Main():
+        serve = asyncio.create_task(ar.AsyncRuntime(stations, 1e9).Serve())
+        await asyncio.get_running_loop().run_in_executor(None, traffic)
+        serve.cancel()
+        await asyncio.gather(serve, return_exceptions=True)
+    asyncio.run(Main())
+
+
+def Measure(start, count, seconds):
+    lib = FakePCANBasicLibrary()
+    channels = kChannels[:count]
+    stations = [NewStation(lib, channel, f'Station {i + 1}')
+                for i, channel in enumerate(channels)]
+    usage = []
+    start(stations, lambda: Traffic(lib, channels, seconds, usage))
+    p99 = max(station.tx_scheduler.tasks[0].jitter.P99()
+              for station in stations)
+    latency = max(station.setpoint_latency.Percentile(99)
+                  for station in stations)
+    return usage[0] * 100.0, p99 / 1e6, latency / 1e6
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    results = []
+    for name, start in (('threads', Threads), ('asyncio', Asyncio)):
+        for count in kStationCounts:
+            results.append((name, count, Measure(start, count, seconds)))
+
+    print('')
+    for name, count, (cpu, p99, latency) in results:
+        print(f"{name:8s} {count} stations   cpu {cpu:6.2f}% "
+              f"({cpu / count:5.2f}% per station)   "
+              f"0x611 jitter p99 {p99:6.3f} ms   "
+              f"setpoint latency p99 {latency:6.2f} ms")
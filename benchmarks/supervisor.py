@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Station isolation: 0x611 period jitter of healthy stations next to a
+# station whose PSU driver burns CPU while holding the GIL, with all
+# stations on one asyncio loop versus one worker process per station.
+# The process run adds a station whose PSU fails every few seconds, to
+# show the supervisor restarting it. Fake CAN and VISA backends are built
+# inside each worker by OpenFakeStation.
+#   python benchmarks/supervisor.py [seconds]
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ShoreChargerProtocol as sp
+import StationConfig as cfg
+import AsyncRuntime as ar
+import Supervisor as sv
+from fake_pcan import FakePCANBasicLibrary
+from runtime_idle import NewStation
+
+kRequestGap = 0.1   # in seconds
+kBusyQuery = 0.02   # CPU time burnt per query by the busy driver, in seconds
+kFailAfter = 3.0    # run time of the failing PSU, in seconds
+
+# Station behaviour, looked up by name inside the worker
+kHealthy = ('Station 1', 'Station 2', 'Station 3')
+kBusy = 'Busy PSU'
+kFailing = 'Failing PSU'
+
+
+def Requests(lib, channel):
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    voltage = 0.0
+    while True:
+        voltage = (voltage + 0.1) % 400.0
+        lib.Inject(codec.can_id, codec.Encode(
+            EnableOutput=1, RequestedVoltage=voltage, RequestedCurrent=10),
+            channel)
+        time.sleep(kRequestGap)
+
+
+def OpenFakeStation(station_config, dbc_path):
+    lib = FakePCANBasicLibrary()
+    channel = station_config.Channel()
+    station = NewStation(lib, channel, station_config.name)
+    device = station.chroma.device
+
+    if station_config.name == kBusy:
+        query = device.query
+
+        def BusyQuery(command):
+            end = time.thread_time() + kBusyQuery
+            while time.thread_time() < end:
+                pass
+            return query(command)
+        device.query = BusyQuery
+
+    if station_config.name == kFailing:
+        query = device.query
+        fail_at = time.monotonic() + kFailAfter
+
+        def FailingQuery(command):
+            if time.monotonic() > fail_at:
+                raise IOError("USB device disconnected")
+            return query(command)
+        device.query = FailingQuery
+
+    threading.Thread(target=Requests, args=(lib, channel), daemon=True).start()
+    return station
+
+
+def Configs(names):
+    return [cfg.StationConfig(name, f'PCAN_USBBUS{i + 1}', f'USB{i}')
+            for i, name in enumerate(names)]
+
+
+def InProcess(seconds):
+    stations = [OpenFakeStation(config, None)
+                for config in Configs(kHealthy + (kBusy,))]
+
+    async def Main():
+        serve = asyncio.create_task(ar.AsyncRuntime(stations, None).Serve())
+        await asyncio.sleep(seconds)
+        serve.cancel()
+        await asyncio.gather(serve, return_exceptions=True)
+    asyncio.run(Main())
+
+    return {station.name: (station.tx_scheduler.tasks[0].jitter.P99(), 0)
+            for station in stations}
+
+
+def Processes(seconds):
+    supervisor = sv.Supervisor(Configs(kHealthy + (kBusy, kFailing)),
+                               open_station=OpenFakeStation)
+    supervisor.Start()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        supervisor.Poll(0.25)
+    supervisor.Stop()
+
+    return {worker.name: (worker.telemetry['tx_jitter_p99'][sp.kChargerOutput]
+                          if worker.telemetry is not None else 0,
+                          worker.restarts)
+            for worker in supervisor.workers}
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    results = [('one loop', InProcess(seconds)),
+               ('processes', Processes(seconds))]
+
+    print('')
+    for mode, stations in results:
+        for name, (p99, restarts) in stations.items():
+            print(f"{mode:10s} {name:12s} 0x611 jitter p99 {p99 / 1e6:7.3f} ms"
+                  f"   restarts {restarts}")
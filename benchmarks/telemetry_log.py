@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# TelemetryLog costs:
+#  - per received frame logged from a full 256-frame read batch
+#  - the slowest LogReceived call while the writer is stuck on a disk that
+#    takes 0.5 s per write, and what is dropped meanwhile
+#  - reading the log back through the memory map, with rotation at 4 MiB
+#   python benchmarks/telemetry_log.py
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import TelemetryLog as tl
+
+kBatch = 256
+kBatches = 4000
+kSlowWrite = 0.5  # in seconds
+
+
+class SlowDiskLog(tl.TelemetryLog):
+    def _WritePending(self):
+        time.sleep(kSlowWrite)
+        super()._WritePending()
+
+
+def FullBuffer():
+    rx_buffer = pb.TPCANReadBuffer(kBatch)
+    for i, msg in enumerate(rx_buffer.Messages):
+        msg.ID = 0x618
+        msg.LEN = 8
+        msg.DATA[:] = bytes([i & 0xFF] * 8)
+        rx_buffer.Timestamps[i].millis = i
+    return rx_buffer
+
+
+def LogBatches(log, rx_buffer, batches):
+    # Returns the mean and the slowest LogReceived call, per batch, in us
+    slowest = 0
+    start = time.perf_counter_ns()
+    for _ in range(batches):
+        call = time.perf_counter_ns()
+        log.LogReceived(rx_buffer, kBatch, call)
+        slowest = max(slowest, time.perf_counter_ns() - call)
+    return (time.perf_counter_ns() - start) / batches / 1e3, slowest / 1e3
+
+
+if __name__ == '__main__':
+    rx_buffer = FullBuffer()
+    with tempfile.TemporaryDirectory() as directory:
+        log = tl.TelemetryLog(directory, 'fast', max_file_size=4 * 1024 * 1024)
+        mean, slowest = LogBatches(log, rx_buffer, kBatches)
+        log.Close()
+        print(f"logging: {mean / kBatch:.3f} us per frame, "
+              f"slowest batch {slowest:.0f} us, {log.records} records in "
+              f"{len(log.files)} files, {log.dropped} dropped")
+
+        slow = SlowDiskLog(directory, 'slow',
+                           max_pending_bytes=kBatch * 100 * tl.kRecordSize)
+        mean, slowest = LogBatches(slow, rx_buffer, kBatches)
+        slow.Close()
+        print(f"slow disk: {mean / kBatch:.3f} us per frame, "
+              f"slowest batch {slowest:.0f} us, {slow.records} written, "
+              f"{slow.dropped} dropped")
+
+        start = time.perf_counter()
+        frames = 0
+        for path in tl.LogFiles(directory, 'fast'):
+            with tl.TelemetryReader(path) as reader:
+                for frame in reader.Frames(can_id=0x618):
+                    frames += 1
+        elapsed = time.perf_counter() - start
+        print(f"reading: {frames} frames in {elapsed:.2f} s, "
+              f"{frames / elapsed / 1e6:.2f} M frames/s")
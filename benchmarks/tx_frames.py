@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Cost of one report cycle (0x611 output and 0x615 fault frames) built and
+# sent three ways:
+#  - new frame: a TPCANMsg built per cycle, DATA set one byte at a time and
+#    each frame written on its own (the original CAN loop)
+#  - re-encoded template: frames built once, all their data re-encoded each
+#    cycle, each frame written on its own
+#  - patched template: frames built once, only their signals patched in
+#    place, both written with PCANBasic.WriteMany (ChargerStation)
+# against the stub libpcanbasic of pcan_calls.py.
+#   python benchmarks/tx_frames.py [--cc CC]
+
+import argparse
+import ctypes
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import CANCodec as cc
+import ChargerStation as cs
+import PCANBasic as pb
+import ShoreChargerProtocol as sp
+from pcan_calls import BuildStub
+
+kCycles = 100000
+kVoltage = 401.7
+kCurrent = 12.3
+kAcFault, kOpp, kOvp = False, True, False
+
+
+def NewFrame(pcan, channel):
+    tx_msg = pb.TPCANMsg()
+    tx_msg.ID = 0x611
+    tx_msg.MSGTYPE = pb.PCAN_MESSAGE_STANDARD
+    tx_msg.LEN = 8
+    tx_msg.DATA[7] = (int(kCurrent * 10.0) & 0x00FF)
+    tx_msg.DATA[6] = ((int(kCurrent * 10.0) >> 8) & 0x00FF)
+    tx_msg.DATA[5] = (int(kVoltage * 10.0) & 0x00FF)
+    tx_msg.DATA[4] = ((int(kVoltage * 10.0) >> 8) & 0x00FF)
+    tx_msg.DATA[3] = 0xFF
+    tx_msg.DATA[2] = 0xFF
+    tx_msg.DATA[1] = 0xFF
+    tx_msg.DATA[0] = 0xFF
+    pcan.Write(channel, tx_msg)
+    output = bytes(tx_msg.DATA)
+
+    tx_msg.ID = 0x615
+    tx_msg.DATA[7] = 0xFF
+    tx_msg.DATA[6] = 0xFF
+    tx_msg.DATA[5] = 0xFF
+    tx_msg.DATA[4] = (1 << 7) | (1 << 5) | (1 << 3)
+    tx_msg.DATA[3] = 0xFF
+    tx_msg.DATA[2] = 0xFF
+    tx_msg.DATA[1] = 0xFF
+    tx_msg.DATA[0] = ((kAcFault & 0b1) << 7) | (1 << 6) | \
+        ((kOpp & 0b1) << 5) | ((kOvp & 0b1) << 4)
+    pcan.Write(channel, tx_msg)
+    return output, bytes(tx_msg.DATA)
+
+
+class Templates:
+    def __init__(self, pcan, channel, codecs):
+        self.pcan = pcan
+        self.channel = channel
+        self.output_codec = codecs.ByName(sp.kChargerOutput)
+        self.faults_codec = codecs.ByName(sp.kChargerFaults)
+        self.output_frame = cs.NewTxFrame(self.output_codec)
+        self.faults_frame = cs.NewTxFrame(self.faults_codec)
+        self.output_data = cc.DataView(self.output_frame.DATA)
+        self.faults_data = cc.DataView(self.faults_frame.DATA)
+        self.patch_output = self.output_codec.Patcher(
+            'MeasuredVoltage', 'MeasuredCurrent')
+        self.patch_faults = self.faults_codec.Patcher('ACFault', 'OPP', 'OVP')
+        self.frames = [self.output_frame, self.faults_frame]
+
+    def Reencoded(self):
+        self.output_data[:self.output_codec.length] = self.output_codec.Encode(
+            MeasuredVoltage=kVoltage, MeasuredCurrent=kCurrent)
+        self.pcan.Write(self.channel, self.output_frame)
+        self.faults_data[:self.faults_codec.length] = self.faults_codec.Encode(
+            ACFault=kAcFault, OPP=kOpp, OVP=kOvp)
+        self.pcan.Write(self.channel, self.faults_frame)
+        return bytes(self.output_frame.DATA), bytes(self.faults_frame.DATA)
+
+    def Patched(self):
+        self.patch_output(self.output_data, kVoltage, kCurrent)
+        self.patch_faults(self.faults_data, kAcFault, kOpp, kOvp)
+        self.pcan.WriteMany(self.channel, self.frames)
+        return bytes(self.output_frame.DATA), bytes(self.faults_frame.DATA)
+
+
+def PerCycle(cycle):
+    # us per report cycle, best of 3
+    best = None
+    for _ in range(3):
+        start = time.perf_counter_ns()
+        for _ in range(kCycles):
+            cycle()
+        elapsed = (time.perf_counter_ns() - start) / kCycles / 1e3
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CAN report cycle cost")
+    parser.add_argument('--cc', default=os.environ.get('CC', 'cc'))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        library = ctypes.CDLL(BuildStub(directory, args.cc))
+        pb.DeclarePrototypes(library)
+        pcan = pb.PCANBasic(Library=library)
+        channel = pb.PCAN_USBBUS1
+
+        # The built-in layouts are the ones the original loop hard-coded
+        templates = Templates(pcan, channel, sp.LoadCodecs(None))
+        cycles = (
+            ('new frame', lambda: NewFrame(pcan, channel)),
+            ('re-encoded template', templates.Reencoded),
+            ('patched template', templates.Patched),
+        )
+        expected = cycles[0][1]()
+        for name, cycle in cycles:
+            assert cycle() == expected, name
+
+        for name, cycle in cycles:
+            print(f"{name:20s} {PerCycle(cycle):6.2f} us per report cycle")
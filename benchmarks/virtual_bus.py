@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+# One charger station on the asyncio runtime, attached to a virtual CAN bus:
+#  - full load: 0x618 requests back to back at the 1 Mbit/s frame rate,
+#    with unrelated 0x100 traffic the acceptance filter must drop
+#  - overrun: the same load into a 64-frame driver queue, plus a backlog
+#    of 4 queues' worth of requests delivered at once every 0.5 s (e.g. a
+#    gateway flushing its buffer), which overruns the queue every time
+#  - error frames: bursts of error frames on a quiet bus
+#  - bus-off: the controller goes bus-off half way through a quiet run and
+#    the driver recovers (PCAN_BUSOFF_AUTORESET)
+#  - bus-off, reset: the same on a channel that refuses autoreset; the
+#    station reinitializes the channel
+# For each, the frames put on the bus, read by the station and dropped by
+# the driver queue, the station's bus health (state, bus-off count, resets,
+# overruns and error frames), CPU use, and the 0x611 period taken from the
+# transmit record of the station's channel.
+#   python benchmarks/virtual_bus.py [seconds]
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PCANBasic as pb
+import Chroma62000H as ch
+import ChargerStation as cs
+import ShoreChargerProtocol as sp
+import AsyncRuntime as ar
+import VirtualBus as vb
+from runtime_idle import OutputInstrument, kLatency, kSettle
+
+kOverrunQueueSize = 64
+kVoltageSteps = 256
+kErrorFrameBurst = 20         # error frames per burst, 10 bursts a second
+kBacklogPeriod = 0.5          # overrun scenario backlog period, in seconds
+
+
+def NewStation(lib):
+    chroma = ch.CHROMA_62000H(device=OutputInstrument(kLatency),
+                              command_gap=0.0)
+    station = cs.ChargerStation(pb.PCANBasic(Library=lib), pb.PCAN_USBBUS1,
+                                chroma, sp.LoadCodecs(None))
+    station.pcan.Initialize(pb.PCAN_USBBUS1, pb.PCAN_BAUD_1M)
+    station.OpenReceive(use_hardware_filter=True)
+    return station
+
+
+def Scenario(bus, seconds, loaded, bus_off, error_frames, backlog, result):
+    codec = sp.LoadCodecs(None).ByName(sp.kChargerRequest)
+    requests = [codec.Encode(EnableOutput=1, RequestedVoltage=step,
+                             RequestedCurrent=10)
+                for step in range(kVoltageSteps)]
+    time.sleep(kSettle)
+
+    result['start_ns'] = time.perf_counter_ns()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if loaded:
+        # Half the bus each: the station's requests and traffic it filters out
+        bus.Burst(codec.can_id, count=None,
+                  data=lambda index: requests[index % kVoltageSteps],
+                  bus_load=0.5)
+        bus.Burst(0x100, count=None, bus_load=0.5)
+    if bus_off:
+        time.sleep(seconds / 2)
+        result['bus-off ns'] = time.perf_counter_ns()
+        bus.SetBusOff()
+        time.sleep(seconds / 2)
+    elif error_frames:
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            bus.InjectErrorFrames(kErrorFrameBurst)
+            time.sleep(0.1)
+    elif backlog:
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            now = time.perf_counter_ns()
+            bus.DeliverMany([vb.VirtualFrame(now, codec.can_id,
+                                             pb.PCAN_MESSAGE_STANDARD.value,
+                                             requests[index % kVoltageSteps])
+                             for index in range(backlog)])
+            time.sleep(kBacklogPeriod)
+    else:
+        time.sleep(seconds)
+    result['bus frames'] = sum(source.sent for source in bus.traffic)
+    bus.StopTraffic()
+    result['cpu'] = ((time.process_time() - cpu) /
+                     (time.perf_counter() - wall) * 100.0)
+
+
+def Run(seconds, loaded=False, queue_size=vb.kReceiveQueueSize, bus_off=False,
+        autoreset=True, error_frames=False, backlog=None):
+    bus = vb.VirtualBus(bitrate=1000000)
+    lib = vb.VirtualPCANLibrary()
+    channel = lib.Attach(pb.PCAN_USBBUS1, bus, queue_size)
+    channel.autoreset_supported = autoreset
+    station = NewStation(lib)
+    result = {}
+
+    async def Main():
+        serve = asyncio.create_task(ar.AsyncRuntime([station], None).Serve())
+        await asyncio.get_running_loop().run_in_executor(
+            None, Scenario, bus, seconds, loaded, bus_off, error_frames,
+            backlog, result)
+        await asyncio.sleep(0.1)
+        serve.cancel()
+        await asyncio.gather(serve, return_exceptions=True)
+    asyncio.run(Main())
+
+    reports = [frame.timestamp_ns for frame in channel.transmitted
+               if frame.can_id == station.output_codec.can_id and
+               frame.timestamp_ns >= result['start_ns']]
+    periods = sorted((b - a) / 1e6 for a, b in zip(reports, reports[1:]))
+    result.update({
+        'read': station.msg_count,
+        'dropped': channel.dropped,
+        'bus state': station.bus_health.state,
+        'bus-off': station.bus_health.bus_off_count,
+        'resets': station.bus_health.resets,
+        'overruns': station.bus_health.overruns,
+        'error frames': station.bus_health.error_frames,
+        '0x611 sent': len(reports),
+        '0x611 after bus-off': sum(1 for timestamp_ns in reports
+                                   if timestamp_ns > result.get('bus-off ns',
+                                                                float('inf'))),
+        '0x611 period p50': periods[len(periods) // 2] if periods else 0.0,
+        '0x611 period max': periods[-1] if periods else 0.0,
+    })
+    return result
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    results = [
+        ('full load', Run(seconds, loaded=True)),
+        ('overrun', Run(seconds, loaded=True, queue_size=kOverrunQueueSize,
+                        backlog=4 * kOverrunQueueSize)),
+        ('error frames', Run(seconds, error_frames=True)),
+        ('bus-off', Run(seconds, bus_off=True)),
+        ('bus-off, reset', Run(seconds, bus_off=True, autoreset=False)),
+    ]
+
+    print('')
+    for name, result in results:
+        print(f"{name:14s} bus frames {result['bus frames']:6d}   "
+              f"read {result['read']:6d}   dropped {result['dropped']:6d}   "
+              f"bus {result['bus state']:7s} "
+              f"bus-off {result['bus-off']} resets {result['resets']} "
+              f"overruns {result['overruns']:3d} "
+              f"error frames {result['error frames']:4d}   "
+              f"cpu {result['cpu']:6.2f}%   "
+              f"0x611 sent {result['0x611 sent']:3d} "
+              f"period p50 {result['0x611 period p50']:6.1f} ms "
+              f"max {result['0x611 period max']:6.1f} ms")
+
+    overrun = results[1][1]
+    assert overrun['dropped'] > 0 and overrun['overruns'] > 0, overrun
+
+    # Both ways out of bus-off: the bus is back and the reports resume. The
+    # auto-reset bus-off lasts about 1.4 ms, far less than the GetStatus
+    # period; it is counted from the driver's status frame.
+    for name, result in results[3:]:
+        assert result['bus-off'] == 1 and result['bus state'] == 'active', name
+        assert result['0x611 after bus-off'] > 0, name
+    assert results[3][1]['resets'] == 0
+    assert results[4][1]['resets'] == 1
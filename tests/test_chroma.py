@@ -0,0 +1,239 @@
+import time
+
+import pytest
+
+import Chroma62000H as ch
+import SimulatedChroma as sc
+
+kCompoundQuery = ':MEAS:VOLT?;:MEAS:CURR?;:CONF:OUTP?;:FETC:STAT?'
+
+
+class ScriptedInstrument:
+    # VISA resource answering each query from responses; a response that is
+    # an exception is raised instead, a list answers one item per query
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+        self.clears = 0
+
+    def write(self, command):
+        return len(command)
+
+    def query(self, query):
+        self.queries.append(query)
+        response = self.responses[query]
+        if isinstance(response, list):
+            response = response.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response + '\n'
+
+    def clear(self):
+        self.clears += 1
+
+
+def Separate(compound):
+    return {kCompoundQuery: compound, ':MEAS:VOLT?': '400.0',
+            ':MEAS:CURR?': '10.5', ':CONF:OUTP?': 'ON',
+            ':FETC:STAT?': '\x04\x00'}
+
+
+def VisaTimeout():
+    errors = pytest.importorskip('pyvisa.errors')
+    constants = pytest.importorskip('pyvisa.constants')
+    return errors.VisaIOError(constants.StatusCode.error_timeout)
+
+
+@pytest.mark.parametrize('compound', [
+    '400.0;10.5;ON',                 # too few fields
+    '400.0;ten;ON;\x04\x00',         # non-numeric field
+    '400.0;10.5;ON;',                # truncated status
+], ids=['fields', 'number', 'status'])
+def test_measure_all_falls_back_to_single_queries(compound):
+    device = ScriptedInstrument(Separate(compound))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    for _ in range(2):
+        measurement = chroma.MeasureAll()
+        assert measurement.voltage == 400.0
+        assert measurement.current == 10.5
+        assert measurement.output_enable
+        assert measurement.status.opp
+
+    # The compound query is tried once, then remembered as unsupported
+    assert device.queries.count(kCompoundQuery) == 1
+    assert not chroma.compound_queries
+    assert device.clears == 1
+
+
+def test_measure_all_keeps_the_compound_query_after_a_timeout():
+    compound = '400.0;10.5;ON;\x04\x00'
+    device = ScriptedInstrument(Separate([VisaTimeout()] + [compound] * 3))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    # The poll that timed out is answered by the single queries
+    assert chroma.MeasureAll().voltage == 400.0
+    assert device.clears == 1
+    assert chroma.compound_queries
+
+    del device.queries[:]
+    for _ in range(3):
+        assert chroma.MeasureAll().current == 10.5
+    assert device.queries == [kCompoundQuery] * 3
+    assert chroma.compound_timeouts == 0
+
+
+@pytest.mark.parametrize('timeout', [VisaTimeout, lambda: TimeoutError()],
+                         ids=['visa', 'stand-in'])
+def test_measure_all_gives_up_after_timeouts_in_a_row(timeout):
+    compound = '400.0;10.5;ON;\x04\x00'
+    replies = [timeout(), timeout(), compound] + [timeout()] * 3
+    device = ScriptedInstrument(Separate(replies))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    # A reply in between starts the count over
+    for _ in range(5):
+        assert chroma.MeasureAll().voltage == 400.0
+    assert chroma.compound_queries
+    assert chroma.MeasureAll().voltage == 400.0
+    assert not chroma.compound_queries
+
+    assert chroma.MeasureAll().voltage == 400.0
+    assert device.queries.count(kCompoundQuery) == 6
+    assert device.clears == 5
+
+
+def test_measure_all_uses_one_query_when_supported():
+    device = ScriptedInstrument(Separate('400.0;10.5;ON;\x04\x00'))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    measurement = chroma.MeasureAll()
+    assert (measurement.voltage, measurement.current) == (400.0, 10.5)
+    assert measurement.output_enable and measurement.status.opp
+    assert device.queries == [kCompoundQuery]
+    assert chroma.compound_queries
+
+
+def test_other_errors_still_reach_the_caller():
+    device = ScriptedInstrument(Separate(RuntimeError('USB gone')))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    with pytest.raises(RuntimeError):
+        chroma.MeasureAll()
+
+
+class RecordingChroma(sc.SimulatedChroma):
+    # SimulatedChroma keeping every VISA transaction as it was sent:
+    # (kind, text, start, end), times in time.perf_counter() seconds
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.log = []
+
+    def write(self, command):
+        start = time.perf_counter()
+        result = super().write(command)
+        self.log.append(('write', command, start, time.perf_counter()))
+        return result
+
+    def query(self, query):
+        start = time.perf_counter()
+        response = super().query(query)
+        self.log.append(('query', query, start, time.perf_counter()))
+        return response
+
+    def Sent(self):
+        return [(kind, text) for kind, text, _, _ in self.log]
+
+
+def test_batch_joins_commands_into_one_write():
+    device = RecordingChroma(latency=0.0)
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    with chroma.Batch():
+        chroma.SetVoltage(400.0)
+        with chroma.Batch():
+            chroma.SetCurrent(10.0)
+        chroma.EnableOutput()
+        assert device.Sent() == []
+
+    assert device.Sent() == [
+        ('write', ':SOUR:VOLT 400.0;:SOUR:CURR 10.0;:CONF:OUTP ON')]
+    assert (device.voltage, device.current, device.output_on) == \
+        (400.0, 10.0, True)
+
+    # Nothing is written for an empty batch
+    with chroma.Batch():
+        pass
+    assert len(device.log) == 1
+
+
+def test_query_in_a_batch_flushes_it_first():
+    device = RecordingChroma(latency=0.0)
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+
+    with chroma.Batch():
+        chroma.SetVoltage(250.0)
+        assert chroma.GetConfiguredVoltage().strip() == '250.000'
+        chroma.SetCurrent(2.0)
+
+    assert device.Sent() == [('write', ':SOUR:VOLT 250.0'),
+                             ('query', ':SOUR:VOLT?'),
+                             ('write', ':SOUR:CURR 2.0')]
+
+
+def test_opc_query_ends_every_write_when_waiting_for_completion():
+    device = RecordingChroma(latency=0.0)
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0,
+                              wait_for_completion=True)
+
+    with chroma.Batch():
+        chroma.SetVoltage(400.0)
+        chroma.SetCurrent(10.0)
+    chroma.DisableOutput()
+    chroma.MeasureVoltage()
+
+    assert device.Sent() == [('write', ':SOUR:VOLT 400.0;:SOUR:CURR 10.0'),
+                             ('query', '*OPC?'),
+                             ('write', ':CONF:OUTP OFF'),
+                             ('query', '*OPC?'),
+                             ('query', ':MEAS:VOLT?')]
+
+
+@pytest.mark.parametrize('wait_for_completion', [False, True])
+def test_command_gap_separates_transactions(wait_for_completion):
+    gap = 0.02
+    device = RecordingChroma(latency=0.001)
+    chroma = ch.CHROMA_62000H(device=device, command_gap=gap,
+                              wait_for_completion=wait_for_completion)
+
+    for voltage in (100.0, 200.0, 300.0):
+        with chroma.Batch():
+            chroma.SetVoltage(voltage)
+            chroma.SetCurrent(voltage / 100)
+        chroma.MeasureAll()
+
+    # A transaction ends with its *OPC?, which follows the write at once;
+    # the gap runs from there to the start of the next transaction
+    transactions = []
+    for kind, text, start, end in device.log:
+        if text == '*OPC?':
+            transactions[-1][1] = end
+        else:
+            transactions.append([start, end])
+
+    assert len(transactions) == 6
+    for previous, following in zip(transactions, transactions[1:]):
+        assert following[0] - previous[1] >= gap
+
+
+def test_status_reports_output_state_and_mode():
+    device = ScriptedInstrument(Separate('400.0;10.5;ON;\x04\x00,ON,CC'))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+    status = chroma.MeasureAll().status
+    assert (status.opp, status.output_state, status.cvcc) == (1, 'ON', 'CC')
+
+    # Supplies without Arg2/Arg3 keep the defaults
+    device = ScriptedInstrument(Separate('400.0;10.5;ON;\x04\x00'))
+    chroma = ch.CHROMA_62000H(device=device, command_gap=0.0)
+    status = chroma.MeasureAll().status
+    assert (status.output_state, status.cvcc) == ('OFF', 'CV')
@@ -0,0 +1,158 @@
+import random
+
+import pytest
+
+import CANCodec as cc
+import ChargerStation as cs
+import ShoreChargerProtocol as sp
+
+# Signals the shore-charger protocol does not use, so byte order, sign,
+# offset, odd lengths and byte-crossing positions are all covered
+kMixedLayout = cc.MessageLayout(
+    can_id=0x123,
+    name='Mixed',
+    length=8,
+    fill=0xA5,
+    signals=[
+        cc.Signal('Flag', start_bit=7, length=1),
+        cc.Signal('Nibble', start_bit=3, length=4),
+        cc.Signal('Temperature', start_bit=15, length=12, scale=0.5,
+                  offset=-40.0, is_signed=True),
+        cc.Signal('Torque', start_bit=28, length=16, scale=0.05,
+                  offset=-1600.0, byte_order=cc.kLittleEndian),
+        cc.Signal('Angle', start_bit=44, length=13, scale=0.3,
+                  byte_order=cc.kLittleEndian, is_signed=True),
+        cc.Signal('Counter', start_bit=57, length=7,
+                  byte_order=cc.kLittleEndian),
+    ])
+
+
+def Codecs():
+    return [('dbc', sp.LoadCodecs()), ('built-in', sp.LoadCodecs(None))]
+
+
+def AllCodecs():
+    codecs = [codec_table.ByName(layout.name)
+              for _, codec_table in Codecs() for layout in sp.layouts]
+    return codecs + [cc.MessageCodec(kMixedLayout)]
+
+
+def EdgeRaws(sig):
+    # Raw values at the ends of the signal's range and around its sign bit
+    top = (1 << sig.length) - 1
+    raws = {0, 1, top - 1, top}
+    if sig.is_signed:
+        raws |= {top >> 1, (top >> 1) + 1}
+    return sorted(raw for raw in raws if 0 <= raw <= top)
+
+
+def Physical(sig, raw):
+    if sig.is_signed and raw >> (sig.length - 1):
+        raw -= 1 << sig.length
+    return raw * sig.scale + sig.offset
+
+
+@pytest.mark.parametrize('codec', AllCodecs(), ids=lambda codec: codec.name)
+def test_every_signal_round_trips_at_its_edges(codec):
+    for sig in codec.layout.signals:
+        for raw in EdgeRaws(sig):
+            value = Physical(sig, raw)
+            data = codec.Encode(**{sig.name: value})
+            decoded = codec.DecodeDict(data + bytes(8 - codec.length))
+            assert decoded[sig.name] == pytest.approx(value), (sig.name, raw)
+            assert codec.Encode(**decoded) == data, (sig.name, raw)
+
+
+@pytest.mark.parametrize('codec', AllCodecs(), ids=lambda codec: codec.name)
+def test_decoded_frames_encode_to_the_same_signal_bits(codec):
+    patterns = [bytes(8), b'\xff' * 8, b'\x55\xaa' * 4, b'\x80\x7f' * 4]
+    rng = random.Random(0x618)
+    patterns += [bytes(rng.getrandbits(8) for _ in range(8))
+                 for _ in range(200)]
+
+    for data in patterns:
+        values = codec.DecodeDict(data)
+        encoded = codec.Encode(**values)
+        assert codec.DecodeDict(encoded + bytes(8 - codec.length)) == values
+        # Bits outside the signals come from the template, never from data
+        assert codec.Encode(**codec.DecodeDict(encoded)) == encoded
+
+
+def test_every_raw_value_of_scaled_signals_round_trips():
+    # Decimal scales and offsets land between floats; encoding must round
+    # to the raw value, not truncate to the one below
+    codec = cc.MessageCodec(kMixedLayout)
+    signals = {sig.name: sig for sig in kMixedLayout.signals}
+    for name in ('Temperature', 'Torque', 'Angle'):
+        sig = signals[name]
+        decode = codec.Decoder(name)
+        patch = codec.Patcher(name)
+        for raw in range(1 << sig.length):
+            value = Physical(sig, raw)
+            data = codec.Encode(**{name: value})
+            assert decode(data) == (pytest.approx(value),), (name, raw)
+            assert codec.Encode(**{name: decode(data)[0]}) == data, (name, raw)
+            patched = bytearray(codec.Encode())
+            patch(patched, value)
+            assert bytes(patched) == data, (name, raw)
+
+
+def test_protocol_layouts_match_the_dbc():
+    dbc, built_in = (codec_table for _, codec_table in Codecs())
+    for layout in sp.layouts:
+        dbc_codec = dbc.ByName(layout.name)
+        built_in_codec = built_in.ByName(layout.name)
+        assert dbc_codec.can_id == built_in_codec.can_id
+        names = [sig.name for sig in layout.signals]
+        data = bytes(range(0x11, 0x99, 0x11))
+        assert dbc_codec.Decoder(*names)(data) == \
+            built_in_codec.Decoder(*names)(data)
+
+    # The reports are sent, so their constant bytes must match as well
+    for name in (sp.kChargerOutput, sp.kChargerFaults):
+        assert dbc.ByName(name).Encode() == built_in.ByName(name).Encode()
+
+
+def test_charger_request_decodes_as_the_original_bit_shifts():
+    data = bytes([0x80, 0x00, 0x64, 0x08, 0xFD, 0x00, 0x96, 0x00])
+    for _, codecs in Codecs():
+        codec = codecs.ByName(sp.kChargerRequest)
+        decode = codec.Decoder('EnableOutput', 'MaxACCurrent',
+                               'RequestedVoltage', 'RequestedCurrent')
+        assert decode(data) == (1, 10.0, 230.1, 15.0)
+        assert decode(codec.Encode(EnableOutput=1, MaxACCurrent=10.0,
+                                   RequestedVoltage=230.1,
+                                   RequestedCurrent=15.0)) == decode(data)
+
+
+@pytest.mark.parametrize('source', ['dbc', 'built-in'])
+def test_patched_report_templates_match_encode(source):
+    codecs = dict(Codecs())[source]
+    output_codec = codecs.ByName(sp.kChargerOutput)
+    faults_codec = codecs.ByName(sp.kChargerFaults)
+
+    # Frames patched over and over, as ChargerStation reuses them
+    output_frame = cs.NewTxFrame(output_codec)
+    faults_frame = cs.NewTxFrame(faults_codec)
+    output_data = cc.DataView(output_frame.DATA)
+    faults_data = cc.DataView(faults_frame.DATA)
+    patch_output = output_codec.Patcher('MeasuredVoltage', 'MeasuredCurrent')
+    patch_faults = faults_codec.Patcher('ACFault', 'OPP', 'OVP')
+
+    assert output_codec.Encode() == \
+        bytes([0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00])
+    assert faults_codec.Encode() == \
+        bytes([0x40, 0xFF, 0xFF, 0xFF, 0xA8, 0xFF, 0xFF, 0xFF])
+
+    voltages = [0.0, 0.1, 230.1, 401.7, 6553.5, 12.3, 0.0]
+    currents = [0.0, 6553.5, 0.1, 12.3, 99.9, 0.0, 6553.5]
+    for voltage, current in zip(voltages, currents):
+        patch_output(output_data, voltage, current)
+        assert bytes(output_frame.DATA) == output_codec.Encode(
+            MeasuredVoltage=voltage, MeasuredCurrent=current)
+
+    for bits in [7, 0, 5, 2, 1, 4, 6, 3, 0]:
+        ac_fault, opp, ovp = bool(bits & 4), bool(bits & 2), bool(bits & 1)
+        patch_faults(faults_data, ac_fault, opp, ovp)
+        assert bytes(faults_frame.DATA) == faults_codec.Encode(
+            ACFault=ac_fault, OPP=opp, OVP=ovp)
@@ -0,0 +1,214 @@
+import json
+import time
+
+import pytest
+
+import ChargerStation as cs
+import Chroma62000H as ch
+import PCANBasic as pb
+import SharedState as ss
+import ShoreChargerProtocol as sp
+import SimulatedChroma as sc
+import StationConfig as cfg
+import VirtualBus as vb
+from test_chroma import RecordingChroma
+
+kChannel = pb.PCAN_USBBUS1
+
+
+def NewStation(device, command_gap=0.0, use_hardware_filter=True):
+    # A station on a virtual bus of its own; returns (station, bus)
+    bus = vb.VirtualBus(bitrate=1000000)
+    library = vb.VirtualPCANLibrary()
+    library.Attach(kChannel, bus)
+    pcan = pb.PCANBasic(Library=library)
+    pcan.Initialize(kChannel, pb.PCAN_BAUD_1M)
+    chroma = ch.CHROMA_62000H(device=device, command_gap=command_gap)
+    station = cs.ChargerStation(pcan, kChannel, chroma, sp.LoadCodecs(None))
+    station.OpenReceive(use_hardware_filter)
+    return station, bus
+
+
+def NewSetpoint(voltage, current, enable_output):
+    now_ns = time.monotonic_ns()
+    return ss.Setpoint(voltage, current, enable_output, now_ns, now_ns)
+
+
+def test_apply_setpoint_writes_only_changes_in_one_transaction():
+    device = RecordingChroma(latency=0.0)
+    station, _ = NewStation(device)
+
+    station.ApplySetpoint(NewSetpoint(400.0, 10.0, True))
+    station.ApplySetpoint(NewSetpoint(400.0, 10.0, True))
+    station.ApplySetpoint(NewSetpoint(400.0, 5.0, True))
+    station.ApplySetpoint(NewSetpoint(0.0, 0.0, False))
+
+    assert device.Sent() == [
+        ('write', ':SOUR:VOLT 400.0;:SOUR:CURR 10.0;:CONF:OUTP ON'),
+        ('write', ':SOUR:CURR 5.0'),
+        ('write', ':SOUR:VOLT 0.0;:SOUR:CURR 0.0;:CONF:OUTP OFF'),
+    ]
+    assert station.setpoint_latency.count == 3
+
+
+def test_apply_setpoint_keeps_the_command_gap_after_a_poll():
+    gap = 0.02
+    device = RecordingChroma(latency=0.001)
+    station, _ = NewStation(device, command_gap=gap)
+
+    for voltage in (100.0, 200.0, 300.0):
+        station.ApplySetpoint(NewSetpoint(voltage, 10.0, True))
+        station.Poll(time.monotonic_ns())
+
+    assert [kind for kind, _ in device.Sent()] == ['write', 'query'] * 3
+    for previous, following in zip(device.log, device.log[1:]):
+        assert following[2] - previous[3] >= gap
+
+
+def test_trace_waits_for_the_voltage_in_cv():
+    # An open output draws no current, so a small current request matches
+    # the measured current before the voltage has moved
+    device = RecordingChroma(latency=0.0, load_resistance=None)
+    device.voltage_slew = 0.001  # V/ms
+    station, _ = NewStation(device)
+
+    station.ApplySetpoint(NewSetpoint(400.0, 0.1, True))
+    station.Poll(time.monotonic_ns())
+    assert station.open_trace is not None
+
+    device.voltage_slew = 1e9
+    station.Poll(time.monotonic_ns())
+    assert station.open_trace is None
+    trace = station.latency_traces[-1]
+    assert trace.reflected_ns is not None
+    assert station.state.Read().measured_status.cvcc == "CV"
+
+
+def test_trace_waits_for_the_current_in_cc():
+    # 1 A into 40 ohm is 40 V: the supply limits the current, far below the
+    # requested voltage
+    device = RecordingChroma(latency=0.0, load_resistance=40.0)
+    device.current_slew = 0.0001  # A/ms
+    station, _ = NewStation(device)
+
+    station.ApplySetpoint(NewSetpoint(400.0, 1.0, True))
+    station.Poll(time.monotonic_ns())
+    assert station.open_trace is not None
+    assert station.state.Read().measured_status.cvcc == "CC"
+
+    device.voltage_slew = device.current_slew = 1e9
+    station.Poll(time.monotonic_ns())
+    assert station.open_trace is None
+    assert station.latency_traces[-1].reflected_ns is not None
+    assert abs(station.state.Read().measured_current - 1.0) <= \
+        cs.kSettleCurrent
+
+
+class FailingChroma(sc.SimulatedChroma):
+    # A supply that connects but rejects every command
+    def write(self, command):
+        raise TimeoutError('no response')
+
+
+def test_open_station_releases_the_channel_when_the_supply_fails():
+    bus = vb.VirtualBus(bitrate=1000000)
+    library = vb.VirtualPCANLibrary()
+    channel = library.Attach(kChannel, bus)
+    station_config = cfg.StationConfig(name='Bay 1', psu='SIM1')
+
+    with pytest.raises(TimeoutError):
+        cs.OpenStation(station_config, sp.LoadCodecs(None),
+                       pb.PCANBasic(Library=library), device=FailingChroma())
+    assert not channel.initialized
+
+    # The channel can be opened again, and closed with its station
+    pcan = pb.PCANBasic(Library=library)
+    station = cs.OpenStation(station_config, sp.LoadCodecs(None), pcan,
+                             device=sc.SimulatedChroma(latency=0.0))
+    station.Close()
+    assert not channel.initialized
+    assert station.chroma.status == "Not Connected"
+
+
+@pytest.mark.parametrize('psus', [
+    ['USB0::0x1698::0x0837::000001', 'USB0::0x1698::0x0837::000001'],
+    ['USB0::0x1698::0x0837::00000', 'USB0::0x1698::0x0837::000001'],
+    ['000001', 'USB0::0x1698::0x0837::000001'],
+], ids=['same', 'prefix', 'serial'])
+def test_config_rejects_stations_sharing_a_supply(tmp_path, psus):
+    path = tmp_path / 'stations.json'
+    path.write_text(json.dumps({'stations': [
+        {'name': f'Bay {index + 1}', 'channel': f'PCAN_USBBUS{index + 1}',
+         'psu': psu} for index, psu in enumerate(psus)]}))
+    with pytest.raises(ValueError):
+        cfg.LoadStationConfig(str(path))
+
+
+@pytest.mark.parametrize('use_hardware_filter', [True, False])
+def test_only_standard_data_frames_are_decoded_as_requests(use_hardware_filter):
+    station, bus = NewStation(RecordingChroma(latency=0.0),
+                              use_hardware_filter=use_hardware_filter)
+    codec = station.codecs.ByName(sp.kChargerRequest)
+
+    def Request(voltage):
+        return codec.Encode(EnableOutput=1, RequestedVoltage=voltage,
+                            RequestedCurrent=10.0)
+
+    bus.Inject(codec.can_id, Request(100.0))
+    for msgtype in (pb.PCAN_MESSAGE_EXTENDED, pb.PCAN_MESSAGE_RTR,
+                    pb.PCAN_MESSAGE_STATUS,
+                    pb.PCAN_MESSAGE_FD):
+        bus.Inject(codec.can_id, Request(400.0), msgtype)
+    station.DrainReceive()
+
+    assert station.state.Read().requested_voltage == 100.0
+    setpoint = station.setpoints.Take(0)
+    assert setpoint.voltage == 100.0
+    # The status frame goes to the bus health instead
+    if not use_hardware_filter:
+        assert station.discarded_count == 3
+
+
+def test_a_bus_off_shorter_than_the_sample_period_is_counted():
+    station, bus = NewStation(RecordingChroma(latency=0.0))
+    channel = bus.channels[0]
+    station.bus_health.Configure()
+    station.bus_health.Sample()
+
+    # Auto-reset recovers long before the next GetStatus sample
+    bus.SetBusOff()
+    time.sleep(0.01)
+    assert not channel.IsBusOff()
+    station.DrainReceive()
+
+    health = station.bus_health
+    assert health.bus_off_count == 1
+    assert health.state == 'active'
+    health.Sample()
+    assert health.bus_off_count == 1
+
+
+def test_simulated_stations_run_at_their_configured_baudrate():
+    # As --simulate: channels that are not attached get a bus of their own
+    library = vb.VirtualPCANLibrary()
+    pcan = pb.PCANBasic(Library=library)
+    stations = []
+    for index, baudrate in enumerate(['PCAN_BAUD_500K', 'PCAN_BAUD_250K']):
+        station_config = cfg.StationConfig(
+            name=f'Bay {index + 1}', channel=f'PCAN_USBBUS{index + 1}',
+            psu=f'SIM{index + 1}', baudrate=baudrate)
+        stations.append(cs.OpenStation(
+            station_config, sp.LoadCodecs(None), pcan,
+            device=sc.SimulatedChroma(latency=0.0)))
+
+    assert [library.Channel(station.channel).bus.bitrate
+            for station in stations] == [500000, 250000]
+    for station in stations:
+        station.Close()
+
+    # An attached bus keeps its bitrate: the driver joins it as it runs
+    bus = vb.VirtualBus(bitrate=1000000)
+    library.Attach(pb.PCAN_USBBUS3, bus)
+    assert pcan.Initialize(pb.PCAN_USBBUS3, pb.PCAN_BAUD_500K) == \
+        pb.PCAN_ERROR_CAUTION
+    assert bus.bitrate == 1000000
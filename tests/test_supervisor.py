@@ -0,0 +1,77 @@
+import time
+
+import ChargerStation as cs
+import PCANBasic as pb
+import ShoreChargerProtocol as sp
+import SimulatedChroma as sc
+import StationConfig as cfg
+import Supervisor as sv
+import VirtualBus as vb
+
+kTelemetryPeriod = 0.1  # in seconds
+kTimeout = 30.0         # longest a worker may take to start or exit, in seconds
+
+
+def OpenSimulatedStation(station_config, dbc_path):
+    # Worker station factory: a virtual bus with a vehicle sending charger
+    # requests, and a simulated supply (as --simulate)
+    bus = vb.VirtualBus(bitrate=1000000)
+    library = vb.VirtualPCANLibrary()
+    library.Attach(station_config.Channel(), bus)
+    codecs = sp.LoadCodecs(dbc_path)
+    request = codecs.ByName(sp.kChargerRequest).Encode(
+        EnableOutput=1, RequestedVoltage=400.0, RequestedCurrent=10.0)
+    bus.Traffic(sp.kChargerRequestId, rate=100, data=request)
+    return cs.OpenStation(station_config, codecs,
+                          pb.PCANBasic(Library=library),
+                          device=sc.SimulatedChroma(latency=0.0))
+
+
+def PollUntil(supervisor, condition):
+    deadline = time.monotonic() + kTimeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        supervisor.Poll(0.05)
+    return time.monotonic()
+
+
+def test_killed_worker_is_restarted_after_backoff_and_reports_again():
+    configs = [cfg.StationConfig(name='Bay 1', psu='SIM1'),
+               cfg.StationConfig(name='Bay 2', psu='SIM2')]
+    supervisor = sv.Supervisor(configs, None,
+                               open_station=OpenSimulatedStation,
+                               telemetry_period=kTelemetryPeriod)
+    crashed, healthy = supervisor.workers
+    supervisor.Start()
+    try:
+        PollUntil(supervisor, lambda: all(
+            worker.telemetry is not None and worker.telemetry['msg_count'] > 0
+            for worker in supervisor.workers))
+        first_pid = crashed.process.pid
+
+        crashed.process.kill()
+        exited = PollUntil(supervisor, lambda: crashed.process is None)
+        assert crashed.exitcode != 0
+        assert crashed.restart_delay == 2 * sv.kRestartDelay
+
+        # Not before the backoff delay, and only the crashed worker
+        restarted = PollUntil(supervisor, lambda: crashed.process is not None)
+        assert restarted - exited >= sv.kRestartDelay - 0.1
+        assert crashed.process.pid != first_pid
+        assert crashed.restarts == 1
+        assert healthy.restarts == 0
+
+        # Telemetry of the new worker reaches the supervisor's aggregate
+        crashed.telemetry = None
+        PollUntil(supervisor, lambda: crashed.telemetry is not None and
+                  crashed.telemetry['msg_count'] > 0)
+        assert crashed.telemetry['name'] == 'Bay 1'
+        info = supervisor.Info()
+        assert "--- Bay 1 --- pid " + str(crashed.process.pid) + ", 1 restarts" in info
+        assert "--- Bay 2 --- pid " + str(healthy.process.pid) + ", 0 restarts" in info
+        assert info.count("CAN Msg Count") == 2
+        assert "Setpoint latency" in supervisor.Latency()
+    finally:
+        supervisor.Stop()
+
+    assert all(worker.process is None for worker in supervisor.workers)
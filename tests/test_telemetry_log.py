@@ -0,0 +1,26 @@
+import Metrics as mt
+import PCANBasic as pb
+import TelemetryLog as tl
+
+
+def test_records_past_the_pending_bytes_are_dropped_and_exported(tmp_path):
+    # The writer only runs on Close, as if the disk had stalled
+    log = tl.TelemetryLog(str(tmp_path), 'Bay 1', flush_period=60.0,
+                          buffer_size=1024 * 1024,
+                          max_pending_bytes=10 * tl.kRecordSize)
+    registry = mt.Registry()
+    log.Instrument(registry, {'station': 'Bay 1'})
+
+    msg = pb.TPCANMsg()
+    msg.ID = 0x611
+    msg.LEN = 8
+    for host_ns in range(15):
+        log.LogTransmitted(msg, host_ns)
+    log.Close()
+
+    assert (log.records, log.dropped) == (10, 5)
+    with tl.TelemetryReader(log.files[0]) as reader:
+        assert [frame.host_ns for frame in reader.Frames()] == list(range(10))
+    exposed = registry.Expose()
+    assert 'shore_charger_telemetry_records_total{station="Bay 1"} 10' in exposed
+    assert 'shore_charger_telemetry_dropped_total{station="Bay 1"} 5' in exposed
@@ -0,0 +1,128 @@
+import time
+import types
+
+import pytest
+
+import CANTrace as ct
+import PCANBasic as pb
+import TelemetryLog as tl
+import VirtualBus as vb
+
+
+def NewMsg(can_id, data, msgtype=pb.PCAN_MESSAGE_STANDARD):
+    msg = pb.TPCANMsg()
+    msg.ID = can_id
+    msg.MSGTYPE = msgtype
+    msg.LEN = len(data)
+    for i, byte in enumerate(data):
+        msg.DATA[i] = byte
+    return msg
+
+
+def WriteSession(directory):
+    # Two frames received 10 ms apart on an adapter clock starting at 5 s,
+    # each read 1 ms late, and one frame sent in between; returns the
+    # wall clock time of the first frame
+    log = tl.TelemetryLog(str(directory), 'Bay 1')
+    host_ns = time.monotonic_ns()
+    wall = time.time() - 0.001
+    for index in range(2):
+        timestamp = pb.TPCANTimestamp()
+        timestamp.millis = 5000 + 10 * index
+        rx_buffer = types.SimpleNamespace(
+            Messages=[NewMsg(0x618, [0x80, index])], Timestamps=[timestamp])
+        log.LogReceived(rx_buffer, 1, host_ns + (10 * index + 1) * 1000000)
+    log.LogTransmitted(NewMsg(0x611, [1, 2, 3, 4, 5, 6, 7, 8]),
+                       host_ns + 5000000)
+    log.Close()
+    return log.files, wall
+
+
+def test_exported_candump_is_timed_by_the_wall_clock(tmp_path):
+    paths, wall = WriteSession(tmp_path)
+    frames = ct.ReadTelemetryLogs(paths)
+    assert [(frame.can_id, frame.direction) for frame in frames] == \
+        [(0x618, 'Rx'), (0x611, 'Tx'), (0x618, 'Rx')]
+    assert abs(frames[0].time - wall) < 0.5
+    assert abs(frames[1].time - frames[0].time - 0.004) < 1e-6
+    assert abs(frames[2].time - frames[0].time - 0.010) < 1e-6
+
+    output = str(tmp_path / 'session.log')
+    assert ct.Export(paths, output) == 3
+    read_back = list(ct.ReadCandump(output))
+    for frame, original in zip(read_back, frames):
+        assert abs(frame.time - original.time) < 1e-6
+        assert (frame.can_id, frame.data) == (original.can_id, original.data)
+
+
+def test_exported_asc_starts_at_its_date_header(tmp_path):
+    paths, _ = WriteSession(tmp_path)
+    frames = ct.ReadTelemetryLogs(paths)
+    output = str(tmp_path / 'session.asc')
+    ct.Export(paths, output)
+
+    with open(output) as trace:
+        header = trace.readline()
+    millis = int(frames[0].time * 1000) % 1000
+    assert header == time.strftime(
+        f'date %a %b %d %H:%M:%S.{millis:03d} %Y\n',
+        time.localtime(frames[0].time))
+
+    read_back = list(ct.ReadAsc(output))
+    assert [frame.direction for frame in read_back] == ['Rx', 'Tx', 'Rx']
+    for frame, original in zip(read_back, frames):
+        assert abs(frame.time - (original.time - frames[0].time)) < 1e-6
+
+
+def WriteErrorSession(directory):
+    # A request, a stuff error frame (RX counter 10, TX counter 3) and a
+    # status frame that happens to carry 0x618, 1 ms apart
+    log = tl.TelemetryLog(str(directory), 'Bay 1')
+    host_ns = time.monotonic_ns()
+    messages = [NewMsg(0x618, [0x80, 0x01]),
+                NewMsg(0x04, [0, 0, 10, 3], pb.PCAN_MESSAGE_ERRFRAME),
+                NewMsg(0x618, [0, 0, 0, 0], pb.PCAN_MESSAGE_STATUS)]
+    for index, msg in enumerate(messages):
+        timestamp = pb.TPCANTimestamp()
+        timestamp.millis = 5000 + index
+        rx_buffer = types.SimpleNamespace(Messages=[msg],
+                                          Timestamps=[timestamp])
+        log.LogReceived(rx_buffer, 1, host_ns + index * 1000000)
+    log.Close()
+    return log.files
+
+
+@pytest.mark.parametrize('extension', ['.log', '.asc', '.sctl'])
+def test_error_frames_round_trip_and_status_frames_are_left_out(
+        tmp_path, extension):
+    paths = WriteErrorSession(tmp_path)
+    trace = paths[0]
+    if extension != '.sctl':
+        trace = str(tmp_path / ('session' + extension))
+        assert ct.Export(paths, trace) == 2
+    with open(trace, 'rb') as trace_file:
+        text = trace_file.read()
+    if extension == '.log':
+        assert b' 20000008#000004000000030A\n' in text
+    if extension == '.asc':
+        assert b' ErrorFrame\n' in text
+
+    frames = list(ct.ReadTrace(trace))
+    assert [(frame.can_id, frame.msgtype) for frame in frames] == \
+        [(0x618, pb.PCAN_MESSAGE_STANDARD.value),
+         (0x04 if extension != '.asc' else 0, pb.PCAN_MESSAGE_ERRFRAME.value)]
+    if extension != '.asc':
+        assert frames[1].data == bytes([0, 0, 10, 3])
+
+    # Replayed, the error frame raises the error counters and is queued
+    # as an error frame; nothing else reaches the bus
+    bus = vb.VirtualBus()
+    library = vb.VirtualPCANLibrary()
+    channel = library.Attach(pb.PCAN_USBBUS1, bus)
+    channel.initialized = True
+    channel.allow_error_frames = True
+    assert ct.Replay(frames, bus, speed=10.0) == 2
+    assert channel.error_frames == 1
+    assert [(frame.can_id, frame.msgtype) for frame in channel.queue] == \
+        [(0x618, pb.PCAN_MESSAGE_STANDARD.value),
+         (0, pb.PCAN_MESSAGE_ERRFRAME.value)]